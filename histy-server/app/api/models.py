@@ -8,6 +8,7 @@ from pydantic import BaseModel, Field
 class SourceSearchRequest(BaseModel):
     q: str
     limit: int = Field(default=20, ge=1, le=100)
+    fuzzy: bool = False
 
 
 class ContributorIn(BaseModel):
@@ -51,14 +52,38 @@ class CitationCreateRequest(BaseModel):
     note_type: Optional[str] = None
 
 
+class CitationBatchItem(BaseModel):
+    source_id: str
+    locator: Optional[str] = None
+    note_type: Optional[str] = None
+
+
+class CitationBatchRequest(BaseModel):
+    doc_id: str
+    citations: list[CitationBatchItem] = Field(min_length=1, max_length=1000)
+
+
+class CitationReconcileRequest(BaseModel):
+    doc_id: str
+    citation_uuids: list[str]
+    prune: bool = False
+    revision: Optional[int] = None
+
+
 class RenderCitationRequest(BaseModel):
     citation_uuid: str
     doc_id: str
 
 
+class CachedRender(BaseModel):
+    citation_uuid: str
+    cached_render_hash: Optional[str] = None
+
+
 class RenderRefreshRequest(BaseModel):
     doc_id: str
     citation_uuids: Optional[list[str]] = None
+    cached: Optional[list[CachedRender]] = None
 
 
 class RenderBibliographyRequest(BaseModel):
@@ -78,3 +103,4 @@ class StylePreviewRequest(BaseModel):
 
 class ValidateDocumentRequest(BaseModel):
     doc_id: str
+    citation_uuids: Optional[list[str]] = None
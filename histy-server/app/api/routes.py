@@ -1,10 +1,20 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import io
+import json
 import sqlite3
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from .models import (
+    CitationBatchRequest,
     CitationCreateRequest,
+    CitationReconcileRequest,
     DocumentUpsertRequest,
     RenderBibliographyRequest,
     RenderCitationRequest,
@@ -15,18 +25,96 @@ from .models import (
     StylePreviewRequest,
     ValidateDocumentRequest,
 )
-from ..db.connection import db_dependency
+from ..db.connection import (
+    ConnectionPool,
+    db_dependency,
+    pool_dependency,
+    pool_stats,
+    writer_dependency,
+    writer_stats,
+)
 from ..db import queries
-from ..render.renderer import render_bibliography_entry, render_citation
+from ..db.changes import change_feed
+from ..db.sessions import document_sessions
+from ..db.tombstones import tombstone_collector
+from ..db.writer import WriteQueue
+from ..importer.parsers import EXTENSIONS, PARSERS
+from ..importer.pipeline import import_stream
+from ..render.prerender import prerender_queue
+from ..render.singleflight import render_flights
+from ..render.cache import render_bibliography_cached, render_cache, render_citations_cached
+from ..render.renderer import (
+    VariantTracker,
+    context_cache,
+    render_citation,
+    template_cache,
+)
+from ..search.typeahead import suggest_index
+from ..styles.registry import style_registry
+from ..styles.validation import check_document
 
 router = APIRouter(prefix="/api")
 
+T = TypeVar("T")
+
+STREAM_PAGE_SIZE = 500
+CHANGES_MAX_TIMEOUT = 60
+
 
 @router.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+def _read_on(pool: ConnectionPool, fn):
+    conn = pool.acquire()
+    try:
+        return fn(conn)
+    finally:
+        pool.release(conn)
+
+
+@router.get("/changes")
+async def changes(
+    since: int = Query(0, ge=0),
+    timeout: float = Query(25, ge=0, le=CHANGES_MAX_TIMEOUT),
+    doc_id: str | None = None,
+    pool: ConnectionPool = Depends(pool_dependency),
+) -> dict:
+    # Long poll: answers as soon as the change revision moves past `since`.
+    # Connections are only held for the brief reads, never while waiting.
+    if since > 0:
+        await change_feed.wait(
+            lambda: run_in_threadpool(_read_on, pool, queries.current_change_revision),
+            since,
+            timeout,
+        )
+    return await run_in_threadpool(
+        _read_on, pool, lambda conn: queries.changes_since(conn, since, doc_id)
+    )
+
+
+@router.get("/stats")
+def stats(conn: sqlite3.Connection = Depends(db_dependency)) -> dict[str, dict]:
+    return {
+        "template_cache": template_cache.stats(),
+        "context_cache": context_cache.stats(),
+        "style_registry": style_registry.stats(),
+        "render_cache": render_cache.stats(conn),
+        "db_pool": pool_stats(),
+        "write_queue": writer_stats(),
+        "document_sessions": document_sessions.stats(),
+        "suggest_index": suggest_index.stats(),
+        "change_feed": change_feed.stats(),
+        "prerender_queue": prerender_queue.stats(),
+        "render_flights": render_flights.stats(),
+        "citation_gc": {
+            **tombstone_collector.stats(),
+            "tombstones": queries.count_citation_tombstones(conn),
+        },
+    }
+
+
 @router.get("/styles")
 def list_styles(conn: sqlite3.Connection = Depends(db_dependency)) -> dict[str, list[dict]]:
     return {"items": queries.list_styles(conn)}
@@ -46,7 +134,7 @@ def style_preview(
     payload: StylePreviewRequest,
     conn: sqlite3.Connection = Depends(db_dependency),
 ) -> dict:
-    style = queries.get_style(conn, style_id)
+    style = style_registry.get(conn, style_id)
     if not style:
         raise HTTPException(status_code=404, detail="style_not_found")
 
@@ -62,16 +150,16 @@ def style_preview(
         "note_type": None,
     }
 
-    prior_citations = []
+    tracker = VariantTracker()
     if payload.doc_id:
-        prior_citations = queries.list_citations_for_doc(conn, payload.doc_id)
+        tracker = VariantTracker(*queries.citation_prefix_state(conn, payload.doc_id))
 
     output = render_citation(
         citation,
         source,
         source.get("contributors", []),
         style,
-        prior_citations,
+        variant=tracker.select(citation),
     )
     return {
         "plain_text": output.plain_text,
@@ -84,24 +172,129 @@ def style_preview(
 def source_search(
     payload: SourceSearchRequest, conn: sqlite3.Connection = Depends(db_dependency)
 ) -> dict:
-    items = queries.search_sources(conn, payload.q, payload.limit)
+    items = queries.search_sources(conn, payload.q, payload.limit, payload.fuzzy)
     return {"items": items}
 
 
+def sources_page(
+    conn: sqlite3.Connection, limit: int, cursor: str | None, q: str = ""
+) -> tuple[list[dict], str | None]:
+    # Shared by the API and the web UI's source list: decodes the opaque
+    # cursor and encodes the next one.
+    after = None
+    if cursor:
+        try:
+            after = queries.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="invalid_cursor")
+    items, next_after = queries.list_sources_page(conn, limit, after, q)
+    return items, queries.encode_cursor(*next_after) if next_after else None
+
+
+@router.get("/sources")
+def source_list(
+    q: str = "",
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    conn: sqlite3.Connection = Depends(db_dependency),
+) -> dict:
+    items, next_cursor = sources_page(conn, limit, cursor, q)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/sources/stream")
+def source_stream(q: str = "", pool: ConnectionPool = Depends(pool_dependency)) -> StreamingResponse:
+    # Pages are read with a fresh pooled connection each, so a slow client never
+    # pins a connection and memory stays bounded by STREAM_PAGE_SIZE.
+    def lines():
+        after = None
+        while True:
+            conn = pool.acquire()
+            try:
+                items, after = queries.list_sources_page(conn, STREAM_PAGE_SIZE, after, q)
+            finally:
+                pool.release(conn)
+            for item in items:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            if after is None:
+                return
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/sources/suggest")
+def source_suggest(
+    q: str = "",
+    limit: int = Query(10, ge=1, le=50),
+    conn: sqlite3.Connection = Depends(db_dependency),
+    pool: ConnectionPool = Depends(pool_dependency),
+) -> dict:
+    complete = suggest_index.check(conn, pool)
+    return {"items": suggest_index.suggest(q, limit), "complete": complete}
+
+
 @router.post("/sources/upsert")
 def source_upsert(
-    payload: SourceUpsertRequest, conn: sqlite3.Connection = Depends(db_dependency)
+    payload: SourceUpsertRequest,
+    conn: sqlite3.Connection = Depends(db_dependency),
+    pool: ConnectionPool = Depends(pool_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
 ) -> dict:
-    source = queries.upsert_source(conn, payload.model_dump())
+    data = payload.model_dump()
+    source = suggest_index.upsert_source(writer, data)
+    prerender_queue.schedule(queries.document_ids_for_source(conn, source["id"]), pool, writer)
     return {"source": source}
 
 
+@router.post("/sources/import")
+def source_import(
+    file: UploadFile = File(...),
+    format: str | None = Form(None),
+    library: str | None = Form(None),
+    conn: sqlite3.Connection = Depends(db_dependency),
+    pool: ConnectionPool = Depends(pool_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
+) -> dict:
+    filename = Path(file.filename or "")
+    fmt = format or EXTENSIONS.get(filename.suffix.lower())
+    if fmt not in PARSERS:
+        raise HTTPException(status_code=400, detail="import_format_unknown")
+
+    before = queries.current_change_revision(conn)
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig")
+    try:
+        stats = import_stream(
+            conn, stream, fmt, writer=writer, library=library or filename.name or fmt
+        )
+    finally:
+        stream.detach()
+    if stats.written:
+        suggest_index.build(conn)
+        # Re-imported sources may already be cited; warm those documents.
+        prerender_queue.schedule(queries.changes_since(conn, before)["doc_ids"], pool, writer)
+    if stats.error:
+        # Batches before the error are committed; say how far the import got.
+        raise HTTPException(
+            status_code=400,
+            detail={"error": "import_parse_error", "import": stats.as_dict()},
+        )
+    return {"import": stats.as_dict()}
+
+
 @router.post("/documents/upsert")
 def document_upsert(
-    payload: DocumentUpsertRequest, conn: sqlite3.Connection = Depends(db_dependency)
+    payload: DocumentUpsertRequest,
+    conn: sqlite3.Connection = Depends(db_dependency),
+    pool: ConnectionPool = Depends(pool_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
 ) -> dict:
     try:
-        doc = queries.upsert_document(conn, payload.model_dump())
+        doc = document_sessions.resolve(
+            conn,
+            writer,
+            payload.model_dump(),
+            on_style_change=lambda doc_id: prerender_queue.schedule([doc_id], pool, writer),
+        )
     except ValueError:
         raise HTTPException(status_code=400, detail="doc_fingerprint_required")
     return {"document": doc}
@@ -109,12 +302,87 @@ def document_upsert(
 
 @router.post("/citations/create")
 def citation_create(
-    payload: CitationCreateRequest, conn: sqlite3.Connection = Depends(db_dependency)
+    payload: CitationCreateRequest, writer: WriteQueue = Depends(writer_dependency)
 ) -> dict:
-    citation = queries.create_citation(conn, payload.model_dump())
+    data = payload.model_dump()
+    citation = writer.run(lambda conn: queries.create_citation(conn, data))
     return {"citation": citation}
 
 
+@router.post("/citations/reconcile")
+def citation_reconcile(
+    payload: CitationReconcileRequest,
+    conn: sqlite3.Connection = Depends(db_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
+) -> dict:
+    if not queries.render_state(conn, payload.doc_id):
+        raise HTTPException(status_code=404, detail="document_not_found")
+    result = {"tombstoned": 0, "deleted": 0, "revived": 0}
+    # Checked on the read connection first so the usual no-op reconcile before
+    # each refresh never queues a write.
+    if queries.reconcile_needed(
+        conn, payload.doc_id, payload.citation_uuids, payload.prune, payload.revision
+    ):
+        result = writer.run(
+            lambda write_conn: queries.reconcile_citations(
+                write_conn,
+                payload.doc_id,
+                payload.citation_uuids,
+                payload.prune,
+                payload.revision,
+            )
+        )
+        tombstone_collector.record_reconcile(result)
+    return {"reconcile": result}
+
+
+@router.post("/citations/batch")
+def citation_batch(
+    payload: CitationBatchRequest,
+    conn: sqlite3.Connection = Depends(db_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
+) -> dict:
+    doc = conn.execute(
+        "SELECT active_style_id FROM documents WHERE id = ?;",
+        (payload.doc_id,),
+    ).fetchone()
+    if not doc:
+        raise HTTPException(status_code=404, detail="document_not_found")
+
+    style = style_registry.get(conn, doc["active_style_id"])
+    if not style:
+        raise HTTPException(status_code=404, detail="style_not_found")
+
+    sources = queries.get_sources(conn, [item.source_id for item in payload.citations])
+    if any(item.source_id not in sources for item in payload.citations):
+        raise HTTPException(status_code=404, detail="source_not_found")
+
+    items = [item.model_dump() for item in payload.citations]
+    prefix, citations = writer.run(
+        lambda write_conn: queries.append_citations(write_conn, payload.doc_id, items)
+    )
+    tracker = VariantTracker(*prefix)
+    pending = [
+        (citation, sources[citation["source_id"]], tracker.advance(citation))
+        for citation in citations
+    ]
+    rendered = render_citations_cached(conn, style, pending, writer)
+    items = [
+        {
+            "citation": citation,
+            "plain_text": output.plain_text,
+            "runs": output.runs,
+            "metadata": output.metadata,
+        }
+        for citation, output in zip(citations, rendered)
+    ]
+    return {
+        "items": items,
+        "style_version": style.get("version"),
+        "style_revision": style.get("revision"),
+    }
+
+
 @router.post("/render/citation")
 def render_single_citation(
     payload: RenderCitationRequest, conn: sqlite3.Connection = Depends(db_dependency)
@@ -132,7 +400,7 @@ def render_single_citation(
     if not doc:
         raise HTTPException(status_code=404, detail="document_not_found")
 
-    style = queries.get_style(conn, doc["active_style_id"])
+    style = style_registry.get(conn, doc["active_style_id"])
     if not style:
         raise HTTPException(status_code=404, detail="style_not_found")
 
@@ -140,15 +408,15 @@ def render_single_citation(
     if not source:
         raise HTTPException(status_code=404, detail="source_not_found")
 
-    all_citations = queries.list_citations_for_doc(conn, payload.doc_id)
-    prior = []
-    for item in all_citations:
-        if item["citation_uuid"] == payload.citation_uuid:
-            break
-        prior.append(item)
-
+    tracker = VariantTracker(
+        *queries.citation_prefix_state(conn, payload.doc_id, citation["doc_order"])
+    )
     output = render_citation(
-        citation, source, source.get("contributors", []), style, prior
+        citation,
+        source,
+        source.get("contributors", []),
+        style,
+        variant=tracker.select(citation),
     )
 
     return {
@@ -156,139 +424,193 @@ def render_single_citation(
         "runs": output.runs,
         "metadata": output.metadata,
         "style_version": style.get("version"),
+        "style_revision": style.get("revision"),
     }
 
 
-@router.post("/render/refresh")
-def render_refresh(
-    payload: RenderRefreshRequest, conn: sqlite3.Connection = Depends(db_dependency)
-) -> dict:
-    doc = conn.execute(
-        "SELECT active_style_id FROM documents WHERE id = ?;",
-        (payload.doc_id,),
-    ).fetchone()
-    if not doc:
+def _load_bundle(
+    conn: sqlite3.Connection, doc_id: str, ordered_uuids: list[str] | None = None
+) -> queries.DocumentBundle:
+    bundle = queries.load_document_bundle(conn, doc_id, ordered_uuids, style_registry.get)
+    if not bundle:
         raise HTTPException(status_code=404, detail="document_not_found")
-
-    style = queries.get_style(conn, doc["active_style_id"])
-    if not style:
+    if not bundle.style:
         raise HTTPException(status_code=404, detail="style_not_found")
-
-    citations = queries.list_citations_for_doc(conn, payload.doc_id, payload.citation_uuids)
-    outputs = []
-    prior: list[dict] = []
-    for citation in citations:
-        source = queries.get_source(conn, citation["source_id"])
+    return bundle
+
+
+def _render_flight(
+    conn: sqlite3.Connection,
+    endpoint: str,
+    doc_id: str,
+    ordered_uuids: list[str] | None,
+    render: Callable[[], T],
+) -> T:
+    # Identical concurrent requests (double clicks, several task panes on one
+    # shared document) wait for a single render. The change feed revision in the
+    # key keeps requests that straddle an edit from sharing a stale result.
+    state = queries.render_state(conn, doc_id)
+    if not state:
+        raise HTTPException(status_code=404, detail="document_not_found")
+    order_hash = (
+        hashlib.sha1("\x1f".join(ordered_uuids).encode("utf-8")).hexdigest()
+        if ordered_uuids
+        else None
+    )
+    key = (
+        endpoint,
+        doc_id,
+        state["active_style_id"],
+        state["style_revision"],
+        state["style_counter"],
+        order_hash,
+        state["change_revision"],
+    )
+    try:
+        return render_flights.do(key, render)
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail="render_timeout")
+
+
+def _render_document_citations(
+    conn: sqlite3.Connection, writer: WriteQueue, doc_id: str, ordered_uuids: list[str] | None
+) -> tuple[dict, list[dict], list]:
+    bundle = _load_bundle(conn, doc_id, ordered_uuids)
+    if bundle.order_updates:
+        writer.run(lambda write_conn: queries.apply_doc_order(write_conn, bundle.order_updates))
+    tracker = VariantTracker()
+    pending = []
+    for citation in bundle.citations:
+        source = bundle.sources.get(citation["source_id"])
         if not source:
             continue
-        output = render_citation(
-            citation, source, source.get("contributors", []), style, prior
-        )
-        outputs.append(
-            {
-                "citation_uuid": citation["citation_uuid"],
-                "plain_text": output.plain_text,
-                "runs": output.runs,
-                "metadata": output.metadata,
-            }
-        )
-        prior.append(citation)
+        pending.append((citation, source, tracker.advance(citation)))
+    rendered = render_citations_cached(conn, bundle.style, pending, writer)
+    return bundle.style, [citation for citation, _, _ in pending], rendered
 
-    return {"items": outputs, "style_version": style.get("version")}
 
+def _render_document_sources(
+    conn: sqlite3.Connection, writer: WriteQueue, doc_id: str, types: set[str] | None = None
+) -> tuple[dict, list[dict], list]:
+    bundle = _load_bundle(conn, doc_id)
+    sources = bundle.cited_sources()
+    if types is not None:
+        sources = [source for source in sources if source.get("type") in types]
+    return bundle.style, sources, render_bibliography_cached(conn, bundle.style, sources, writer)
 
-@router.post("/render/bibliography")
-def render_bibliography(
-    payload: RenderBibliographyRequest, conn: sqlite3.Connection = Depends(db_dependency)
+
+@router.post("/render/refresh")
+def render_refresh(
+    payload: RenderRefreshRequest,
+    conn: sqlite3.Connection = Depends(db_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
 ) -> dict:
-    doc = conn.execute(
-        "SELECT active_style_id FROM documents WHERE id = ?;",
-        (payload.doc_id,),
-    ).fetchone()
-    if not doc:
-        raise HTTPException(status_code=404, detail="document_not_found")
+    ordered_uuids = payload.citation_uuids
+    known_hashes: dict[str, str | None] = {}
+    if payload.cached is not None:
+        known_hashes = {item.citation_uuid: item.cached_render_hash for item in payload.cached}
+        if ordered_uuids is None:
+            ordered_uuids = [item.citation_uuid for item in payload.cached]
+
+    style, citations, rendered = _render_flight(
+        conn,
+        "refresh",
+        payload.doc_id,
+        ordered_uuids,
+        lambda: _render_document_citations(conn, writer, payload.doc_id, ordered_uuids),
+    )
+    outputs = [
+        {
+            "citation_uuid": citation["citation_uuid"],
+            "plain_text": output.plain_text,
+            "runs": output.runs,
+            "metadata": output.metadata,
+        }
+        for citation, output in zip(citations, rendered)
+        if payload.cached is None
+        or known_hashes.get(citation["citation_uuid"]) != output.metadata["render_hash"]
+    ]
+
+    response = {
+        "items": outputs,
+        "style_version": style.get("version"),
+        "style_revision": style.get("revision"),
+    }
+    if payload.cached is not None:
+        response["unchanged"] = len(rendered) - len(outputs)
+    return response
 
-    style = queries.get_style(conn, doc["active_style_id"])
-    if not style:
-        raise HTTPException(status_code=404, detail="style_not_found")
 
-    sources = queries.list_sources_for_doc(conn, payload.doc_id)
-    items = []
-    for source in sources:
-        output = render_bibliography_entry(
-            source, source.get("contributors", []), style
-        )
-        items.append(
-            {
-                "source_id": source.get("id"),
-                "plain_text": output.plain_text,
-                "runs": output.runs,
-                "metadata": output.metadata,
-            }
-        )
+@router.post("/render/bibliography")
+def render_bibliography(
+    payload: RenderBibliographyRequest,
+    conn: sqlite3.Connection = Depends(db_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
+) -> dict:
+    style, sources, rendered = _render_flight(
+        conn,
+        "bibliography",
+        payload.doc_id,
+        None,
+        lambda: _render_document_sources(conn, writer, payload.doc_id),
+    )
+    items = [
+        {
+            "source_id": source.get("id"),
+            "plain_text": output.plain_text,
+            "runs": output.runs,
+            "metadata": output.metadata,
+        }
+        for source, output in zip(sources, rendered)
+    ]
 
-    return {"items": items, "style_version": style.get("version")}
+    return {
+        "items": items,
+        "style_version": style.get("version"),
+        "style_revision": style.get("revision"),
+    }
 
 
 @router.post("/render/sourceslist")
 def render_sources_list(
-    payload: RenderSourcesListRequest, conn: sqlite3.Connection = Depends(db_dependency)
+    payload: RenderSourcesListRequest,
+    conn: sqlite3.Connection = Depends(db_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
 ) -> dict:
-    doc = conn.execute(
-        "SELECT active_style_id FROM documents WHERE id = ?;",
-        (payload.doc_id,),
-    ).fetchone()
-    if not doc:
-        raise HTTPException(status_code=404, detail="document_not_found")
-
-    style = queries.get_style(conn, doc["active_style_id"])
-    if not style:
-        raise HTTPException(status_code=404, detail="style_not_found")
-
-    sources = queries.list_sources_for_doc(conn, payload.doc_id)
     primary_types = {"primary_classical", "archive"}
-    filtered = [s for s in sources if s.get("type") in primary_types]
-    items = []
-    for source in filtered:
-        output = render_bibliography_entry(
-            source, source.get("contributors", []), style
-        )
-        items.append(
-            {
-                "source_id": source.get("id"),
-                "plain_text": output.plain_text,
-                "runs": output.runs,
-                "metadata": output.metadata,
-            }
-        )
+    style, sources, rendered = _render_flight(
+        conn,
+        "sourceslist",
+        payload.doc_id,
+        None,
+        lambda: _render_document_sources(conn, writer, payload.doc_id, primary_types),
+    )
+    items = [
+        {
+            "source_id": source.get("id"),
+            "plain_text": output.plain_text,
+            "runs": output.runs,
+            "metadata": output.metadata,
+        }
+        for source, output in zip(sources, rendered)
+    ]
 
-    return {"items": items, "style_version": style.get("version")}
+    return {
+        "items": items,
+        "style_version": style.get("version"),
+        "style_revision": style.get("revision"),
+    }
 
 
 @router.post("/validate/document")
 def validate_document(
     payload: ValidateDocumentRequest, conn: sqlite3.Connection = Depends(db_dependency)
 ) -> dict:
-    doc = conn.execute(
-        "SELECT id FROM documents WHERE id = ?;",
-        (payload.doc_id,),
-    ).fetchone()
-    if not doc:
+    state = queries.render_state(conn, payload.doc_id)
+    if not state:
         raise HTTPException(status_code=404, detail="document_not_found")
-
-    issues = []
-    citations = queries.list_citations_for_doc(conn, payload.doc_id)
-    for citation in citations:
-        source = conn.execute(
-            "SELECT id FROM sources WHERE id = ?;",
-            (citation["source_id"],),
-        ).fetchone()
-        if not source:
-            issues.append(
-                {
-                    "citation_uuid": citation["citation_uuid"],
-                    "error": "missing_source",
-                }
-            )
-
+    style = (
+        style_registry.get(conn, state["active_style_id"]) if state["active_style_id"] else None
+    )
+    issues = check_document(conn, payload.doc_id, style, payload.citation_uuids)
     return {"issues": issues}
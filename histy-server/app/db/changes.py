@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable
+
+# Long-poll waiters re-read the revision at least this often, so writes made by
+# another process (the bulk importer, a second worker) are noticed too.
+DEFAULT_POLL_INTERVAL = float(os.getenv("HISTY_CHANGES_POLL_S", "2"))
+
+
+class ChangeFeed:
+    # Wakes long-poll waiters after each writer commit. The revision itself
+    # lives in the change_feed table; this only saves waiters from polling it.
+    def __init__(self, poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        self.poll_interval = poll_interval
+        self._waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._lock = threading.Lock()
+        self.notifies = 0
+        self.checks = 0
+        self.wakeups = 0
+        self.timeouts = 0
+
+    def notify(self) -> None:
+        with self._lock:
+            self.notifies += 1
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The waiter's loop is already closed.
+                pass
+
+    async def wait(
+        self, read_revision: Callable[[], Awaitable[int]], since: int, timeout: float
+    ) -> int:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        event = asyncio.Event()
+        waiter = (loop, event)
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            while True:
+                event.clear()
+                revision = await read_revision()
+                with self._lock:
+                    self.checks += 1
+                if revision > since:
+                    with self._lock:
+                        self.wakeups += 1
+                    return revision
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    with self._lock:
+                        self.timeouts += 1
+                    return revision
+                try:
+                    await asyncio.wait_for(event.wait(), min(self.poll_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "waiters": len(self._waiters),
+                "notifies": self.notifies,
+                "checks": self.checks,
+                "wakeups": self.wakeups,
+                "timeouts": self.timeouts,
+            }
+
+
+change_feed = ChangeFeed()
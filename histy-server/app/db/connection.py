@@ -1,24 +1,172 @@
 from __future__ import annotations
 
 import os
+import queue
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Generator
+from typing import Any, Generator
 
+from .changes import change_feed
 from .migrations import apply_migrations, seed_db
+from .names import register_functions
+from .writer import WriteQueue
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 DEFAULT_DB_PATH = os.getenv("HISTY_DB_PATH", str(BASE_DIR / "histy.db"))
+# Matches the default size of the threadpool uvicorn/anyio runs sync endpoints in.
+DEFAULT_POOL_SIZE = int(os.getenv("HISTY_DB_POOL_SIZE", "40"))
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",
+    "PRAGMA mmap_size = 268435456;",
+    "PRAGMA busy_timeout = 5000;",
+    "PRAGMA temp_store = MEMORY;",
+)
 
 
 def get_connection(db_path: str | None = None) -> sqlite3.Connection:
     path = db_path or DEFAULT_DB_PATH
-    conn = sqlite3.connect(path)
+    conn = sqlite3.connect(path, check_same_thread=False, cached_statements=512)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    register_functions(conn)
     return conn
 
 
+class ConnectionPool:
+    def __init__(self, db_path: str, size: int = DEFAULT_POOL_SIZE, timeout: float = 30.0) -> None:
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self) -> sqlite3.Connection:
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open_or_wait()
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._checkouts += 1
+            if waited > 0.001:
+                self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def _open_or_wait(self) -> sqlite3.Connection:
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+        if can_open:
+            try:
+                return get_connection(self.db_path)
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("db_pool_exhausted") from None
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "opened": self._opened,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_ms_total": round(self._wait_total * 1000, 3),
+                "wait_ms_max": round(self._wait_max * 1000, 3),
+                "wait_ms_avg": (
+                    round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0
+                ),
+            }
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DEFAULT_DB_PATH)
+    return _pool
+
+
+def pool_stats() -> dict[str, Any]:
+    return _pool.stats() if _pool is not None else {}
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+_writer: WriteQueue | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> WriteQueue:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = WriteQueue(
+                    lambda: get_connection(DEFAULT_DB_PATH), on_commit=change_feed.notify
+                )
+    return _writer
+
+
+def writer_stats() -> dict[str, Any]:
+    return _writer.stats() if _writer is not None else {}
+
+
+def close_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+
+
 def init_db(db_path: str | None = None) -> None:
     path = db_path or DEFAULT_DB_PATH
     Path(path).parent.mkdir(parents=True, exist_ok=True)
@@ -33,8 +181,17 @@ def init_db(db_path: str | None = None) -> None:
 
 
 def db_dependency() -> Generator[sqlite3.Connection, None, None]:
-    conn = get_connection()
+    pool = get_pool()
+    conn = pool.acquire()
     try:
         yield conn
     finally:
-        conn.close()
+        pool.release(conn)
+
+
+def pool_dependency() -> ConnectionPool:
+    return get_pool()
+
+
+def writer_dependency() -> WriteQueue:
+    return get_writer()
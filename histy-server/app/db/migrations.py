@@ -4,6 +4,9 @@ import sqlite3
 from pathlib import Path
 from typing import Iterable
 
+from .names import register_functions
+from .queries import index_source_trigrams, refresh_style_revision
+
 
 def _ensure_migration_table(conn: sqlite3.Connection) -> None:
     conn.execute(
@@ -23,6 +26,7 @@ def _existing_versions(conn: sqlite3.Connection) -> set[int]:
 
 
 def apply_migrations(conn: sqlite3.Connection, migrations_path: Path) -> None:
+    register_functions(conn)
     _ensure_migration_table(conn)
     existing = _existing_versions(conn)
     for path in sorted(migrations_path.glob("*.sql")):
@@ -45,4 +49,12 @@ def seed_db(conn: sqlite3.Connection, seed_path: Path) -> None:
         return
     sql = (seed_path / "seed.sql").read_text(encoding="ascii")
     conn.executescript(sql)
+    register_functions(conn)
+    conn.execute(
+        "UPDATE contributors SET name_key = histy_contributor_key(name, is_corporate) "
+        "WHERE name_key IS NULL;"
+    )
+    index_source_trigrams(conn, [row[0] for row in conn.execute("SELECT id FROM sources;")])
+    for row in conn.execute("SELECT id FROM style_packages;").fetchall():
+        refresh_style_revision(conn, row[0])
     conn.commit()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import unicodedata
+
+
+def fold_text(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def canonical_name(name: str, is_corporate: bool) -> str:
+    name = " ".join((name or "").split())
+    if is_corporate:
+        return name
+    if "," in name:
+        surname, given = name.split(",", 1)
+        surname, given = surname.strip(), given.strip()
+    else:
+        parts = name.split()
+        if len(parts) <= 1:
+            return name
+        surname, given = parts[-1], " ".join(parts[:-1])
+    return f"{surname}, {given}" if given else surname
+
+
+def contributor_key(name: str, is_corporate: bool) -> str:
+    prefix = "org" if is_corporate else "person"
+    return f"{prefix}:{fold_text(canonical_name(name, is_corporate))}"
+
+
+def register_functions(conn: sqlite3.Connection) -> None:
+    conn.create_function(
+        "histy_contributor_key",
+        2,
+        lambda name, is_corporate: contributor_key(name or "", bool(is_corporate)),
+        deterministic=True,
+    )
+    conn.create_function(
+        "histy_fold", 1, lambda text: fold_text(text or ""), deterministic=True
+    )
+    conn.create_function(
+        "histy_sha256",
+        1,
+        lambda text: hashlib.sha256((text or "").encode("utf-8")).hexdigest(),
+        deterministic=True,
+    )
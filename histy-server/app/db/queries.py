@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+import base64
+import bisect
+import hashlib
 import json
+import re
 import sqlite3
 import uuid
-from typing import Any
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from .names import contributor_key, fold_text
 
 SOURCE_COLUMNS = [
     "id",
@@ -26,10 +33,79 @@ SOURCE_COLUMNS = [
 ]
 
 
+_IN_CHUNK = 500
+# Spacing between consecutive citations' doc_order keys, leaving room to slot moved
+# or inserted footnotes in without renumbering the whole document.
+DOC_ORDER_GAP = 1024
+# Fuzzy search re-scores at most limit * FUZZY_CANDIDATES trigram candidates and
+# drops those sharing fewer than this fraction of the query's trigrams.
+FUZZY_CANDIDATES = 10
+FUZZY_MIN_SIMILARITY = 0.3
+
+
+def _chunks(values: list[Any], size: int = _IN_CHUNK) -> list[list[Any]]:
+    return [values[start : start + size] for start in range(0, len(values), size)]
+
+
 def _row_to_dict(row: sqlite3.Row, columns: list[str]) -> dict[str, Any]:
     return {col: row[col] for col in columns}
 
 
+def style_revision(conn: sqlite3.Connection, style_id: str) -> str:
+    # SHA-256 over a style's templates, rules and abbreviations, joined the way
+    # migration 009 backfilled it so existing revisions stay valid.
+    rows = conn.execute(
+        """
+        SELECT 'template:' || key || '=' || markdown AS part
+        FROM style_templates WHERE style_id = ?
+        UNION ALL
+        SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = ?
+        UNION ALL
+        SELECT 'abbreviation:' || key || '=' || value
+        FROM style_abbreviations WHERE style_id = ?
+        ORDER BY part;
+        """,
+        (style_id, style_id, style_id),
+    ).fetchall()
+    text = "\x1e".join(row[0] for row in rows if row[0] is not None)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def refresh_style_revision(conn: sqlite3.Connection, style_id: str) -> str:
+    revision = style_revision(conn, style_id)
+    conn.execute(
+        "UPDATE style_packages SET revision = ? WHERE id = ? AND revision IS NOT ?;",
+        (revision, style_id, revision),
+    )
+    return revision
+
+
+def update_style_templates(
+    conn: sqlite3.Connection,
+    style_id: str,
+    templates: dict[str, str],
+    base_revision: str | None = None,
+) -> str:
+    # Runs inside one transaction and rehashes the style once, after all rows
+    # are written. base_revision rejects saves made against a stale form.
+    row = conn.execute("SELECT revision FROM style_packages WHERE id = ?;", (style_id,)).fetchone()
+    if row is None:
+        raise ValueError("style_not_found")
+    if base_revision is not None and row["revision"] != base_revision:
+        raise ValueError("style_revision_conflict")
+    before = conn.total_changes
+    conn.executemany(
+        """
+        UPDATE style_templates SET markdown = ?
+        WHERE style_id = ? AND key = ? AND markdown <> ?;
+        """,
+        [(markdown, style_id, key, markdown) for key, markdown in templates.items()],
+    )
+    if conn.total_changes == before:
+        return row["revision"]
+    return refresh_style_revision(conn, style_id)
+
+
 def list_styles(conn: sqlite3.Connection) -> list[dict[str, Any]]:
     cur = conn.execute(
         "SELECT id, name, version, description, built_in FROM style_packages ORDER BY name;"
@@ -37,57 +113,186 @@ def list_styles(conn: sqlite3.Connection) -> list[dict[str, Any]]:
     return [dict(row) for row in cur.fetchall()]
 
 
+def _style_parts(conn: sqlite3.Connection, style_id: str) -> dict[str, Any]:
+    rows = conn.execute(
+        """
+        SELECT 'template' AS kind, key, markdown AS value FROM style_templates WHERE style_id = ?
+        UNION ALL
+        SELECT 'rules' AS kind, NULL AS key, rules_json AS value FROM style_rules WHERE style_id = ?
+        UNION ALL
+        SELECT 'abbreviation' AS kind, key, value FROM style_abbreviations WHERE style_id = ?
+        ORDER BY kind, key;
+        """,
+        (style_id, style_id, style_id),
+    ).fetchall()
+
+    templates = {row["key"]: row["value"] for row in rows if row["kind"] == "template"}
+    abbreviations = {row["key"]: row["value"] for row in rows if row["kind"] == "abbreviation"}
+    rule_values = [row["value"] for row in rows if row["kind"] == "rules"]
+    rules = json.loads(rule_values[0]) if rule_values else {}
+    return {"templates": templates, "rules": rules, "abbreviations": abbreviations}
+
+
 def get_style(conn: sqlite3.Connection, style_id: str) -> dict[str, Any] | None:
     cur = conn.execute(
-        "SELECT id, name, version, description, built_in FROM style_packages WHERE id = ?;",
+        """
+        SELECT id, name, version, description, built_in, modification_counter, revision
+        FROM style_packages
+        WHERE id = ?;
+        """,
         (style_id,),
     )
     row = cur.fetchone()
     if not row:
         return None
+    return {**dict(row), **_style_parts(conn, style_id)}
 
-    template_rows = conn.execute(
-        "SELECT key, markdown FROM style_templates WHERE style_id = ? ORDER BY key;",
-        (style_id,),
-    ).fetchall()
-    rule_row = conn.execute(
-        "SELECT rules_json FROM style_rules WHERE style_id = ?;",
+
+def get_style_revision(conn: sqlite3.Connection, style_id: str) -> tuple[str, int] | None:
+    row = conn.execute(
+        "SELECT version, modification_counter FROM style_packages WHERE id = ?;",
         (style_id,),
     ).fetchone()
-    abbr_rows = conn.execute(
-        "SELECT key, value FROM style_abbreviations WHERE style_id = ? ORDER BY key;",
-        (style_id,),
-    ).fetchall()
+    return (row["version"], row["modification_counter"]) if row else None
 
-    rules = json.loads(rule_row["rules_json"]) if rule_row else {}
-    templates = {row["key"]: row["markdown"] for row in template_rows}
-    abbreviations = {row["key"]: row["value"] for row in abbr_rows}
 
-    return {
-        **dict(row),
-        "templates": templates,
-        "rules": rules,
-        "abbreviations": abbreviations,
-    }
+def _fts_query(q: str) -> str:
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
 
 
-def search_sources(conn: sqlite3.Connection, q: str, limit: int) -> list[dict[str, Any]]:
-    like = f"%{q}%"
-    cur = conn.execute(
-        """
+def search_sources(
+    conn: sqlite3.Connection, q: str, limit: int, fuzzy: bool = False
+) -> list[dict[str, Any]]:
+    if fuzzy:
+        return fuzzy_search_sources(conn, q, limit)
+    match = _fts_query(q)
+    if match:
+        cur = conn.execute(
+            """
+            SELECT s.id, s.title, s.short_title, s.type, s.year
+            FROM sources_fts
+            JOIN sources s ON s.rowid = sources_fts.rowid
+            WHERE sources_fts MATCH ?
+            ORDER BY bm25(sources_fts, 10.0, 6.0, 2.0, 1.0, 1.0, 1.0, 4.0), s.title
+            LIMIT ?;
+            """,
+            (match, limit),
+        )
+    else:
+        cur = conn.execute(
+            """
+            SELECT id, title, short_title, type, year
+            FROM sources
+            ORDER BY title
+            LIMIT ?;
+            """,
+            (limit,),
+        )
+    results = [dict(row) for row in cur.fetchall()]
+    if match and not results:
+        return fuzzy_search_sources(conn, q, limit)
+    contributors = list_contributors_for_sources(conn, [item["id"] for item in results])
+    for item in results:
+        item["contributors"] = contributors.get(item["id"], [])
+    return results
+
+
+def encode_cursor(title: str, source_id: str) -> str:
+    raw = json.dumps([title, source_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        title, source_id = json.loads(raw.decode("utf-8"))
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor") from None
+    if not isinstance(title, str) or not isinstance(source_id, str):
+        raise ValueError("invalid cursor")
+    return title, source_id
+
+
+def list_sources_page(
+    conn: sqlite3.Connection,
+    limit: int,
+    after: tuple[str, str] | None = None,
+    q: str = "",
+) -> tuple[list[dict[str, Any]], tuple[str, str] | None]:
+    # Keyset pagination on (title, id): each page seeks idx_sources_title_id past
+    # the last row of the previous one, so deep pages cost the same as the first.
+    clauses = []
+    params: list[Any] = []
+    match = _fts_query(q)
+    if match:
+        clauses.append("rowid IN (SELECT rowid FROM sources_fts WHERE sources_fts MATCH ?)")
+        params.append(match)
+    if after is not None:
+        clauses.append("(title, id) > (?, ?)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(
+        f"""
         SELECT id, title, short_title, type, year
         FROM sources
-        WHERE title LIKE ? OR short_title LIKE ?
-        ORDER BY title
+        {where}
+        ORDER BY title, id
         LIMIT ?;
         """,
-        (like, like, limit),
-    )
-    results = []
-    for row in cur.fetchall():
-        data = dict(row)
-        data["contributors"] = list_source_contributors(conn, row["id"])
-        results.append(data)
+        [*params, limit + 1],
+    ).fetchall()
+
+    items = [dict(row) for row in rows[:limit]]
+    contributors = list_contributors_for_sources(conn, [item["id"] for item in items])
+    for item in items:
+        item["contributors"] = contributors.get(item["id"], [])
+    next_after = (items[-1]["title"], items[-1]["id"]) if len(rows) > limit else None
+    return items, next_after
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[idx : idx + 3] for idx in range(len(text) - 2)}
+
+
+def fuzzy_search_sources(conn: sqlite3.Connection, q: str, limit: int) -> list[dict[str, Any]]:
+    # Trigram candidates come from sources_trigram ranked by bm25; only that
+    # candidate set is re-scored by how many of the query's trigrams it contains.
+    words = [word for word in re.findall(r"\w+", fold_text(q)) if len(word) >= 3]
+    wanted = set().union(*(_trigrams(word) for word in words)) if words else set()
+    if not wanted:
+        return []
+
+    match = " OR ".join(f'"{trigram}"' for trigram in sorted(wanted))
+    rows = conn.execute(
+        """
+        SELECT s.id, s.title, s.short_title, s.type, s.year, t.text
+        FROM sources_trigram t
+        JOIN sources s ON s.rowid = t.rowid
+        WHERE sources_trigram MATCH ?
+        ORDER BY bm25(sources_trigram)
+        LIMIT ?;
+        """,
+        (match, max(limit * FUZZY_CANDIDATES, 50)),
+    ).fetchall()
+
+    scored = []
+    for row in rows:
+        found = _trigrams(row["text"])
+        shared = len(wanted & found)
+        similarity = shared / len(wanted)
+        if similarity < FUZZY_MIN_SIMILARITY:
+            continue
+        item = dict(row)
+        item.pop("text")
+        item["similarity"] = round(similarity, 3)
+        scored.append((-similarity, -shared / len(found | wanted), item["title"], item))
+    scored.sort(key=lambda entry: entry[:3])
+
+    results = [item for *_, item in scored[:limit]]
+    contributors = list_contributors_for_sources(conn, [item["id"] for item in results])
+    for item in results:
+        item["contributors"] = contributors.get(item["id"], [])
     return results
 
 
@@ -105,108 +310,245 @@ def list_source_contributors(conn: sqlite3.Connection, source_id: str) -> list[d
     return [dict(row) for row in cur.fetchall()]
 
 
+def list_contributors_for_sources(
+    conn: sqlite3.Connection, source_ids: list[str]
+) -> dict[str, list[dict[str, Any]]]:
+    grouped: dict[str, list[dict[str, Any]]] = {}
+    for chunk in _chunks(list(dict.fromkeys(source_ids))):
+        cur = conn.execute(
+            f"""
+            SELECT sc.source_id, c.id, c.name, c.is_corporate, sc.role, sc.position
+            FROM source_contributors sc
+            JOIN contributors c ON c.id = sc.contributor_id
+            WHERE sc.source_id IN ({', '.join(['?'] * len(chunk))})
+            ORDER BY sc.source_id, sc.position ASC;
+            """,
+            chunk,
+        )
+        for row in cur.fetchall():
+            data = dict(row)
+            grouped.setdefault(data.pop("source_id"), []).append(data)
+    return grouped
+
+
+def get_sources(conn: sqlite3.Connection, source_ids: list[str]) -> dict[str, dict[str, Any]]:
+    sources: dict[str, dict[str, Any]] = {}
+    for chunk in _chunks(list(dict.fromkeys(source_ids))):
+        cur = conn.execute(
+            f"""
+            SELECT {', '.join(SOURCE_COLUMNS)}
+            FROM sources
+            WHERE id IN ({', '.join(['?'] * len(chunk))});
+            """,
+            chunk,
+        )
+        for row in cur.fetchall():
+            sources[row["id"]] = _row_to_dict(row, SOURCE_COLUMNS)
+    contributors = list_contributors_for_sources(conn, list(sources))
+    for source_id, data in sources.items():
+        data["contributors"] = contributors.get(source_id, [])
+    return sources
+
+
 def get_source(conn: sqlite3.Connection, source_id: str) -> dict[str, Any] | None:
-    cur = conn.execute(
-        f"SELECT {', '.join(SOURCE_COLUMNS)} FROM sources WHERE id = ?;",
-        (source_id,),
-    )
-    row = cur.fetchone()
-    if not row:
-        return None
-    data = _row_to_dict(row, SOURCE_COLUMNS)
-    data["contributors"] = list_source_contributors(conn, source_id)
-    return data
+    return get_sources(conn, [source_id]).get(source_id)
 
 
-def upsert_source(conn: sqlite3.Connection, payload: dict[str, Any]) -> dict[str, Any]:
-    source_id = payload.get("id") or str(uuid.uuid4())
+SOURCE_UPSERT_SQL = f"""
+    INSERT INTO sources ({', '.join(SOURCE_COLUMNS)})
+    VALUES ({', '.join(['?'] * len(SOURCE_COLUMNS))})
+    ON CONFLICT(id) DO UPDATE SET {', '.join(f'{col} = excluded.{col}' for col in SOURCE_COLUMNS[1:])};
+"""
+
+
+SOURCE_IMPORT_SQL = f"""
+    INSERT INTO sources ({', '.join(SOURCE_COLUMNS)}, external_key)
+    VALUES ({', '.join(['?'] * (len(SOURCE_COLUMNS) + 1))})
+    ON CONFLICT(id) DO UPDATE SET {', '.join(f'{col} = excluded.{col}' for col in SOURCE_COLUMNS[1:])};
+"""
+
+
+def source_ids_for_external_keys(conn: sqlite3.Connection, keys: list[str]) -> dict[str, str]:
+    found: dict[str, str] = {}
+    for chunk in _chunks(keys):
+        cur = conn.execute(
+            f"""
+            SELECT id, external_key FROM sources
+            WHERE external_key IN ({', '.join(['?'] * len(chunk))});
+            """,
+            chunk,
+        )
+        found.update({row["external_key"]: row["id"] for row in cur.fetchall()})
+    return found
+
+
+def source_params(source_id: str, payload: dict[str, Any]) -> list[Any]:
     values = {col: payload.get(col) for col in SOURCE_COLUMNS}
     values["id"] = source_id
+    return [values[col] for col in SOURCE_COLUMNS]
 
-    placeholders = ", ".join([f"{col} = ?" for col in SOURCE_COLUMNS[1:]])
-    columns = ", ".join(SOURCE_COLUMNS)
-    params = [values[col] for col in SOURCE_COLUMNS]
 
-    conn.execute(
-        f"""
-        INSERT INTO sources ({columns}) VALUES ({', '.join(['?'] * len(SOURCE_COLUMNS))})
-        ON CONFLICT(id) DO UPDATE SET {placeholders};
+def index_source_trigrams(conn: sqlite3.Connection, source_ids: list[str]) -> None:
+    # Called after a source or its contributors change. The folding happens here
+    # instead of in a trigger so the schema does not depend on app-registered
+    # SQL functions.
+    for chunk in _chunks(list(dict.fromkeys(source_ids))):
+        rows = conn.execute(
+            f"""
+            SELECT s.rowid,
+                   coalesce(s.title, '') || ' ' || coalesce(s.short_title, '') || ' ' ||
+                   coalesce((SELECT group_concat(c.name, ' ')
+                             FROM source_contributors sc
+                             JOIN contributors c ON c.id = sc.contributor_id
+                             WHERE sc.source_id = s.id), '') AS text
+            FROM sources s
+            WHERE s.id IN ({', '.join(['?'] * len(chunk))});
+            """,
+            chunk,
+        ).fetchall()
+        conn.executemany(
+            "DELETE FROM sources_trigram WHERE rowid = ?;", [(row[0],) for row in rows]
+        )
+        conn.executemany(
+            "INSERT INTO sources_trigram (rowid, text) VALUES (?, ?);",
+            [(row[0], fold_text(row["text"])) for row in rows],
+        )
+
+
+def resolve_contributors(
+    conn: sqlite3.Connection, names: list[tuple[str, bool]]
+) -> tuple[dict[str, str], int]:
+    # Returns ids keyed by contributor_key plus the number of newly created rows;
+    # the UNIQUE name_key index makes concurrent resolvers converge on one row.
+    rows = {}
+    for name, is_corporate in names:
+        key = contributor_key(name, is_corporate)
+        rows.setdefault(key, (str(uuid.uuid4()), name, int(bool(is_corporate)), key))
+    if not rows:
+        return {}, 0
+
+    before = conn.total_changes
+    conn.executemany(
+        """
+        INSERT INTO contributors (id, name, is_corporate, name_key) VALUES (?, ?, ?, ?)
+        ON CONFLICT(name_key) DO NOTHING;
         """,
-        params,
+        list(rows.values()),
     )
+    created = conn.total_changes - before
+
+    resolved: dict[str, str] = {}
+    for chunk in _chunks(list(rows)):
+        cur = conn.execute(
+            f"""
+            SELECT id, name_key FROM contributors
+            WHERE name_key IN ({', '.join(['?'] * len(chunk))});
+            """,
+            chunk,
+        )
+        resolved.update({row["name_key"]: row["id"] for row in cur.fetchall()})
+    return resolved, created
+
+
+def upsert_source(conn: sqlite3.Connection, payload: dict[str, Any]) -> dict[str, Any]:
+    source_id = payload.get("id") or str(uuid.uuid4())
+    conn.execute(SOURCE_UPSERT_SQL, source_params(source_id, payload))
 
     conn.execute("DELETE FROM source_contributors WHERE source_id = ?;", (source_id,))
     contributors = payload.get("contributors", [])
-    for position, contributor in enumerate(contributors, start=1):
-        contributor_id = contributor.get("id")
-        if not contributor_id:
-            row = conn.execute(
-                "SELECT id FROM contributors WHERE name = ? AND is_corporate = ?;",
-                (contributor.get("name"), int(bool(contributor.get("is_corporate")))),
-            ).fetchone()
-            if row:
-                contributor_id = row["id"]
-            else:
-                contributor_id = str(uuid.uuid4())
-                conn.execute(
-                    "INSERT INTO contributors (id, name, is_corporate) VALUES (?, ?, ?);",
-                    (
-                        contributor_id,
-                        contributor.get("name"),
-                        int(bool(contributor.get("is_corporate"))),
-                    ),
-                )
-
-        conn.execute(
-            """
-            INSERT INTO source_contributors (source_id, contributor_id, role, position)
-            VALUES (?, ?, ?, ?);
-            """,
+    resolved, _ = resolve_contributors(
+        conn,
+        [
+            (c.get("name") or "", bool(c.get("is_corporate")))
+            for c in contributors
+            if not c.get("id")
+        ],
+    )
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO source_contributors (source_id, contributor_id, role, position)
+        VALUES (?, ?, ?, ?);
+        """,
+        [
             (
                 source_id,
-                contributor_id,
+                contributor.get("id")
+                or resolved[
+                    contributor_key(contributor.get("name") or "", bool(contributor.get("is_corporate")))
+                ],
                 contributor.get("role"),
                 position,
-            ),
-        )
-
-    conn.commit()
+            )
+            for position, contributor in enumerate(contributors, start=1)
+        ],
+    )
+    index_source_trigrams(conn, [source_id])
     return get_source(conn, source_id) or {}
 
 
+def get_document_by_fingerprint(
+    conn: sqlite3.Connection, doc_fingerprint: str
+) -> dict[str, Any] | None:
+    row = conn.execute(
+        "SELECT id, doc_fingerprint, name, active_style_id FROM documents WHERE doc_fingerprint = ?;",
+        (doc_fingerprint,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def document_changes(document: dict[str, Any], payload: dict[str, Any]) -> dict[str, Any]:
+    # Fields left out of the payload keep their stored value.
+    return {
+        field_name: payload[field_name]
+        for field_name in ("name", "active_style_id")
+        if payload.get(field_name) is not None and payload[field_name] != document.get(field_name)
+    }
+
+
+def document_differs(conn: sqlite3.Connection, doc_id: str, payload: dict[str, Any]) -> bool:
+    # Checked against the stored row rather than a cached copy, which another
+    # process may have made stale.
+    name = payload.get("name")
+    active_style_id = payload.get("active_style_id")
+    if name is None and active_style_id is None:
+        return False
+    row = conn.execute(
+        """
+        SELECT 1 FROM documents
+        WHERE id = ?
+          AND ((? IS NOT NULL AND name IS NOT ?)
+               OR (? IS NOT NULL AND active_style_id IS NOT ?));
+        """,
+        (doc_id, name, name, active_style_id, active_style_id),
+    ).fetchone()
+    return row is not None
+
+
 def upsert_document(conn: sqlite3.Connection, payload: dict[str, Any]) -> dict[str, Any]:
     doc_fingerprint = payload.get("doc_fingerprint")
     if not doc_fingerprint:
         raise ValueError("doc_fingerprint is required")
 
-    cur = conn.execute(
-        "SELECT id, doc_fingerprint, name, active_style_id FROM documents WHERE doc_fingerprint = ?;",
-        (doc_fingerprint,),
-    )
-    existing = cur.fetchone()
+    existing = get_document_by_fingerprint(conn, doc_fingerprint)
+    if existing:
+        changes = document_changes(existing, payload)
+        if changes:
+            existing.update(changes)
+            conn.execute(
+                """
+                UPDATE documents
+                SET name = ?, active_style_id = ?, updated_at = datetime('now')
+                WHERE id = ?;
+                """,
+                (existing["name"], existing["active_style_id"], existing["id"]),
+            )
+        return existing
 
     active_style_id = payload.get("active_style_id")
     if not active_style_id:
         row = conn.execute("SELECT id FROM style_packages ORDER BY name LIMIT 1;").fetchone()
         active_style_id = row["id"] if row else None
 
-    if existing:
-        conn.execute(
-            """
-            UPDATE documents
-            SET name = ?, active_style_id = ?, updated_at = datetime('now')
-            WHERE id = ?;
-            """,
-            (payload.get("name"), active_style_id, existing["id"]),
-        )
-        conn.commit()
-        return {
-            "id": existing["id"],
-            "doc_fingerprint": doc_fingerprint,
-            "name": payload.get("name"),
-            "active_style_id": active_style_id,
-        }
-
     doc_id = str(uuid.uuid4())
     conn.execute(
         """
@@ -215,7 +557,6 @@ def upsert_document(conn: sqlite3.Connection, payload: dict[str, Any]) -> dict[s
         """,
         (doc_id, doc_fingerprint, payload.get("name"), active_style_id),
     )
-    conn.commit()
     return {
         "id": doc_id,
         "doc_fingerprint": doc_fingerprint,
@@ -225,34 +566,47 @@ def upsert_document(conn: sqlite3.Connection, payload: dict[str, Any]) -> dict[s
 
 
 def create_citation(conn: sqlite3.Connection, payload: dict[str, Any]) -> dict[str, Any]:
-    citation_uuid = str(uuid.uuid4())
-    doc_id = payload.get("doc_id")
-    source_id = payload.get("source_id")
-    locator = payload.get("locator")
-    note_type = payload.get("note_type")
+    return create_citations(conn, payload.get("doc_id"), [payload])[0]
 
+
+def create_citations(
+    conn: sqlite3.Connection, doc_id: str, items: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
     row = conn.execute(
-        "SELECT COALESCE(MAX(doc_order), 0) + 1 AS next_order FROM citations WHERE doc_id = ?;",
+        "SELECT COALESCE(MAX(doc_order), 0) AS last_order FROM citations WHERE doc_id = ?;",
         (doc_id,),
     ).fetchone()
-    doc_order = row["next_order"]
+    last_order = row["last_order"]
 
-    conn.execute(
+    citations = [
+        {
+            "citation_uuid": str(uuid.uuid4()),
+            "doc_id": doc_id,
+            "source_id": item.get("source_id"),
+            "locator": item.get("locator"),
+            "note_type": item.get("note_type"),
+            "doc_order": last_order + DOC_ORDER_GAP * idx,
+        }
+        for idx, item in enumerate(items, start=1)
+    ]
+    conn.executemany(
         """
         INSERT INTO citations (citation_uuid, doc_id, source_id, locator, note_type, created_at, doc_order)
         VALUES (?, ?, ?, ?, ?, datetime('now'), ?);
         """,
-        (citation_uuid, doc_id, source_id, locator, note_type, doc_order),
+        [
+            (
+                c["citation_uuid"],
+                c["doc_id"],
+                c["source_id"],
+                c["locator"],
+                c["note_type"],
+                c["doc_order"],
+            )
+            for c in citations
+        ],
     )
-    conn.commit()
-    return {
-        "citation_uuid": citation_uuid,
-        "doc_id": doc_id,
-        "source_id": source_id,
-        "locator": locator,
-        "note_type": note_type,
-        "doc_order": doc_order,
-    }
+    return citations
 
 
 def get_citation(conn: sqlite3.Connection, citation_uuid: str) -> dict[str, Any] | None:
@@ -260,7 +614,7 @@ def get_citation(conn: sqlite3.Connection, citation_uuid: str) -> dict[str, Any]
         """
         SELECT citation_uuid, doc_id, source_id, locator, note_type, doc_order
         FROM citations
-        WHERE citation_uuid = ?;
+        WHERE citation_uuid = ? AND deleted_at IS NULL;
         """,
         (citation_uuid,),
     )
@@ -271,42 +625,146 @@ def get_citation(conn: sqlite3.Connection, citation_uuid: str) -> dict[str, Any]
 def list_citations_for_doc(
     conn: sqlite3.Connection, doc_id: str, ordered_uuids: list[str] | None = None
 ) -> list[dict[str, Any]]:
-    if ordered_uuids:
-        order_cases = " ".join(
-            [f"WHEN citation_uuid = ? THEN {idx}" for idx, _ in enumerate(ordered_uuids)]
-        )
-        cur = conn.execute(
-            f"""
-            SELECT citation_uuid, doc_id, source_id, locator, note_type, doc_order
-            FROM citations
-            WHERE doc_id = ?
-            ORDER BY CASE {order_cases} ELSE doc_order END, doc_order;
-            """,
-            [doc_id, *ordered_uuids],
-        )
-        citations = [dict(row) for row in cur.fetchall()]
-        _apply_doc_order(conn, ordered_uuids)
-        return citations
-
     cur = conn.execute(
         """
         SELECT citation_uuid, doc_id, source_id, locator, note_type, doc_order
         FROM citations
-        WHERE doc_id = ?
+        WHERE doc_id = ? AND deleted_at IS NULL
         ORDER BY doc_order, created_at;
         """,
         (doc_id,),
     )
-    return [dict(row) for row in cur.fetchall()]
+    citations = [dict(row) for row in cur.fetchall()]
+    if not ordered_uuids:
+        return citations
 
+    ordered, updates = order_citations(citations, ordered_uuids)
+    apply_doc_order(conn, updates)
+    return ordered
+
+
+def order_citations(
+    citations: list[dict[str, Any]], ordered_uuids: list[str]
+) -> tuple[list[dict[str, Any]], list[tuple[int, str]]]:
+    positions = {citation_uuid: idx for idx, citation_uuid in enumerate(ordered_uuids)}
+    listed = sorted(
+        (c for c in citations if c["citation_uuid"] in positions),
+        key=lambda c: positions[c["citation_uuid"]],
+    )
+    unlisted = [c for c in citations if c["citation_uuid"] not in positions]
+    ordered = listed + unlisted
+    return ordered, _doc_order_updates(ordered)
+
+
+def _longest_increasing_run(keys: list[int]) -> set[int]:
+    # Indices of one longest strictly increasing subsequence (patience sorting).
+    tails: list[int] = []
+    tail_idx: list[int] = []
+    parents = [-1] * len(keys)
+    for idx, key in enumerate(keys):
+        pos = bisect.bisect_left(tails, key)
+        if pos == len(tails):
+            tails.append(key)
+            tail_idx.append(idx)
+        else:
+            tails[pos] = key
+            tail_idx[pos] = idx
+        parents[idx] = tail_idx[pos - 1] if pos else -1
+    keep: set[int] = set()
+    idx = tail_idx[-1] if tail_idx else -1
+    while idx != -1:
+        keep.add(idx)
+        idx = parents[idx]
+    return keep
+
+
+def _gap_keys(keys: list[int]) -> list[int] | None:
+    # Keep the longest already-sorted run of keys and slot moved citations into the
+    # gaps between them; None means a gap is exhausted and the document needs renumbering.
+    keep = _longest_increasing_run(keys)
+    result = list(keys)
+    idx = 0
+    while idx < len(keys):
+        if idx in keep:
+            idx += 1
+            continue
+        run_start = idx
+        while idx < len(keys) and idx not in keep:
+            idx += 1
+        count = idx - run_start
+        lower = result[run_start - 1] if run_start > 0 else None
+        upper = keys[idx] if idx < len(keys) else None
+        for offset in range(count):
+            if lower is None and upper is None:
+                result[run_start + offset] = DOC_ORDER_GAP * (offset + 1)
+            elif lower is None:
+                result[run_start + offset] = upper - DOC_ORDER_GAP * (count - offset)
+            elif upper is None:
+                result[run_start + offset] = lower + DOC_ORDER_GAP * (offset + 1)
+            else:
+                if upper - lower <= count:
+                    return None
+                result[run_start + offset] = lower + (upper - lower) * (offset + 1) // (count + 1)
+    return result
+
+
+def _doc_order_updates(ordered: list[dict[str, Any]]) -> list[tuple[int, str]]:
+    keys = [citation["doc_order"] for citation in ordered]
+    if all(a < b for a, b in zip(keys, keys[1:])):
+        return []
+
+    new_keys = _gap_keys(keys)
+    if new_keys is None:
+        new_keys = [DOC_ORDER_GAP * (idx + 1) for idx in range(len(ordered))]
+
+    updates = []
+    for citation, key in zip(ordered, new_keys):
+        if citation["doc_order"] != key:
+            citation["doc_order"] = key
+            updates.append((key, citation["citation_uuid"]))
+    return updates
+
+
+def apply_doc_order(conn: sqlite3.Connection, updates: list[tuple[int, str]]) -> None:
+    if updates:
+        conn.executemany("UPDATE citations SET doc_order = ? WHERE citation_uuid = ?;", updates)
+
+
+def citation_prefix_state(
+    conn: sqlite3.Connection, doc_id: str, before_order: int | None = None
+) -> tuple[set[str], tuple[Any, Any] | None]:
+    bound = "AND doc_order < ?" if before_order is not None else ""
+    params: list[Any] = [doc_id] if before_order is None else [doc_id, before_order]
+    seen = {
+        row["source_id"]
+        for row in conn.execute(
+            f"SELECT DISTINCT source_id FROM citations "
+            f"WHERE doc_id = ? AND deleted_at IS NULL {bound};",
+            params,
+        ).fetchall()
+    }
+    last_row = conn.execute(
+        f"""
+        SELECT source_id, locator
+        FROM citations
+        WHERE doc_id = ? AND deleted_at IS NULL {bound}
+        ORDER BY doc_order DESC, created_at DESC
+        LIMIT 1;
+        """,
+        params,
+    ).fetchone()
+    last = (last_row["source_id"], last_row["locator"]) if last_row else None
+    return seen, last
 
-def _apply_doc_order(conn: sqlite3.Connection, ordered_uuids: list[str]) -> None:
-    for idx, citation_uuid in enumerate(ordered_uuids, start=1):
-        conn.execute(
-            "UPDATE citations SET doc_order = ? WHERE citation_uuid = ?;",
-            (idx, citation_uuid),
-        )
-    conn.commit()
+
+def append_citations(
+    conn: sqlite3.Connection, doc_id: str, items: list[dict[str, Any]]
+) -> tuple[tuple[set[str], tuple[Any, Any] | None], list[dict[str, Any]]]:
+    # The prefix is read in the same transaction that appends the batch, so a
+    # concurrent batch for the same document can't land in between and leave
+    # the variants computed against the wrong predecessors.
+    prefix = citation_prefix_state(conn, doc_id)
+    return prefix, create_citations(conn, doc_id, items)
 
 
 def list_sources_for_doc(conn: sqlite3.Connection, doc_id: str) -> list[dict[str, Any]]:
@@ -315,15 +773,451 @@ def list_sources_for_doc(conn: sqlite3.Connection, doc_id: str) -> list[dict[str
         SELECT s.*
         FROM sources s
         JOIN citations c ON c.source_id = s.id
-        WHERE c.doc_id = ?
+        WHERE c.doc_id = ? AND c.deleted_at IS NULL
         GROUP BY s.id
         ORDER BY MIN(c.doc_order);
         """,
         (doc_id,),
     )
-    sources = []
-    for row in cur.fetchall():
-        data = _row_to_dict(row, SOURCE_COLUMNS)
-        data["contributors"] = list_source_contributors(conn, row["id"])
-        sources.append(data)
+    sources = [_row_to_dict(row, SOURCE_COLUMNS) for row in cur.fetchall()]
+    contributors = list_contributors_for_sources(conn, [source["id"] for source in sources])
+    for source in sources:
+        source["contributors"] = contributors.get(source["id"], [])
     return sources
+
+
+def document_ids_for_source(conn: sqlite3.Connection, source_id: str) -> list[str]:
+    rows = conn.execute(
+        "SELECT DISTINCT doc_id FROM citations WHERE source_id = ? AND deleted_at IS NULL;",
+        (source_id,),
+    ).fetchall()
+    return [row["doc_id"] for row in rows]
+
+
+def document_ids_for_style(conn: sqlite3.Connection, style_id: str) -> list[str]:
+    rows = conn.execute(
+        """
+        SELECT d.id FROM documents d
+        WHERE d.active_style_id = ?
+          AND EXISTS (
+              SELECT 1 FROM citations c WHERE c.doc_id = d.id AND c.deleted_at IS NULL
+          );
+        """,
+        (style_id,),
+    ).fetchall()
+    return [row["id"] for row in rows]
+
+
+def render_state(conn: sqlite3.Connection, doc_id: str) -> sqlite3.Row | None:
+    # Everything a document's rendered output depends on besides the citation
+    # order: its style's revision and modification counter, and the change
+    # feed revision.
+    return conn.execute(
+        """
+        SELECT d.active_style_id, sp.revision AS style_revision,
+               sp.modification_counter AS style_counter,
+               (SELECT revision FROM change_feed WHERE id = 1) AS change_revision
+        FROM documents d
+        LEFT JOIN style_packages sp ON sp.id = d.active_style_id
+        WHERE d.id = ?;
+        """,
+        (doc_id,),
+    ).fetchone()
+
+
+@dataclass
+class DocumentBundle:
+    document: dict[str, Any]
+    style: dict[str, Any] | None
+    citations: list[dict[str, Any]] = field(default_factory=list)
+    sources: dict[str, dict[str, Any]] = field(default_factory=dict)
+    order_updates: list[tuple[int, str]] = field(default_factory=list)
+
+    def cited_sources(self) -> list[dict[str, Any]]:
+        return list(self.sources.values())
+
+
+def load_document_bundle(
+    conn: sqlite3.Connection,
+    doc_id: str,
+    ordered_uuids: list[str] | None = None,
+    load_style: Callable[..., dict[str, Any] | None] | None = None,
+) -> DocumentBundle | None:
+    # load_style(conn, style_id, (version, modification_counter)) lets a style
+    # cache answer from memory; without it the style is read here.
+    row = conn.execute(
+        """
+        SELECT d.id, d.doc_fingerprint, d.name, d.active_style_id,
+               sp.id AS style_id, sp.name AS style_name, sp.version AS style_version,
+               sp.description AS style_description, sp.built_in AS style_built_in,
+               sp.modification_counter AS style_modification_counter,
+               sp.revision AS style_revision
+        FROM documents d
+        LEFT JOIN style_packages sp ON sp.id = d.active_style_id
+        WHERE d.id = ?;
+        """,
+        (doc_id,),
+    ).fetchone()
+    if not row:
+        return None
+
+    document = {
+        "id": row["id"],
+        "doc_fingerprint": row["doc_fingerprint"],
+        "name": row["name"],
+        "active_style_id": row["active_style_id"],
+    }
+    style = None
+    if row["style_id"] and load_style is not None:
+        style = load_style(
+            conn, row["style_id"], (row["style_version"], row["style_modification_counter"])
+        )
+    elif row["style_id"]:
+        style = {
+            "id": row["style_id"],
+            "name": row["style_name"],
+            "version": row["style_version"],
+            "description": row["style_description"],
+            "built_in": row["style_built_in"],
+            "modification_counter": row["style_modification_counter"],
+            "revision": row["style_revision"],
+            **_style_parts(conn, row["style_id"]),
+        }
+
+    citations = list_citations_for_doc(conn, doc_id)
+    order_updates: list[tuple[int, str]] = []
+    if ordered_uuids:
+        citations, order_updates = order_citations(citations, ordered_uuids)
+    loaded = get_sources(conn, [citation["source_id"] for citation in citations])
+    sources = {
+        citation["source_id"]: loaded[citation["source_id"]]
+        for citation in citations
+        if citation["source_id"] in loaded
+    }
+    return DocumentBundle(
+        document=document,
+        style=style,
+        citations=citations,
+        sources=sources,
+        order_updates=order_updates,
+    )
+
+
+def current_change_revision(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT revision FROM change_feed WHERE id = 1;").fetchone()
+    return row["revision"] if row else 0
+
+
+def source_change_revision(conn: sqlite3.Connection) -> int:
+    # Latest change feed revision that touched a source or contributor.
+    row = conn.execute(
+        """
+        SELECT MAX(
+          COALESCE((SELECT MAX(revision) FROM change_entities WHERE kind = 'source'), 0),
+          COALESCE((SELECT MAX(revision) FROM change_entities WHERE kind = 'contributor'), 0)
+        ) AS revision;
+        """
+    ).fetchone()
+    return row["revision"]
+
+
+CHANGED_CITATIONS_SQL = """
+    WITH changed AS (
+        SELECT kind, key FROM change_entities WHERE revision > ?
+    )
+    SELECT citation_uuid, doc_id FROM citations
+    WHERE deleted_at IS NULL
+      AND citation_uuid IN (
+        SELECT key FROM changed WHERE kind IN ('citation', 'citation_variant')
+      )
+    UNION
+    SELECT citation_uuid, doc_id FROM citations
+    WHERE deleted_at IS NULL
+      AND source_id IN (SELECT key FROM changed WHERE kind = 'source')
+    UNION
+    SELECT citation_uuid, doc_id FROM citations
+    WHERE deleted_at IS NULL
+      AND source_id IN (
+        SELECT sc.source_id FROM source_contributors sc
+        WHERE sc.contributor_id IN (SELECT key FROM changed WHERE kind = 'contributor')
+      )
+    UNION
+    SELECT citation_uuid, doc_id FROM citations
+    WHERE deleted_at IS NULL
+      AND doc_id IN (
+        SELECT d.id FROM documents d
+        WHERE d.active_style_id IN (SELECT key FROM changed WHERE kind = 'style')
+      )
+    UNION
+    SELECT citation_uuid, doc_id FROM citations
+    WHERE deleted_at IS NULL
+      AND doc_id IN (SELECT key FROM changed WHERE kind = 'document')
+"""
+
+
+def changes_since(
+    conn: sqlite3.Connection, since: int, doc_id: str | None = None
+) -> dict[str, Any]:
+    # Resolves every entity touched after `since` to the citations whose rendered
+    # text may differ now. since <= 0 only reports the current revision, so a
+    # client can start following the feed without refreshing everything.
+    revision = current_change_revision(conn)
+    if since <= 0 or since >= revision:
+        return {"revision": revision, "doc_ids": [], "citation_uuids": []}
+
+    sql = CHANGED_CITATIONS_SQL
+    params: list[Any] = [since]
+    if doc_id is not None:
+        sql = f"SELECT citation_uuid, doc_id FROM ({sql}) WHERE doc_id = ?"
+        params.append(doc_id)
+    rows = conn.execute(sql + " ORDER BY doc_id, citation_uuid;", params).fetchall()
+    doc_ids = {row["doc_id"] for row in rows}
+    # A document whose last live citation was deleted or tombstoned still
+    # needs a refresh.
+    emptied = conn.execute(
+        """
+        SELECT key FROM change_entities ce
+        WHERE kind = 'document' AND revision > ?
+          AND NOT EXISTS (
+            SELECT 1 FROM citations c WHERE c.doc_id = ce.key AND c.deleted_at IS NULL
+          );
+        """,
+        (since,),
+    ).fetchall()
+    doc_ids.update(row["key"] for row in emptied if doc_id is None or row["key"] == doc_id)
+    return {
+        "revision": revision,
+        "doc_ids": sorted(doc_ids),
+        "citation_uuids": [row["citation_uuid"] for row in rows],
+    }
+
+
+# Document validation: each check is one set-based statement over the
+# document's citations, so cost grows with the document, not with round trips.
+def citations_missing_sources(conn: sqlite3.Connection, doc_id: str) -> list[dict[str, Any]]:
+    rows = conn.execute(
+        """
+        SELECT c.citation_uuid, c.source_id
+        FROM citations c
+        WHERE c.doc_id = ? AND c.deleted_at IS NULL
+          AND NOT EXISTS (SELECT 1 FROM sources s WHERE s.id = c.source_id)
+        ORDER BY c.doc_order;
+        """,
+        (doc_id,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def duplicate_doc_orders(conn: sqlite3.Connection, doc_id: str) -> list[dict[str, Any]]:
+    rows = conn.execute(
+        """
+        SELECT c.citation_uuid, c.doc_order
+        FROM citations c
+        JOIN (
+            SELECT doc_order FROM citations
+            WHERE doc_id = ? AND deleted_at IS NULL
+            GROUP BY doc_order
+            HAVING COUNT(*) > 1
+        ) dup ON dup.doc_order = c.doc_order
+        WHERE c.doc_id = ? AND c.deleted_at IS NULL
+        ORDER BY c.doc_order, c.created_at;
+        """,
+        (doc_id, doc_id),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def orphaned_citations(
+    conn: sqlite3.Connection, doc_id: str, citation_uuids: list[str]
+) -> list[str]:
+    # Stored citations the document no longer contains.
+    rows = conn.execute(
+        """
+        SELECT c.citation_uuid
+        FROM citations c
+        WHERE c.doc_id = ? AND c.deleted_at IS NULL
+          AND c.citation_uuid NOT IN (SELECT value FROM json_each(?))
+        ORDER BY c.doc_order;
+        """,
+        (doc_id, json.dumps(citation_uuids)),
+    ).fetchall()
+    return [row["citation_uuid"] for row in rows]
+
+
+def unknown_citations(
+    conn: sqlite3.Connection, doc_id: str, citation_uuids: list[str]
+) -> list[str]:
+    # Citations in the document that the database does not know for it.
+    rows = conn.execute(
+        """
+        SELECT j.value AS citation_uuid
+        FROM json_each(?) j
+        WHERE NOT EXISTS (
+            SELECT 1 FROM citations c
+            WHERE c.citation_uuid = j.value AND c.doc_id = ? AND c.deleted_at IS NULL
+        )
+        ORDER BY j.key;
+        """,
+        (json.dumps(citation_uuids), doc_id),
+    ).fetchall()
+    return [row["citation_uuid"] for row in rows]
+
+
+def cited_source_types(conn: sqlite3.Connection, doc_id: str) -> list[dict[str, Any]]:
+    rows = conn.execute(
+        """
+        SELECT s.type, COUNT(*) AS citations, COUNT(DISTINCT s.id) AS sources
+        FROM citations c
+        JOIN sources s ON s.id = c.source_id
+        WHERE c.doc_id = ? AND c.deleted_at IS NULL
+        GROUP BY s.type
+        ORDER BY s.type;
+        """,
+        (doc_id,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def cited_sources_missing_fields(
+    conn: sqlite3.Connection, doc_id: str, source_type: str, fields: list[str]
+) -> list[dict[str, Any]]:
+    # fields are SOURCE_COLUMNS names, or "contributors" for sources that need
+    # at least one contributor. Returns each cited source of the type lacking any.
+    checks = []
+    for name in fields:
+        if name == "contributors":
+            checks.append(
+                "NOT EXISTS (SELECT 1 FROM source_contributors sc WHERE sc.source_id = s.id)"
+            )
+        elif name in SOURCE_COLUMNS:
+            checks.append(f"COALESCE(s.{name}, '') = ''")
+        else:
+            raise ValueError(f"unknown source field: {name}")
+    if not checks:
+        return []
+    columns = ", ".join(f"{check} AS missing_{index}" for index, check in enumerate(checks))
+    rows = conn.execute(
+        f"""
+        SELECT s.id, s.title, {columns}
+        FROM sources s
+        WHERE s.type = ?
+          AND s.id IN (
+              SELECT source_id FROM citations WHERE doc_id = ? AND deleted_at IS NULL
+          )
+          AND ({" OR ".join(checks)})
+        ORDER BY s.title, s.id;
+        """,
+        (source_type, doc_id),
+    ).fetchall()
+    return [
+        {
+            "source_id": row["id"],
+            "title": row["title"],
+            "fields": [name for index, name in enumerate(fields) if row[f"missing_{index}"]],
+        }
+        for row in rows
+    ]
+
+
+# Citations the change feed saw after the client's snapshot revision are newer
+# than the control list it sent (inserted meanwhile, possibly by another task
+# pane), so reconcile leaves them alone.
+_CITATION_CHANGED_AFTER = """
+    AND NOT EXISTS (
+        SELECT 1 FROM change_entities ce
+        WHERE ce.kind = 'citation' AND ce.key = citations.citation_uuid AND ce.revision > ?
+    )
+"""
+
+
+def reconcile_citations(
+    conn: sqlite3.Connection,
+    doc_id: str,
+    live_uuids: list[str],
+    prune: bool = False,
+    revision: int | None = None,
+) -> dict[str, int]:
+    # live_uuids is every citation still present in the Word document as of the
+    # change feed revision the client read before collecting them. Stored
+    # citations missing from it are tombstoned; prune deletes them outright,
+    # earlier tombstones included. Tombstoned citations that reappeared (an undo
+    # in Word) are revived.
+    live = json.dumps(live_uuids)
+    newer = _CITATION_CHANGED_AFTER if revision is not None else ""
+    params = [doc_id, live] + ([revision] if revision is not None else [])
+    if prune:
+        removed = conn.execute(
+            f"""
+            DELETE FROM citations
+            WHERE doc_id = ? AND citation_uuid NOT IN (SELECT value FROM json_each(?))
+            {newer};
+            """,
+            params,
+        ).rowcount
+    else:
+        removed = conn.execute(
+            f"""
+            UPDATE citations SET deleted_at = datetime('now')
+            WHERE doc_id = ? AND deleted_at IS NULL
+              AND citation_uuid NOT IN (SELECT value FROM json_each(?))
+            {newer};
+            """,
+            params,
+        ).rowcount
+    revived = conn.execute(
+        """
+        UPDATE citations SET deleted_at = NULL
+        WHERE doc_id = ? AND deleted_at IS NOT NULL
+          AND citation_uuid IN (SELECT value FROM json_each(?));
+        """,
+        (doc_id, live),
+    ).rowcount
+    return {
+        "tombstoned": 0 if prune else removed,
+        "deleted": removed if prune else 0,
+        "revived": revived,
+    }
+
+
+def reconcile_needed(
+    conn: sqlite3.Connection,
+    doc_id: str,
+    live_uuids: list[str],
+    prune: bool = False,
+    revision: int | None = None,
+) -> bool:
+    live = json.dumps(live_uuids)
+    newer = _CITATION_CHANGED_AFTER if revision is not None else ""
+    params = [doc_id, live] + ([revision] if revision is not None else [])
+    row = conn.execute(
+        f"""
+        SELECT EXISTS (
+            SELECT 1 FROM citations
+            WHERE doc_id = ? {"" if prune else "AND deleted_at IS NULL"}
+              AND citation_uuid NOT IN (SELECT value FROM json_each(?))
+              {newer}
+        ) OR EXISTS (
+            SELECT 1 FROM citations
+            WHERE doc_id = ? AND deleted_at IS NOT NULL
+              AND citation_uuid IN (SELECT value FROM json_each(?))
+        ) AS needed;
+        """,
+        [*params, doc_id, live],
+    ).fetchone()
+    return bool(row["needed"])
+
+
+def count_citation_tombstones(conn: sqlite3.Connection) -> int:
+    return conn.execute(
+        "SELECT COUNT(*) FROM citations WHERE deleted_at IS NOT NULL;"
+    ).fetchone()[0]
+
+
+def purge_citation_tombstones(conn: sqlite3.Connection, older_than_s: float) -> int:
+    return conn.execute(
+        """
+        DELETE FROM citations
+        WHERE deleted_at IS NOT NULL AND deleted_at <= datetime('now', ?);
+        """,
+        (f"-{int(older_than_s)} seconds",),
+    ).rowcount
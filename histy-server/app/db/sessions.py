@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+from . import queries
+from .writer import Writer
+
+
+DEFAULT_MAX_DOCUMENTS = int(os.getenv("HISTY_DOCUMENT_SESSIONS_SIZE", "4096"))
+
+
+class DocumentSessions:
+    # Remembers fingerprint -> document so the add-in's per-action document
+    # lookup is answered from memory. Whether to write is decided against the
+    # stored row, so an entry made stale by another process can't skip a
+    # needed write; the writer is only involved when the name or style
+    # actually changes. Least recently used entries are evicted.
+    def __init__(self, max_documents: int = DEFAULT_MAX_DOCUMENTS) -> None:
+        self.max_documents = max_documents
+        self._documents: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def resolve(
+        self,
+        conn: sqlite3.Connection,
+        writer: Writer,
+        payload: dict[str, Any],
+        on_style_change: Callable[[str], None] | None = None,
+    ) -> dict[str, Any]:
+        doc_fingerprint = payload.get("doc_fingerprint")
+        if not doc_fingerprint:
+            raise ValueError("doc_fingerprint is required")
+
+        with self._lock:
+            document = self._documents.get(doc_fingerprint)
+            if document is not None:
+                self._documents.move_to_end(doc_fingerprint)
+        cached = document is not None
+        if document is None:
+            document = queries.get_document_by_fingerprint(conn, doc_fingerprint)
+
+        if document is None:
+            changed = True
+        elif cached:
+            changed = queries.document_differs(conn, document["id"], payload)
+        else:
+            changed = bool(queries.document_changes(document, payload))
+        if changed:
+            document, restyled = writer.run(lambda write_conn: self._upsert(write_conn, payload))
+            counter = "writes"
+            if restyled and on_style_change is not None:
+                on_style_change(document["id"])
+        else:
+            counter = "hits" if cached else "loads"
+
+        with self._lock:
+            self._documents[doc_fingerprint] = document
+            self._documents.move_to_end(doc_fingerprint)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+                self.evictions += 1
+            setattr(self, counter, getattr(self, counter) + 1)
+        return dict(document)
+
+    def _upsert(
+        self, conn: sqlite3.Connection, payload: dict[str, Any]
+    ) -> tuple[dict[str, Any], bool]:
+        # Dropped before the write, so a failed or concurrent write never leaves
+        # the old row cached; resolve stores the written document afterwards.
+        self.invalidate(payload["doc_fingerprint"])
+        stored = queries.get_document_by_fingerprint(conn, payload["doc_fingerprint"])
+        document = queries.upsert_document(conn, payload)
+        restyled = stored is not None and stored["active_style_id"] != document["active_style_id"]
+        return document, restyled
+
+    def invalidate(self, doc_fingerprint: str | None = None) -> None:
+        with self._lock:
+            if doc_fingerprint is None:
+                self._documents.clear()
+            else:
+                self._documents.pop(doc_fingerprint, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._documents),
+                "max_documents": self.max_documents,
+                "evictions": self.evictions,
+                "hits": self.hits,
+                "loads": self.loads,
+                "writes": self.writes,
+            }
+
+
+document_sessions = DocumentSessions()
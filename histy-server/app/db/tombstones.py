@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any
+
+from . import queries
+from .writer import Writer
+
+# Tombstoned citations are kept this long so an undo in Word can revive them.
+DEFAULT_TOMBSTONE_TTL = float(os.getenv("HISTY_CITATION_TOMBSTONE_TTL_S", str(7 * 24 * 3600)))
+DEFAULT_GC_INTERVAL = float(os.getenv("HISTY_CITATION_GC_INTERVAL_S", "3600"))
+
+
+class TombstoneCollector:
+    # Purges expired citation tombstones through the writer on a daemon thread.
+    def __init__(
+        self, ttl: float = DEFAULT_TOMBSTONE_TTL, interval: float = DEFAULT_GC_INTERVAL
+    ) -> None:
+        self.ttl = ttl
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.runs = 0
+        self.errors = 0
+        self.reclaimed = 0
+        self.reconciled = 0
+        self.tombstoned = 0
+        self.pruned = 0
+        self.revived = 0
+        self.last_run: float | None = None
+        self.last_reclaimed = 0
+
+    def collect(self, writer: Writer) -> int:
+        try:
+            reclaimed = writer.run(
+                lambda conn: queries.purge_citation_tombstones(conn, self.ttl), background=True
+            )
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        with self._lock:
+            self.runs += 1
+            self.reclaimed += reclaimed
+            self.last_reclaimed = reclaimed
+            self.last_run = time.time()
+        return reclaimed
+
+    def record_reconcile(self, result: dict[str, int]) -> None:
+        with self._lock:
+            self.reconciled += 1
+            self.tombstoned += result["tombstoned"]
+            self.pruned += result["deleted"]
+            self.revived += result["revived"]
+
+    def start(self, writer: Writer) -> None:
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._loop, args=(writer,), name="histy-tombstone-gc", daemon=True
+            )
+            self._thread.start()
+
+    def _loop(self, writer: Writer) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.collect(writer)
+            except Exception:
+                # Counted in collect; the next run tries again.
+                pass
+
+    def close(self) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "ttl_s": self.ttl,
+                "interval_s": self.interval,
+                "runs": self.runs,
+                "errors": self.errors,
+                "reclaimed": self.reclaimed,
+                "last_reclaimed": self.last_reclaimed,
+                "last_run": self.last_run,
+                "reconciled": self.reconciled,
+                "tombstoned": self.tombstoned,
+                "pruned": self.pruned,
+                "revived": self.revived,
+            }
+
+
+tombstone_collector = TombstoneCollector()
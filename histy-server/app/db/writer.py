@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_DELAY = float(os.getenv("HISTY_WRITE_BATCH_DELAY_MS", "2")) / 1000
+DEFAULT_BATCH_SIZE = int(os.getenv("HISTY_WRITE_BATCH_SIZE", "64"))
+
+# Queue priorities: interactive writes go first, background writes (pre-rendered
+# cache rows, tombstone purges) only run when no interactive write is waiting.
+_INTERACTIVE = 0
+_BACKGROUND = 1
+_STOP = 2
+
+
+@dataclass
+class _WriteOp:
+    fn: Callable[[sqlite3.Connection], Any]
+    enqueued: float = field(default_factory=time.perf_counter)
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: BaseException | None = None
+
+
+class DirectWriter:
+    # Runs each write immediately on the caller's connection; used by tests and
+    # scripts that already own a connection.
+    def __init__(
+        self, conn: sqlite3.Connection, on_commit: Callable[[], None] | None = None
+    ) -> None:
+        self.conn = conn
+        self.on_commit = on_commit
+
+    def run(self, fn: Callable[[sqlite3.Connection], T], background: bool = False) -> T:
+        try:
+            result = fn(self.conn)
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+        if self.on_commit is not None:
+            self.on_commit()
+        return result
+
+
+class WriteQueue:
+    # Single writer thread that drains concurrent write operations into group
+    # commits. Each operation runs inside its own savepoint, so one failing
+    # operation is rolled back and reported without aborting the rest of the batch.
+    # Background operations are committed one per batch and never share a batch
+    # with interactive ones, so an interactive write waits for at most one of them.
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        max_batch_delay: float = DEFAULT_BATCH_DELAY,
+        max_batch_size: int = DEFAULT_BATCH_SIZE,
+        on_commit: Callable[[], None] | None = None,
+    ) -> None:
+        self.on_commit = on_commit
+        self.max_batch_delay = max_batch_delay
+        self.max_batch_size = max_batch_size
+        self._connect = connect
+        self._queue: queue.PriorityQueue[tuple[int, int, _WriteOp | None]] = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._batches = 0
+        self._ops = 0
+        self._errors = 0
+        self._reconnects = 0
+        self._background_ops = 0
+        self._largest_batch = 0
+        self._latency_total = 0.0
+
+    def run(
+        self,
+        fn: Callable[[sqlite3.Connection], T],
+        timeout: float | None = None,
+        background: bool = False,
+    ) -> T:
+        self._ensure_started()
+        op = _WriteOp(fn)
+        self._put(_BACKGROUND if background else _INTERACTIVE, op)
+        if not op.done.wait(timeout):
+            raise TimeoutError("write_queue_timeout")
+        if op.error is not None:
+            raise op.error
+        return op.result
+
+    def _put(self, priority: int, op: _WriteOp | None) -> None:
+        # The sequence number keeps FIFO order within a priority.
+        self._queue.put((priority, next(self._sequence), op))
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="histy-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _collect(self, first: tuple[int, int, _WriteOp | None]) -> list[_WriteOp]:
+        priority, _, op = first
+        batch = [op]
+        if priority == _BACKGROUND:
+            with self._lock:
+                self._background_ops += 1
+            return batch
+        deadline = time.perf_counter() + self.max_batch_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = (
+                    self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if item[0] != priority:
+                # A background write or the stop marker; it waits for the next round.
+                self._queue.put(item)
+                break
+            batch.append(item[2])
+        return batch
+
+    def _loop(self) -> None:
+        conn = self._connect()
+        try:
+            while True:
+                first = self._queue.get()
+                if first[2] is None:
+                    return
+                if not self._commit_batch(conn, self._collect(first)):
+                    conn = self._reconnect(conn)
+        finally:
+            conn.close()
+
+    def _reconnect(self, conn: sqlite3.Connection) -> sqlite3.Connection:
+        # The old connection may hold a half-finished transaction or be closed;
+        # a fresh one keeps the writer thread serving later writes.
+        try:
+            fresh = self._connect()
+        except Exception:
+            logger.exception("write queue could not reopen its connection")
+            return conn
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._reconnects += 1
+        return fresh
+
+    def _commit_batch(self, conn: sqlite3.Connection, batch: list[_WriteOp]) -> bool:
+        # Returns False when the batch failed outside an operation's own error
+        # handling, after which the connection is not trusted any more. Every op
+        # is finished either way, so no caller is left waiting in run().
+        committed = 0
+        healthy = True
+        try:
+            conn.execute("BEGIN IMMEDIATE;")
+            for index, op in enumerate(batch):
+                if not conn.in_transaction:
+                    # The previous op ended the batch transaction itself (for
+                    # example by committing); start a new one for the rest.
+                    committed = index
+                    conn.execute("BEGIN IMMEDIATE;")
+                conn.execute("SAVEPOINT write_op;")
+                try:
+                    op.result = op.fn(conn)
+                except BaseException as exc:
+                    op.error = exc
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK TO write_op;")
+                        conn.execute("RELEASE write_op;")
+                    continue
+                if conn.in_transaction:
+                    conn.execute("RELEASE write_op;")
+            if conn.in_transaction:
+                conn.commit()
+            committed = len(batch)
+        except BaseException as exc:
+            if not isinstance(exc, sqlite3.OperationalError):
+                logger.exception("write queue batch of %d ops failed", len(batch))
+                healthy = False
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+            for op in batch[committed:]:
+                if op.error is None:
+                    op.error = exc
+        finally:
+            try:
+                if self.on_commit is not None and any(op.error is None for op in batch):
+                    self.on_commit()
+            except Exception:
+                logger.exception("write queue on_commit hook failed")
+            self._finish(batch)
+        return healthy
+
+    def _finish(self, batch: list[_WriteOp]) -> None:
+        finished = time.perf_counter()
+        with self._lock:
+            self._batches += 1
+            self._ops += len(batch)
+            self._errors += sum(1 for op in batch if op.error is not None)
+            self._largest_batch = max(self._largest_batch, len(batch))
+            self._latency_total += sum(finished - op.enqueued for op in batch)
+        for op in batch:
+            op.done.set()
+
+    def close(self) -> None:
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            # Sorts after every queued write, so those still commit first.
+            self._put(_STOP, None)
+            thread.join()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "batches": self._batches,
+                "ops": self._ops,
+                "errors": self._errors,
+                "reconnects": self._reconnects,
+                "background_ops": self._background_ops,
+                "largest_batch": self._largest_batch,
+                "avg_batch": round(self._ops / self._batches, 2) if self._batches else 0.0,
+                "avg_latency_ms": (
+                    round(self._latency_total * 1000 / self._ops, 3) if self._ops else 0.0
+                ),
+                "max_batch_delay_ms": self.max_batch_delay * 1000,
+            }
+
+
+Writer = DirectWriter | WriteQueue
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from ..db.connection import get_connection, init_db
+from .parsers import EXTENSIONS, PARSERS
+from .pipeline import DEFAULT_BATCH_SIZE, ImportStats, import_stream
+
+
+def _report(stats: ImportStats) -> None:
+    print(
+        f"{stats.written} sources written, {stats.skipped} skipped, "
+        f"{stats.rate():.0f} sources/s",
+        file=sys.stderr,
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.importer",
+        description="Bulk-import a BibTeX, CSL-JSON or RIS library into the histy database.",
+    )
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=sorted(PARSERS))
+    parser.add_argument("--db", help="SQLite database path (defaults to HISTY_DB_PATH)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--library",
+        help="namespace for the file's citation keys (defaults to the file name); "
+        "re-importing a library updates its sources instead of adding new ones",
+    )
+    args = parser.parse_args(argv)
+
+    fmt = args.format or EXTENSIONS.get(args.path.suffix.lower())
+    if not fmt:
+        parser.error("cannot detect the format from the file extension; pass --format")
+
+    init_db(args.db)
+    conn = get_connection(args.db)
+    try:
+        with args.path.open(encoding="utf-8-sig") as stream:
+            stats = import_stream(
+                conn,
+                stream,
+                fmt,
+                args.batch_size,
+                progress=_report,
+                library=args.library or args.path.name,
+            )
+    finally:
+        conn.close()
+    print(json.dumps(stats.as_dict()))
+    if stats.error:
+        print(f"import stopped after {stats.parsed} records: {stats.error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
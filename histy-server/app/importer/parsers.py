@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import json
+import re
+import unicodedata
+from typing import Any, Iterator, TextIO
+
+CHUNK_SIZE = 65536
+
+BIBTEX_TYPES = {
+    "book": "monograph",
+    "article": "article",
+    "incollection": "chapter",
+    "inbook": "chapter",
+    "inproceedings": "chapter",
+    "thesis": "thesis",
+    "phdthesis": "thesis",
+    "mastersthesis": "thesis",
+}
+CSL_TYPES = {
+    "book": "monograph",
+    "article-journal": "article",
+    "article": "article",
+    "chapter": "chapter",
+    "paper-conference": "chapter",
+    "thesis": "thesis",
+    "manuscript": "archive",
+}
+RIS_TYPES = {
+    "BOOK": "monograph",
+    "JOUR": "article",
+    "CHAP": "chapter",
+    "CONF": "chapter",
+    "THES": "thesis",
+    "MANSCPT": "archive",
+}
+
+_LATEX_ACCENTS = {
+    '"': "\u0308",
+    "'": "\u0301",
+    "`": "\u0300",
+    "^": "\u0302",
+    "~": "\u0303",
+    "=": "\u0304",
+    ".": "\u0307",
+    "c": "\u0327",
+    "v": "\u030c",
+}
+_LATEX_SYMBOLS = {
+    "ss": "\u00df",
+    "ae": "\u00e6",
+    "AE": "\u00c6",
+    "oe": "\u0153",
+    "OE": "\u0152",
+    "o": "\u00f8",
+    "O": "\u00d8",
+    "aa": "\u00e5",
+    "AA": "\u00c5",
+}
+_ACCENT_PATTERN = re.compile(r"\\([\"'`^~=.]|[cv](?=[\s{]))\s*\{?\s*([A-Za-z])\}?")
+_SYMBOL_PATTERN = re.compile(r"\{?\\(ss|ae|AE|oe|OE|aa|AA|o|O)\b\}?")
+_NAME_SEPARATOR = re.compile(r"\s+and\s+", re.IGNORECASE)
+_ENTRY_START = re.compile(r"@\s*(\w+)\s*([{(])")
+_FIELD_NAME = re.compile(r"\s*,?\s*([\w\-:.]+)\s*=\s*")
+_BARE_VALUE = re.compile(r"[^\s,#]+")
+_CONCAT = re.compile(r"\s*#\s*")
+_BRACES = re.compile(r"[{}]")
+
+
+def _closing_brace(text: str, start: int) -> int:
+    depth = 0
+    for match in _BRACES.finditer(text, start):
+        depth += 1 if match.group() == "{" else -1
+        if depth == 0:
+            return match.start()
+    return -1
+
+
+def _latex_to_text(value: str) -> str:
+    if "\\" in value:
+        value = _ACCENT_PATTERN.sub(
+            lambda m: unicodedata.normalize("NFC", m.group(2) + _LATEX_ACCENTS[m.group(1)]),
+            value,
+        )
+        value = _SYMBOL_PATTERN.sub(lambda m: _LATEX_SYMBOLS[m.group(1)], value)
+    value = value.replace("{", "").replace("}", "").replace("--", "\u2013")
+    return " ".join(value.split())
+
+
+def _split_bibtex_names(raw: str) -> list[tuple[str, bool]]:
+    if "{" not in raw:
+        return [(_latex_to_text(name), False) for name in _NAME_SEPARATOR.split(raw) if name.strip()]
+
+    names: list[str] = []
+    depth = 0
+    current = ""
+    idx = 0
+    while idx < len(raw):
+        char = raw[idx]
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        separator = _NAME_SEPARATOR.match(raw, idx) if depth == 0 else None
+        if separator:
+            names.append(current)
+            current = ""
+            idx = separator.end()
+            continue
+        current += char
+        idx += 1
+    names.append(current)
+
+    result = []
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        corporate = name.startswith("{") and name.endswith("}")
+        result.append((_latex_to_text(name), corporate))
+    return result
+
+
+def _closing_paren(text: str, start: int) -> int:
+    depth = 0
+    for idx in range(start, len(text)):
+        char = text[idx]
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        elif char == ")" and depth == 0:
+            return idx
+    return -1
+
+
+def _bibtex_entries(stream: TextIO) -> Iterator[tuple[str, str]]:
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        at = buf.find("@", pos)
+        if at == -1:
+            pos = len(buf)
+            if eof or not fill():
+                return
+            continue
+
+        pos = at
+        match = _ENTRY_START.match(buf, pos)
+        if not match:
+            if not eof and len(buf) - pos < 256 and fill():
+                continue
+            pos += 1
+            continue
+
+        if match.group(2) == "{":
+            end = _closing_brace(buf, match.end() - 1)
+        else:
+            end = _closing_paren(buf, match.end())
+        if end == -1:
+            if eof or not fill():
+                return
+            continue
+
+        yield match.group(1).lower(), buf[match.end() : end]
+        pos = end + 1
+
+
+def _bibtex_fields(body: str, strings: dict[str, str]) -> dict[str, str]:
+    fields: dict[str, str] = {}
+    idx = 0
+    length = len(body)
+    while idx < length:
+        match = _FIELD_NAME.match(body, idx)
+        if not match:
+            break
+        name = match.group(1).lower()
+        idx = match.end()
+        parts = []
+        while idx < length:
+            char = body[idx]
+            if char == "{":
+                end = _closing_brace(body, idx)
+                if end == -1:
+                    end = length
+                parts.append(body[idx + 1 : end])
+                idx = end + 1
+            elif char == '"':
+                start = idx + 1
+                idx += 1
+                depth = 0
+                while idx < length and not (body[idx] == '"' and depth == 0):
+                    if body[idx] == "{":
+                        depth += 1
+                    elif body[idx] == "}":
+                        depth -= 1
+                    idx += 1
+                parts.append(body[start:idx])
+                idx += 1
+            else:
+                word = _BARE_VALUE.match(body, idx)
+                if not word:
+                    break
+                token = word.group(0)
+                parts.append(strings.get(token.lower(), token))
+                idx = word.end()
+            hash_match = _CONCAT.match(body, idx)
+            if not hash_match:
+                break
+            idx = hash_match.end()
+        fields[name] = "".join(parts)
+    return fields
+
+
+def parse_bibtex(stream: TextIO) -> Iterator[dict[str, Any]]:
+    strings: dict[str, str] = {}
+    for entry_type, body in _bibtex_entries(stream):
+        if entry_type in {"comment", "preamble"}:
+            continue
+        if entry_type == "string":
+            for key, value in _bibtex_fields(body, strings).items():
+                strings[key] = value
+            continue
+
+        key, _, rest = body.partition(",")
+        fields = _bibtex_fields(rest, strings)
+        contributors = []
+        for role in ("author", "editor"):
+            for name, corporate in _split_bibtex_names(fields.get(role, "")):
+                contributors.append({"name": name, "role": role, "is_corporate": corporate})
+
+        text = {name: _latex_to_text(value) for name, value in fields.items()}
+        year = text.get("year") or text.get("date", "")[:4]
+        title = text.get("title")
+        if not title:
+            continue
+        yield {
+            "key": key.strip() or None,
+            "type": BIBTEX_TYPES.get(entry_type, entry_type),
+            "title": title,
+            "short_title": text.get("shorttitle"),
+            "year": year or None,
+            "place": text.get("address") or text.get("location"),
+            "publisher": text.get("publisher") or text.get("school") or text.get("institution"),
+            "container_title": text.get("journal")
+            or text.get("journaltitle")
+            or text.get("booktitle"),
+            "volume": text.get("volume"),
+            "issue": text.get("number") or text.get("issue"),
+            "pages": text.get("pages"),
+            "url": text.get("url"),
+            "accessed": text.get("urldate"),
+            "contributors": contributors,
+        }
+
+
+def _csl_items(stream: TextIO) -> Iterator[dict[str, Any]]:
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        while pos < len(buf) and (
+            buf[pos].isspace() or buf[pos] in ",]" or (buf[pos] == "[" and not started)
+        ):
+            started = started or buf[pos] == "["
+            pos += 1
+        if pos >= len(buf):
+            if eof:
+                return
+            chunk = stream.read(CHUNK_SIZE)
+            buf = buf[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            continue
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = stream.read(CHUNK_SIZE)
+            buf = buf[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            continue
+        yield item
+        pos = end
+
+
+def _csl_name(entry: dict[str, Any]) -> tuple[str, bool]:
+    if entry.get("literal"):
+        return entry["literal"], True
+    family = entry.get("family", "")
+    given = entry.get("given", "")
+    return (f"{family}, {given}" if family and given else family or given), False
+
+
+def parse_csl_json(stream: TextIO) -> Iterator[dict[str, Any]]:
+    for item in _csl_items(stream):
+        if not isinstance(item, dict) or not item.get("title"):
+            continue
+        contributors = []
+        for role in ("author", "editor"):
+            for entry in item.get(role, []) or []:
+                name, corporate = _csl_name(entry)
+                if name:
+                    contributors.append({"name": name, "role": role, "is_corporate": corporate})
+
+        issued = (item.get("issued") or {}).get("date-parts") or [[None]]
+        accessed = (item.get("accessed") or {}).get("date-parts") or [[]]
+        year = issued[0][0] if issued and issued[0] else None
+        yield {
+            "key": str(item["id"]) if item.get("id") is not None else None,
+            "type": CSL_TYPES.get(item.get("type", ""), item.get("type") or "monograph"),
+            "title": item["title"],
+            "short_title": item.get("title-short"),
+            "year": str(year) if year is not None else None,
+            "place": item.get("publisher-place"),
+            "publisher": item.get("publisher"),
+            "container_title": item.get("container-title"),
+            "volume": _text(item.get("volume")),
+            "issue": _text(item.get("issue")),
+            "pages": _text(item.get("page")),
+            "url": item.get("URL"),
+            "accessed": "-".join(str(part) for part in accessed[0]) or None,
+            "archive_name": item.get("archive"),
+            "signature": item.get("archive_location"),
+            "contributors": contributors,
+        }
+
+
+def _text(value: Any) -> str | None:
+    return None if value is None else str(value)
+
+
+_RIS_LINE = re.compile(r"^([A-Z][A-Z0-9])  -\s?(.*)$")
+
+
+def parse_ris(stream: TextIO) -> Iterator[dict[str, Any]]:
+    record: dict[str, list[str]] = {}
+    for line in stream:
+        match = _RIS_LINE.match(line.rstrip("\r\n").lstrip("\ufeff"))
+        if not match:
+            continue
+        tag, value = match.group(1), match.group(2).strip()
+        if tag == "ER":
+            payload = _ris_payload(record)
+            if payload:
+                yield payload
+            record = {}
+            continue
+        record.setdefault(tag, []).append(value)
+    if record:
+        payload = _ris_payload(record)
+        if payload:
+            yield payload
+
+
+def _ris_payload(record: dict[str, list[str]]) -> dict[str, Any] | None:
+    def first(*tags: str) -> str | None:
+        for tag in tags:
+            if record.get(tag):
+                return record[tag][0]
+        return None
+
+    title = first("TI", "T1", "CT")
+    if not title:
+        return None
+    contributors = []
+    for role, tags in (("author", ("AU", "A1")), ("editor", ("ED", "A2"))):
+        for tag in tags:
+            for name in record.get(tag, []):
+                contributors.append({"name": name, "role": role, "is_corporate": False})
+
+    start, end = first("SP"), first("EP")
+    pages = f"{start}\u2013{end}" if start and end else start
+    year = first("PY", "Y1", "DA")
+    return {
+        "key": first("ID"),
+        "type": RIS_TYPES.get(first("TY") or "", (first("TY") or "monograph").lower()),
+        "title": title,
+        "short_title": first("ST"),
+        "year": year[:4] if year else None,
+        "place": first("CY"),
+        "publisher": first("PB"),
+        "container_title": first("T2", "JO", "JF", "BT"),
+        "volume": first("VL"),
+        "issue": first("IS"),
+        "pages": pages,
+        "url": first("UR"),
+        "accessed": first("Y2"),
+        "archive_name": first("AN") if first("TY") == "MANSCPT" else None,
+        "contributors": contributors,
+    }
+
+
+PARSERS = {
+    "bibtex": parse_bibtex,
+    "csljson": parse_csl_json,
+    "ris": parse_ris,
+}
+EXTENSIONS = {".bib": "bibtex", ".json": "csljson", ".ris": "ris"}
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, TextIO
+
+from ..db.names import contributor_key
+from ..db.queries import (
+    SOURCE_IMPORT_SQL,
+    index_source_trigrams,
+    resolve_contributors,
+    source_ids_for_external_keys,
+    source_params,
+)
+from ..db.writer import DirectWriter, Writer
+from .parsers import PARSERS
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_LIBRARY = "import"
+
+
+@dataclass
+class ImportStats:
+    parsed: int = 0
+    written: int = 0
+    skipped: int = 0
+    contributors_created: int = 0
+    batches: int = 0
+    error: str | None = None
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    def rate(self) -> float:
+        elapsed = self.elapsed or (time.perf_counter() - self.started)
+        return self.written / elapsed if elapsed else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        data = {
+            "parsed": self.parsed,
+            "written": self.written,
+            "skipped": self.skipped,
+            "contributors_created": self.contributors_created,
+            "batches": self.batches,
+            "elapsed_s": round(self.elapsed, 3),
+            "sources_per_s": round(self.rate(), 1),
+        }
+        if self.error:
+            data["error"] = self.error
+        return data
+
+
+class ContributorNameMap:
+    # Caches contributor_key -> id for the whole import; names not seen yet are
+    # resolved in bulk once per batch through queries.resolve_contributors.
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self._ids = {
+            row["name_key"]: row["id"]
+            for row in conn.execute("SELECT id, name_key FROM contributors;")
+        }
+
+    def missing(self, records: list[dict[str, Any]]) -> list[tuple[str, bool]]:
+        pending: dict[str, tuple[str, bool]] = {}
+        for record in records:
+            for contributor in record.get("contributors", []):
+                if contributor.get("id"):
+                    continue
+                name = contributor["name"]
+                is_corporate = bool(contributor.get("is_corporate"))
+                key = contributor_key(name, is_corporate)
+                if key not in self._ids:
+                    pending.setdefault(key, (name, is_corporate))
+        return list(pending.values())
+
+    def update(self, ids: dict[str, str]) -> None:
+        self._ids.update(ids)
+
+    def get(self, contributor: dict[str, Any], pending: dict[str, str] | None = None) -> str:
+        if contributor.get("id"):
+            return contributor["id"]
+        key = contributor_key(contributor["name"], bool(contributor.get("is_corporate")))
+        return (pending or {}).get(key) or self._ids[key]
+
+
+def external_key(library: str, record: dict[str, Any]) -> str | None:
+    return f"{library}:{record['key']}" if record.get("key") else None
+
+
+def _write_batch(
+    conn: sqlite3.Connection,
+    batch: list[dict[str, Any]],
+    names: ContributorNameMap,
+    library: str,
+) -> tuple[dict[str, str], int, int]:
+    # Runs as one writer operation. Newly resolved contributor ids are returned
+    # rather than cached here, so a rolled-back batch leaves the name map clean.
+    resolved, created = resolve_contributors(conn, names.missing(batch))
+    keys = [key for key in (external_key(library, record) for record in batch) if key]
+    source_ids = source_ids_for_external_keys(conn, keys)
+
+    source_rows = []
+    link_rows = []
+    for record in batch:
+        key = external_key(library, record)
+        source_id = source_ids.get(key) if key else None
+        if source_id is None:
+            source_id = str(uuid.uuid4())
+            if key:
+                # Repeated keys within one library describe the same source.
+                source_ids[key] = source_id
+        source_rows.append([*source_params(source_id, record), key])
+        for position, contributor in enumerate(record.get("contributors", []), start=1):
+            link_rows.append(
+                (
+                    source_id,
+                    names.get(contributor, resolved),
+                    contributor.get("role") or "author",
+                    position,
+                )
+            )
+
+    conn.executemany(SOURCE_IMPORT_SQL, source_rows)
+    conn.executemany(
+        "DELETE FROM source_contributors WHERE source_id = ?;",
+        [(row[0],) for row in source_rows],
+    )
+    conn.executemany(
+        """
+        INSERT OR IGNORE INTO source_contributors (source_id, contributor_id, role, position)
+        VALUES (?, ?, ?, ?);
+        """,
+        link_rows,
+    )
+    index_source_trigrams(conn, [row[0] for row in source_rows])
+    return resolved, created, len(source_rows)
+
+
+def _flush(
+    writer: Writer,
+    batch: list[dict[str, Any]],
+    names: ContributorNameMap,
+    library: str,
+    stats: ImportStats,
+) -> None:
+    resolved, created, written = writer.run(
+        lambda conn: _write_batch(conn, batch, names, library)
+    )
+    names.update(resolved)
+    stats.written += written
+    stats.contributors_created += created
+    stats.batches += 1
+
+
+def import_sources(
+    conn: sqlite3.Connection,
+    records: Iterable[dict[str, Any]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Callable[[ImportStats], None] | None = None,
+    writer: Writer | None = None,
+    library: str = DEFAULT_LIBRARY,
+) -> ImportStats:
+    # conn is only read from; batches are written through writer, which defaults
+    # to committing on conn itself. A parse error stops the import: batches
+    # already written stay, and the error is reported in the returned stats.
+    writer = writer or DirectWriter(conn)
+    stats = ImportStats()
+    names = ContributorNameMap(conn)
+    batch: list[dict[str, Any]] = []
+    iterator = iter(records)
+    while True:
+        try:
+            record = next(iterator)
+        except StopIteration:
+            break
+        except ValueError as exc:
+            stats.error = str(exc) or exc.__class__.__name__
+            break
+        stats.parsed += 1
+        if not record.get("title") or not record.get("type"):
+            stats.skipped += 1
+            continue
+        batch.append(record)
+        if len(batch) >= batch_size:
+            _flush(writer, batch, names, library, stats)
+            batch = []
+            if progress:
+                progress(stats)
+    if batch:
+        _flush(writer, batch, names, library, stats)
+    stats.elapsed = time.perf_counter() - stats.started
+    if progress:
+        progress(stats)
+    return stats
+
+
+def import_stream(
+    conn: sqlite3.Connection,
+    stream: TextIO,
+    fmt: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Callable[[ImportStats], None] | None = None,
+    writer: Writer | None = None,
+    library: str = DEFAULT_LIBRARY,
+) -> ImportStats:
+    parser = PARSERS.get(fmt)
+    if parser is None:
+        raise ValueError(f"unknown import format: {fmt}")
+    return import_sources(
+        conn,
+        parser(stream),
+        batch_size=batch_size,
+        progress=progress,
+        writer=writer,
+        library=library,
+    )
@@ -8,16 +8,33 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
 import sqlite3
 
-from .api.routes import router as api_router
-from .db.connection import db_dependency, init_db
+from .api.routes import router as api_router, sources_page
+from .db.connection import (
+    ConnectionPool,
+    close_pool,
+    close_writer,
+    db_dependency,
+    get_connection,
+    get_writer,
+    init_db,
+    pool_dependency,
+    writer_dependency,
+)
 from .db import queries
-from .render.renderer import render_citation
+from .db.tombstones import tombstone_collector
+from .db.writer import WriteQueue
+from .render.prerender import prerender_queue
+from .render.renderer import render_citation, template_cache
+from .search.typeahead import suggest_index
+from .styles.registry import check_templates, style_registry
 
 BASE_DIR = Path(__file__).resolve().parent
 ROOT_DIR = BASE_DIR.parents[1]
 TEMPLATES_DIR = BASE_DIR / "web" / "templates"
+SOURCES_PAGE_SIZE = 50
 
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
@@ -34,9 +51,33 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def prioritize_requests(request: Request, call_next):
+    # Background pre-rendering waits while requests are in flight; long polls
+    # on the change feed are idle most of the time and do not count.
+    if request.url.path == "/api/changes":
+        return await call_next(request)
+    with prerender_queue.interactive():
+        return await call_next(request)
+
+
 @app.on_event("startup")
 def on_startup() -> None:
     init_db()
+    conn = get_connection()
+    try:
+        suggest_index.build(conn)
+    finally:
+        conn.close()
+    tombstone_collector.start(get_writer())
+
+
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    prerender_queue.close()
+    tombstone_collector.close()
+    close_writer()
+    close_pool()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -48,12 +89,14 @@ def dashboard(request: Request) -> Any:
 def sources_list(
     request: Request,
     q: str | None = None,
+    cursor: str | None = None,
     conn: sqlite3.Connection = Depends(db_dependency),
 ) -> Any:
     query = q or ""
-    items = queries.search_sources(conn, query, 200) if query else []
+    items, next_cursor = sources_page(conn, SOURCES_PAGE_SIZE, cursor, query)
     return templates.TemplateResponse(
-        "sources.html", {"request": request, "items": items, "q": query}
+        "sources.html",
+        {"request": request, "items": items, "q": query, "next_cursor": next_cursor},
     )
 
 
@@ -83,7 +126,7 @@ def sources_create(
     folio: str | None = Form(None),
     contributor_name: str | None = Form(None),
     contributor_role: str | None = Form(None),
-    conn: sqlite3.Connection = Depends(db_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
 ) -> Any:
     contributors = []
     if contributor_name:
@@ -110,7 +153,7 @@ def sources_create(
         "folio": folio,
         "contributors": contributors,
     }
-    queries.upsert_source(conn, payload)
+    source = suggest_index.upsert_source(writer, payload)
     return RedirectResponse("/sources", status_code=303)
 
 
@@ -149,6 +192,8 @@ def sources_update(
     contributor_name: str | None = Form(None),
     contributor_role: str | None = Form(None),
     conn: sqlite3.Connection = Depends(db_dependency),
+    pool: ConnectionPool = Depends(pool_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
 ) -> Any:
     contributors = []
     if contributor_name:
@@ -176,7 +221,8 @@ def sources_update(
         "folio": folio,
         "contributors": contributors,
     }
-    queries.upsert_source(conn, payload)
+    source = suggest_index.upsert_source(writer, payload)
+    prerender_queue.schedule(queries.document_ids_for_source(conn, source_id), pool, writer)
     return RedirectResponse(f"/sources/{source_id}", status_code=303)
 
 
@@ -217,27 +263,48 @@ async def styles_update_templates(
     request: Request,
     style_id: str,
     conn: sqlite3.Connection = Depends(db_dependency),
+    pool: ConnectionPool = Depends(pool_dependency),
+    writer: WriteQueue = Depends(writer_dependency),
 ) -> Any:
-    style = queries.get_style(conn, style_id)
+    style = await run_in_threadpool(queries.get_style, conn, style_id)
     if not style:
         raise HTTPException(status_code=404, detail="style_not_found")
 
     data = await request.form()
-    templates_payload = {k: v for k, v in data.items() if k.startswith("tpl_")}
+    submitted = {k.replace("tpl_", ""): v for k, v in data.items() if k.startswith("tpl_")}
+
+    errors = await run_in_threadpool(check_templates, submitted)
+    if errors:
+        return templates.TemplateResponse(
+            "styles_edit_templates.html",
+            {
+                "request": request,
+                "style": {**style, "templates": {**style["templates"], **submitted}},
+                "errors": errors,
+            },
+            status_code=400,
+        )
 
-    for key, markdown in templates_payload.items():
-        template_key = key.replace("tpl_", "")
-        conn.execute(
-            "UPDATE style_templates SET markdown = ? WHERE style_id = ? AND key = ?;",
-            (markdown, style_id, template_key),
+    base_revision = data.get("revision") or None
+    try:
+        await run_in_threadpool(
+            writer.run,
+            lambda write_conn: queries.update_style_templates(
+                write_conn, style_id, submitted, base_revision
+            ),
         )
-    conn.commit()
+    except ValueError as exc:
+        status_code = 404 if str(exc) == "style_not_found" else 409
+        raise HTTPException(status_code=status_code, detail=str(exc))
+    template_cache.invalidate(style_id)
+    doc_ids = await run_in_threadpool(queries.document_ids_for_style, conn, style_id)
+    prerender_queue.schedule(doc_ids, pool, writer)
     return RedirectResponse(f"/styles/{style_id}", status_code=303)
 
 
 @app.get("/preview", response_class=HTMLResponse)
 def preview_get(request: Request, conn: sqlite3.Connection = Depends(db_dependency)) -> Any:
-    sources = queries.search_sources(conn, "", 200)
+    sources, _ = queries.list_sources_page(conn, 200)
     styles = queries.list_styles(conn)
     return templates.TemplateResponse(
         "preview.html",
@@ -254,7 +321,7 @@ def preview_post(
     conn: sqlite3.Connection = Depends(db_dependency),
 ) -> Any:
     source = queries.get_source(conn, source_id)
-    style = queries.get_style(conn, style_id)
+    style = style_registry.get(conn, style_id)
     if not source or not style:
         raise HTTPException(status_code=404, detail="preview_data_missing")
 
@@ -273,7 +340,7 @@ def preview_post(
         [],
     )
 
-    sources = queries.search_sources(conn, "", 200)
+    sources, _ = queries.list_sources_page(conn, 200)
     styles = queries.list_styles(conn)
     return templates.TemplateResponse(
         "preview.html",
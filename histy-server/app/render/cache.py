@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Iterable
+
+from ..db.writer import Writer
+from .renderer import (
+    RenderOutput,
+    _template_key_for_style,
+    render_bibliography_entry,
+    render_citation,
+    source_revision,
+)
+
+_LOOKUP_CHUNK = 500
+_BACKGROUND_CHUNK = 200
+
+
+def style_digest(style: dict[str, Any]) -> str:
+    if style.get("revision"):
+        # The revision is only refreshed by template saves; the modification
+        # counter is bumped by triggers on every template, rule or abbreviation
+        # change, so the pair covers edits made outside the app too.
+        return (
+            f"{style.get('id')}:{style.get('version')}:"
+            f"{style.get('modification_counter')}:{style['revision']}"
+        )
+    payload = {
+        "id": style.get("id"),
+        "version": style.get("version"),
+        "templates": style.get("templates", {}),
+        "rules": style.get("rules", {}),
+        "abbreviations": style.get("abbreviations", {}),
+    }
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def render_input_hash(
+    digest: str,
+    source_rev: str,
+    template_key: str,
+    locator: str | None,
+    variant: str,
+) -> str:
+    raw = "\x1f".join([digest, source_rev, template_key, locator or "", variant])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    # Rows are keyed by a hash of every render input, so a stale row can never be
+    # served; the triggers in 002_render_cache.sql only reclaim space eagerly.
+    def __init__(self, max_rows: int = 50000) -> None:
+        self.max_rows = max_rows
+        # Eviction trims this far below max_rows, so a full cache is counted once
+        # per `slack` rows written rather than on every put.
+        self.slack = max(1, max_rows // 20)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.counts = 0
+        self._written = 0
+        self._headroom = 0
+        self._lock = threading.Lock()
+
+    def get_many(
+        self, conn: sqlite3.Connection, keys: list[str]
+    ) -> dict[str, RenderOutput]:
+        found: dict[str, RenderOutput] = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), _LOOKUP_CHUNK):
+            chunk = unique[start : start + _LOOKUP_CHUNK]
+            rows = conn.execute(
+                f"""
+                SELECT input_hash, template_key, variant, runs_json, plain_text, render_hash
+                FROM render_cache
+                WHERE input_hash IN ({', '.join(['?'] * len(chunk))});
+                """,
+                chunk,
+            ).fetchall()
+            for row in rows:
+                found[row["input_hash"]] = RenderOutput(
+                    plain_text=row["plain_text"],
+                    runs=json.loads(row["runs_json"]),
+                    metadata={
+                        "variant": row["variant"],
+                        "template_key": row["template_key"],
+                        "render_hash": row["render_hash"],
+                    },
+                )
+        with self._lock:
+            hit_count = sum(1 for key in keys if key in found)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+        return found
+
+    def put_many(
+        self,
+        conn: sqlite3.Connection,
+        entries: dict[str, tuple[str, str, RenderOutput]],
+    ) -> None:
+        if not entries:
+            return
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO render_cache
+              (input_hash, source_id, style_id, template_key, variant, runs_json,
+               plain_text, render_hash, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'));
+            """,
+            [
+                (
+                    key,
+                    source_id,
+                    style_id,
+                    output.metadata["template_key"],
+                    output.metadata["variant"],
+                    json.dumps(output.runs),
+                    output.plain_text,
+                    output.metadata["render_hash"],
+                )
+                for key, (source_id, style_id, output) in entries.items()
+            ],
+        )
+        # COUNT(1) scans the table, so it only runs once the rows written since
+        # the last count could have used up the headroom that count left.
+        with self._lock:
+            self._written += len(entries)
+            due = self._written > self._headroom
+        if due:
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        count = conn.execute("SELECT COUNT(1) FROM render_cache;").fetchone()[0]
+        overflow = count - self.max_rows
+        if overflow > 0:
+            overflow = min(count, overflow + self.slack)
+            conn.execute(
+                """
+                DELETE FROM render_cache
+                WHERE rowid IN (SELECT rowid FROM render_cache ORDER BY rowid LIMIT ?);
+                """,
+                (overflow,),
+            )
+            count -= overflow
+        with self._lock:
+            self.counts += 1
+            self._written = 0
+            self._headroom = self.max_rows - count
+            if overflow > 0:
+                self.evictions += overflow
+
+    def stats(self, conn: sqlite3.Connection | None = None) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            data: dict[str, Any] = {
+                "max_rows": self.max_rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "counts": self.counts,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+        if conn is not None:
+            data["rows"] = conn.execute("SELECT COUNT(1) FROM render_cache;").fetchone()[0]
+        return data
+
+
+render_cache = RenderCache(int(os.getenv("HISTY_RENDER_CACHE_ROWS", "50000")))
+
+
+def _store(
+    conn: sqlite3.Connection,
+    fresh: dict[str, tuple[str, str, RenderOutput]],
+    writer: Writer | None,
+    background: bool = False,
+) -> None:
+    if not fresh:
+        return
+    if writer is None:
+        render_cache.put_many(conn, fresh)
+        conn.commit()
+    elif background:
+        # Pre-rendered rows go through the writer's background lane in small
+        # chunks, so a large document never holds up an interactive write.
+        items = list(fresh.items())
+        for start in range(0, len(items), _BACKGROUND_CHUNK):
+            chunk = dict(items[start : start + _BACKGROUND_CHUNK])
+            writer.run(
+                lambda write_conn, chunk=chunk: render_cache.put_many(write_conn, chunk),
+                background=True,
+            )
+    else:
+        writer.run(lambda write_conn: render_cache.put_many(write_conn, fresh))
+
+
+def _source_revisions(sources: Iterable[dict[str, Any]]) -> dict[str, str]:
+    # A refresh cites the same source many times; hash each one once per batch.
+    revisions: dict[str, str] = {}
+    for source in sources:
+        if source["id"] not in revisions:
+            revisions[source["id"]] = source_revision(source)
+    return revisions
+
+
+def render_citations_cached(
+    conn: sqlite3.Connection,
+    style: dict[str, Any],
+    items: list[tuple[dict[str, Any], dict[str, Any], str]],
+    writer: Writer | None = None,
+    background: bool = False,
+) -> list[RenderOutput]:
+    digest = style_digest(style)
+    revisions = _source_revisions(source for _, source, _ in items)
+    keys = [
+        render_input_hash(
+            digest,
+            revisions[source["id"]],
+            _template_key_for_style(style, source, variant),
+            citation.get("locator"),
+            variant,
+        )
+        for citation, source, variant in items
+    ]
+    cached = render_cache.get_many(conn, keys)
+
+    outputs = []
+    fresh: dict[str, tuple[str, str, RenderOutput]] = {}
+    for key, (citation, source, variant) in zip(keys, items):
+        output = cached.get(key)
+        if output is None:
+            output = render_citation(
+                citation,
+                source,
+                source.get("contributors", []),
+                style,
+                variant=variant,
+                source_rev=revisions[source["id"]],
+            )
+            cached[key] = output
+            fresh[key] = (source["id"], style["id"], output)
+        outputs.append(output)
+
+    _store(conn, fresh, writer, background)
+    return outputs
+
+
+def render_bibliography_cached(
+    conn: sqlite3.Connection,
+    style: dict[str, Any],
+    sources: list[dict[str, Any]],
+    writer: Writer | None = None,
+    background: bool = False,
+) -> list[RenderOutput]:
+    digest = style_digest(style)
+    revisions = _source_revisions(sources)
+    keys = [
+        render_input_hash(
+            digest, revisions[source["id"]], "bibliography_entry", None, "bibliography"
+        )
+        for source in sources
+    ]
+    cached = render_cache.get_many(conn, keys)
+
+    outputs = []
+    fresh: dict[str, tuple[str, str, RenderOutput]] = {}
+    for key, source in zip(keys, sources):
+        output = cached.get(key)
+        if output is None:
+            output = render_bibliography_entry(
+                source,
+                source.get("contributors", []),
+                style,
+                source_rev=revisions[source["id"]],
+            )
+            cached[key] = output
+            fresh[key] = (source["id"], style["id"], output)
+        outputs.append(output)
+
+    _store(conn, fresh, writer, background)
+    return outputs
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
+
+from ..db import queries
+from ..db.connection import ConnectionPool
+from ..db.writer import Writer
+from ..styles.registry import style_registry
+from .cache import render_bibliography_cached, render_citations_cached
+from .renderer import VariantTracker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.getenv("HISTY_PRERENDER_WORKERS", "2"))
+DEFAULT_MAX_QUEUED = int(os.getenv("HISTY_PRERENDER_QUEUE_SIZE", "256"))
+# Background jobs yield to interactive requests, but never for longer than this,
+# so a steady stream of requests cannot starve the queue.
+MAX_DEFER = 2.0
+
+
+def prerender_document(conn: sqlite3.Connection, writer: Writer, doc_id: str) -> int:
+    # Renders a document's citations and bibliography in stored order, which is
+    # what the next /render/refresh asks for, so that refresh is all cache hits.
+    bundle = queries.load_document_bundle(conn, doc_id, load_style=style_registry.get)
+    if not bundle or not bundle.style:
+        return 0
+    tracker = VariantTracker()
+    pending = []
+    for citation in bundle.citations:
+        source = bundle.sources.get(citation["source_id"])
+        if source:
+            pending.append((citation, source, tracker.advance(citation)))
+    render_citations_cached(conn, bundle.style, pending, writer, background=True)
+    render_bibliography_cached(
+        conn, bundle.style, bundle.cited_sources(), writer, background=True
+    )
+    return len(pending)
+
+
+class PrerenderQueue:
+    # Bounded, per-document deduplicated queue of background re-renders, worked
+    # by a few daemon threads that step aside while interactive requests run.
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_queued: int = DEFAULT_MAX_QUEUED) -> None:
+        self.workers = workers
+        self.max_queued = max_queued
+        self._jobs: OrderedDict[str, tuple[float, ConnectionPool, Writer]] = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+        self._interactive = 0
+        self._running = 0
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.completed = 0
+        self.failed = 0
+        self.deferred = 0
+        self.rendered = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._latency_max = 0.0
+
+    def schedule(self, doc_ids: Iterable[str], pool: ConnectionPool, writer: Writer) -> None:
+        if self.workers <= 0:
+            return
+        with self._cond:
+            for doc_id in doc_ids:
+                if doc_id in self._jobs:
+                    self.deduplicated += 1
+                elif len(self._jobs) >= self.max_queued:
+                    self.dropped += 1
+                else:
+                    self._jobs[doc_id] = (time.perf_counter(), pool, writer)
+                    self.scheduled += 1
+            self._ensure_started()
+            self._cond.notify_all()
+
+    def _ensure_started(self) -> None:
+        if self._threads or self._stopping:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._loop, name=f"histy-prerender-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    @contextmanager
+    def interactive(self) -> Iterator[None]:
+        with self._cond:
+            self._interactive += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._interactive -= 1
+                self._cond.notify_all()
+
+    def _next_job(self) -> tuple[str, float, ConnectionPool, Writer] | None:
+        with self._cond:
+            while not self._stopping and not self._jobs:
+                self._cond.wait()
+            if self._interactive:
+                self.deferred += 1
+                self._cond.wait_for(
+                    lambda: self._stopping or not self._interactive, timeout=MAX_DEFER
+                )
+            if self._stopping or not self._jobs:
+                return None
+            doc_id, (enqueued, pool, writer) = self._jobs.popitem(last=False)
+            self._running += 1
+            return doc_id, enqueued, pool, writer
+
+    def _loop(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                with self._cond:
+                    if self._stopping:
+                        return
+                continue
+            doc_id, enqueued, pool, writer = job
+            started = time.perf_counter()
+            rendered = 0
+            ok = True
+            conn = pool.acquire()
+            try:
+                rendered = prerender_document(conn, writer, doc_id)
+            except Exception:
+                logger.exception("prerender of document %s failed", doc_id)
+                ok = False
+            finally:
+                pool.release(conn)
+            finished = time.perf_counter()
+            with self._cond:
+                self._running -= 1
+                if ok:
+                    self.completed += 1
+                    self.rendered += rendered
+                else:
+                    self.failed += 1
+                self._wait_total += started - enqueued
+                self._run_total += finished - started
+                self._latency_max = max(self._latency_max, finished - enqueued)
+                self._cond.notify_all()
+
+    def join(self, timeout: float | None = None) -> bool:
+        # Waits until nothing is queued or running; used by tests and shutdown.
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._jobs and not self._running, timeout=timeout
+            )
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._jobs.clear()
+            threads = self._threads
+            self._threads = []
+            self._cond.notify_all()
+        for thread in threads:
+            thread.join()
+        with self._cond:
+            self._stopping = False
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            finished = self.completed + self.failed
+            return {
+                "workers": self.workers,
+                "queued": len(self._jobs),
+                "running": self._running,
+                "max_queued": self.max_queued,
+                "scheduled": self.scheduled,
+                "deduplicated": self.deduplicated,
+                "dropped": self.dropped,
+                "completed": self.completed,
+                "failed": self.failed,
+                "deferred": self.deferred,
+                "citations_rendered": self.rendered,
+                "avg_wait_ms": round(self._wait_total * 1000 / finished, 3) if finished else 0.0,
+                "avg_run_ms": round(self._run_total * 1000 / finished, 3) if finished else 0.0,
+                "max_latency_ms": round(self._latency_max * 1000, 3),
+            }
+
+
+prerender_queue = PrerenderQueue()
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
 import hashlib
+import json
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any, Iterable
 
-from jinja2 import Environment, BaseLoader
+from jinja2 import Environment, BaseLoader, Template
+
+_ENV = Environment(loader=BaseLoader(), autoescape=False)
 
 
 @dataclass
@@ -24,19 +30,22 @@ def _split_name(name: str) -> tuple[str, str]:
     return parts[-1], " ".join(parts[:-1])
 
 
-def _format_contributors(contributors: list[dict[str, Any]]) -> dict[str, str]:
-    authors = [c for c in contributors if c.get("role") == "author"]
-    editors = [c for c in contributors if c.get("role") == "editor"]
-    primary = authors or editors or contributors
-
-    names = []
-    for contributor in primary:
-        name = contributor.get("name") or ""
-        names.append(name)
+@lru_cache(maxsize=4096)
+def _contributor_block(people: tuple[tuple[str, str | None], ...]) -> tuple[str, str, str, str]:
+    authors = [name for name, role in people if role == "author"]
+    editors = [name for name, role in people if role == "editor"]
+    names = authors or editors or [name for name, _ in people]
 
     full = "; ".join(names)
     first_name = names[0] if names else ""
     surname, given = _split_name(first_name) if first_name else ("", "")
+    return full, first_name, surname, given
+
+
+def _format_contributors(contributors: list[dict[str, Any]]) -> dict[str, str]:
+    full, first_name, surname, given = _contributor_block(
+        tuple((c.get("name") or "", c.get("role")) for c in contributors)
+    )
     return {
         "full": full,
         "first_name": first_name,
@@ -100,24 +109,134 @@ def _context_from_source(
     }
 
 
+def _source_fingerprint(source: dict[str, Any]) -> dict[str, Any]:
+    fields = {key: value for key, value in source.items() if key != "contributors"}
+    contributors = [
+        [c.get("name"), c.get("role"), int(bool(c.get("is_corporate"))), c.get("position")]
+        for c in source.get("contributors", [])
+    ]
+    return {"fields": fields, "contributors": contributors}
+
+
+def source_revision(source: dict[str, Any]) -> str:
+    return hashlib.sha256(
+        json.dumps(_source_fingerprint(source), sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+_CONTEXT_SOURCE_FIELDS = (
+    "title",
+    "short_title",
+    "year",
+    "place",
+    "publisher",
+    "container_title",
+    "volume",
+    "issue",
+    "pages",
+    "url",
+    "accessed",
+    "archive_name",
+    "collection",
+    "signature",
+    "folio",
+    "locator",
+)
+
+
+class ContextCache:
+    # Base render contexts keyed by source revision (or, without one, the source
+    # fields and contributors they are built from) plus the rules that affect
+    # them; per-citation fields (locator, variant, abbreviations) are overlaid on
+    # a copy by the caller.
+    def __init__(self, max_size: int = 4096) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        source: dict[str, Any],
+        contributors: list[dict[str, Any]],
+        rules: dict[str, Any],
+        source_rev: str | None = None,
+    ) -> dict[str, Any]:
+        key = (
+            source_rev
+            or (
+                tuple(map(source.get, _CONTEXT_SOURCE_FIELDS)),
+                tuple([(c.get("name"), c.get("role")) for c in contributors]),
+            ),
+            bool(rules.get("surname_smallcaps")),
+            bool(rules.get("title_italic")),
+            rules.get("pages_prefix") or "",
+        )
+        with self._lock:
+            context = self._entries.get(key)
+            if context is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return context
+            self.misses += 1
+
+        context = _context_from_source(source, contributors, rules)
+        with self._lock:
+            self._entries[key] = context
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return context
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+context_cache = ContextCache()
+
+
+class VariantTracker:
+    # Walks the ordered citation stream once: a seen-source set plus the previous
+    # (source_id, locator) pair is all first/short/ibid selection needs.
+    def __init__(
+        self,
+        seen_sources: Iterable[str] | None = None,
+        last: tuple[Any, Any] | None = None,
+    ) -> None:
+        self.seen_sources: set[str] = set(seen_sources or ())
+        self.last = last
+
+    def select(self, citation: dict[str, Any]) -> str:
+        key = (citation.get("source_id"), citation.get("locator"))
+        if self.last is not None and self.last == key:
+            return "ibid"
+        return "short" if citation.get("source_id") in self.seen_sources else "first"
+
+    def advance(self, citation: dict[str, Any]) -> str:
+        variant = self.select(citation)
+        self.seen_sources.add(citation.get("source_id"))
+        self.last = (citation.get("source_id"), citation.get("locator"))
+        return variant
+
+
 def _select_variant(
     citation: dict[str, Any],
     prior_citations: list[dict[str, Any]],
 ) -> str:
-    if not prior_citations:
-        return "first"
-
-    last = prior_citations[-1]
-    if (
-        last.get("source_id") == citation.get("source_id")
-        and last.get("locator") == citation.get("locator")
-    ):
-        return "ibid"
-
-    seen_source = any(
-        prior.get("source_id") == citation.get("source_id") for prior in prior_citations
-    )
-    return "short" if seen_source else "first"
+    tracker = VariantTracker()
+    for prior in prior_citations:
+        tracker.advance(prior)
+    return tracker.select(citation)
 
 
 def _template_key_for_style(style: dict[str, Any], source: dict[str, Any], variant: str) -> str:
@@ -169,9 +288,76 @@ def _runs_to_plain_text(runs: list[dict[str, Any]]) -> str:
     return "".join(run.get("text", "") for run in runs)
 
 
-def _render_template(markdown: str, context: dict[str, Any]) -> str:
-    env = Environment(loader=BaseLoader(), autoescape=False)
-    template = env.from_string(markdown)
+class TemplateCache:
+    # Keyed on the template content hash as well as the style version, so an edited
+    # style_templates row never hits a stale compiled template.
+    def __init__(self, max_size: int = 256) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str, str, str], Template] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, style: dict[str, Any], template_key: str, markdown: str) -> Template:
+        key = (
+            str(style.get("id")),
+            str(style.get("version")),
+            template_key,
+            hashlib.sha256(markdown.encode("utf-8")).hexdigest(),
+        )
+        with self._lock:
+            template = self._entries.get(key)
+            if template is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = _ENV.from_string(markdown)
+        with self._lock:
+            self._entries[key] = template
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return template
+
+    def invalidate(self, style_id: str | None = None) -> None:
+        with self._lock:
+            if style_id is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == style_id]:
+                del self._entries[key]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+template_cache = TemplateCache()
+
+
+def _style_revision(style: dict[str, Any]) -> str:
+    # The modification counter changes with every template, rule or
+    # abbreviation edit; plain style dicts without one fall back to the
+    # package version.
+    return (
+        f"{style.get('version')}:{style.get('modification_counter') or ''}:"
+        f"{style.get('revision') or ''}"
+    )
+
+
+def _render_template(
+    style: dict[str, Any], template_key: str, markdown: str, context: dict[str, Any]
+) -> str:
+    template = style.get("compiled", {}).get(template_key)
+    if template is None:
+        template = template_cache.get(style, template_key, markdown)
     return template.render(**context)
 
 
@@ -180,14 +366,17 @@ def render_citation(
     source: dict[str, Any],
     contributors: list[dict[str, Any]],
     style: dict[str, Any],
-    prior_citations: list[dict[str, Any]],
+    prior_citations: list[dict[str, Any]] | None = None,
+    variant: str | None = None,
+    source_rev: str | None = None,
 ) -> RenderOutput:
     rules = style.get("rules", {})
-    variant = _select_variant(citation, prior_citations)
+    if variant is None:
+        variant = _select_variant(citation, prior_citations or [])
     template_key = _template_key_for_style(style, source, variant)
     template = style.get("templates", {}).get(template_key, "")
 
-    context = _context_from_source(source, contributors, rules)
+    context = {**context_cache.get(source, contributors, rules, source_rev)}
     context.update({
         "locator": citation.get("locator") or "",
         "locator_block": (
@@ -198,12 +387,12 @@ def render_citation(
         "variant": variant,
     })
 
-    markdown = _render_template(template, context).strip()
+    markdown = _render_template(style, template_key, template, context).strip()
     runs = render_markdown_to_runs(markdown)
     plain_text = _runs_to_plain_text(runs).strip()
 
     render_hash = hashlib.sha256(
-        f"{style.get('version')}::{template_key}::{markdown}".encode("utf-8")
+        f"{_style_revision(style)}::{template_key}::{markdown}".encode("utf-8")
     ).hexdigest()
 
     return RenderOutput(
@@ -221,19 +410,20 @@ def render_bibliography_entry(
     source: dict[str, Any],
     contributors: list[dict[str, Any]],
     style: dict[str, Any],
+    source_rev: str | None = None,
 ) -> RenderOutput:
     rules = style.get("rules", {})
     template_key = "bibliography_entry"
     template = style.get("templates", {}).get(template_key, "")
-    context = _context_from_source(source, contributors, rules)
+    context = {**context_cache.get(source, contributors, rules, source_rev)}
     context.update({"abbr": style.get("abbreviations", {})})
 
-    markdown = _render_template(template, context).strip()
+    markdown = _render_template(style, template_key, template, context).strip()
     runs = render_markdown_to_runs(markdown)
     plain_text = _runs_to_plain_text(runs).strip()
 
     render_hash = hashlib.sha256(
-        f"{style.get('version')}::{template_key}::{markdown}".encode("utf-8")
+        f"{_style_revision(style)}::{template_key}::{markdown}".encode("utf-8")
     ).hexdigest()
 
     return RenderOutput(
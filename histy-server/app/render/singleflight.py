@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_FLIGHT_TIMEOUT = float(os.getenv("HISTY_RENDER_FLIGHT_TIMEOUT_S", "30"))
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    # Concurrent calls with the same key share one computation: the first caller
+    # runs it, the rest wait for its result or exception. Nothing is kept once
+    # the flight lands; this coalesces, the render cache is what caches.
+    def __init__(self, timeout: float = DEFAULT_FLIGHT_TIMEOUT) -> None:
+        self.timeout = timeout
+        self._flights: dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.max_waiters = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+                self.max_waiters = max(self.max_waiters, flight.waiters)
+
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as exc:
+                flight.error = exc
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return flight.result
+
+        if not flight.done.wait(self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError("render_flight_timeout")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "max_waiters": self.max_waiters,
+                "timeout_s": self.timeout,
+            }
+
+
+render_flights = SingleFlight()
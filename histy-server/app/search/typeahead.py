@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any
+
+from ..db import queries
+from ..db.connection import ConnectionPool
+from ..db.names import fold_text, canonical_name
+from ..db.writer import Writer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = int(os.getenv("HISTY_SUGGEST_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# (folded key, source_id, kind, matched text)
+_Entry = tuple[str, str, str, str]
+
+# Titles are also keyed from each later word start, so "regni" completes
+# "Historia Regni". Short words ("de", "of") are skipped and long titles only
+# index their first few word starts, which bounds the extra entries per source.
+_MIN_WORD_LENGTH = 3
+_MAX_WORD_STARTS = 8
+
+
+def _surname(name: str, is_corporate: bool) -> str:
+    return canonical_name(name, is_corporate).split(",", 1)[0].strip()
+
+
+def _entries_for(source: dict[str, Any]) -> list[_Entry]:
+    source_id = source["id"]
+    candidates = [("title", source.get("title")), ("short_title", source.get("short_title"))]
+    candidates.extend(
+        ("contributor", _surname(contributor["name"], bool(contributor.get("is_corporate"))))
+        for contributor in source.get("contributors", [])
+        if contributor.get("name")
+    )
+    entries = {}
+    for kind, text in candidates:
+        folded = fold_text(text or "")
+        keys = [folded]
+        if kind != "contributor":
+            words = folded.split(" ")
+            keys.extend(
+                " ".join(words[idx:])
+                for idx in range(1, min(len(words), _MAX_WORD_STARTS))
+                if len(words[idx]) >= _MIN_WORD_LENGTH
+            )
+        for key in keys:
+            if key and key not in entries:
+                entries[key] = (key, source_id, kind, text)
+    return list(entries.values())
+
+
+def _entry_size(entry: _Entry) -> int:
+    return sys.getsizeof(entry) + sum(sys.getsizeof(part) for part in entry)
+
+
+class SuggestIndex:
+    # Sorted (key, source_id, ...) tuples searched with bisect; prefix lookups
+    # never touch SQLite. When the memory budget is exceeded the index stops
+    # growing and reports itself incomplete so callers can fall back to FTS.
+    # It also remembers the source change revision it reflects: writes it did
+    # not see (another process, e.g. the CLI importer) make it stale until a
+    # background rebuild catches up.
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._entries: list[_Entry] = []
+        self._by_source: dict[str, list[_Entry]] = {}
+        self._sources: dict[str, tuple[str, Any]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.complete = True
+        self.revision: int | None = None
+        self._rebuild: threading.Thread | None = None
+        self.builds = 0
+        self.stale = 0
+        self.build_ms = 0.0
+        self.updates = 0
+        self.lookups = 0
+
+    def build(self, conn: sqlite3.Connection) -> None:
+        started = time.perf_counter()
+        # Read first: a write that lands during the build leaves the index
+        # stale rather than claiming to cover it.
+        revision = queries.source_change_revision(conn)
+        sources: dict[str, dict[str, Any]] = {
+            row["id"]: {**dict(row), "contributors": []}
+            for row in conn.execute("SELECT id, title, short_title, year FROM sources;")
+        }
+        for row in conn.execute(
+            """
+            SELECT sc.source_id, c.name, c.is_corporate
+            FROM source_contributors sc
+            JOIN contributors c ON c.id = sc.contributor_id;
+            """
+        ):
+            source = sources.get(row["source_id"])
+            if source is not None:
+                source["contributors"].append(dict(row))
+
+        entries: list[_Entry] = []
+        by_source: dict[str, list[_Entry]] = {}
+        titles: dict[str, tuple[str, Any]] = {}
+        size = 0
+        complete = True
+        for source in sources.values():
+            source_entries = _entries_for(source)
+            source_size = sum(_entry_size(entry) for entry in source_entries)
+            if size + source_size > self.max_bytes:
+                complete = False
+                break
+            entries.extend(source_entries)
+            by_source[source["id"]] = source_entries
+            titles[source["id"]] = (source["title"], source.get("year"))
+            size += source_size
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._by_source = by_source
+            self._sources = titles
+            self._bytes = size
+            self.complete = complete
+            self.revision = revision
+            self.builds += 1
+            self.build_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def upsert_source(self, writer: Writer, payload: dict[str, Any]) -> dict[str, Any]:
+        # Writes the source and applies it to the index. The revisions around
+        # the write tell whether anything else changed sources in between.
+        def write(conn: sqlite3.Connection) -> tuple[dict[str, Any], int, int]:
+            before = queries.source_change_revision(conn)
+            source = queries.upsert_source(conn, payload)
+            return source, before, queries.source_change_revision(conn)
+
+        source, before, after = writer.run(write)
+        self.update(source, before, after)
+        return source
+
+    def update(self, source: dict[str, Any], before: int, after: int) -> None:
+        new_entries = _entries_for(source)
+        new_size = sum(_entry_size(entry) for entry in new_entries)
+        with self._lock:
+            if self.revision == before:
+                self.revision = after
+            self._remove(source["id"])
+            if self._bytes + new_size > self.max_bytes:
+                self.complete = False
+                return
+            for entry in new_entries:
+                insort(self._entries, entry)
+            self._by_source[source["id"]] = new_entries
+            self._sources[source["id"]] = (source["title"], source.get("year"))
+            self._bytes += new_size
+            self.updates += 1
+
+    def _remove(self, source_id: str) -> None:
+        for entry in self._by_source.pop(source_id, []):
+            idx = bisect_left(self._entries, entry)
+            if idx < len(self._entries) and self._entries[idx] == entry:
+                del self._entries[idx]
+                self._bytes -= _entry_size(entry)
+        self._sources.pop(source_id, None)
+
+    def check(self, conn: sqlite3.Connection, pool: ConnectionPool) -> bool:
+        # True when the index is complete and current; otherwise callers should
+        # fall back to FTS while a rebuild runs in the background.
+        revision = queries.source_change_revision(conn)
+        with self._lock:
+            if revision == self.revision:
+                return self.complete
+            self.stale += 1
+            if self._rebuild is None:
+                self._rebuild = threading.Thread(
+                    target=self._rebuild_from, args=(pool,), name="histy-suggest", daemon=True
+                )
+                self._rebuild.start()
+        return False
+
+    def _rebuild_from(self, pool: ConnectionPool) -> None:
+        conn = pool.acquire()
+        try:
+            self.build(conn)
+        except Exception:
+            logger.exception("suggest index rebuild failed")
+        finally:
+            pool.release(conn)
+            with self._lock:
+                self._rebuild = None
+
+    def join(self, timeout: float | None = None) -> None:
+        # Waits for a running rebuild; used by tests.
+        with self._lock:
+            thread = self._rebuild
+        if thread is not None:
+            thread.join(timeout)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[dict[str, Any]]:
+        key = fold_text(prefix)
+        items = []
+        seen: set[str] = set()
+        with self._lock:
+            self.lookups += 1
+            idx = bisect_left(self._entries, (key,))
+            while idx < len(self._entries) and len(items) < limit:
+                entry_key, source_id, kind, text = self._entries[idx]
+                if not entry_key.startswith(key):
+                    break
+                idx += 1
+                if source_id in seen:
+                    continue
+                seen.add(source_id)
+                title, year = self._sources[source_id]
+                items.append(
+                    {"id": source_id, "title": title, "year": year, "kind": kind, "match": text}
+                )
+        return items
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "sources": len(self._sources),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "complete": self.complete,
+                "revision": self.revision,
+                "stale": self.stale,
+                "builds": self.builds,
+                "build_ms": self.build_ms,
+                "updates": self.updates,
+                "lookups": self.lookups,
+            }
+
+
+suggest_index = SuggestIndex()
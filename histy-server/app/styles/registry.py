@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import Any
+
+from jinja2 import TemplateSyntaxError
+
+from ..db import queries
+from ..render.renderer import _ENV
+
+
+def check_templates(templates: dict[str, str]) -> dict[str, str]:
+    errors = {}
+    for key, markdown in templates.items():
+        try:
+            _ENV.from_string(markdown)
+        except TemplateSyntaxError as exc:
+            errors[key] = f"line {exc.lineno}: {exc.message}"
+    return errors
+
+
+def compile_templates(templates: dict[str, str]) -> dict[str, Any]:
+    compiled = {}
+    for key, markdown in templates.items():
+        try:
+            compiled[key] = _ENV.from_string(markdown)
+        except TemplateSyntaxError:
+            # Left to the renderer's template cache, which raises when the
+            # broken template is actually used.
+            continue
+    return compiled
+
+
+class StyleRegistry:
+    # One parsed, precompiled copy of each style package per process. A hit costs
+    # a single primary-key lookup of (version, modification_counter); the counter
+    # is bumped by triggers in the same transaction as any template, rule or
+    # abbreviation change, so edits from any process are picked up.
+    def __init__(self) -> None:
+        self._styles: dict[str, tuple[tuple[str, int], dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(
+        self,
+        conn: sqlite3.Connection,
+        style_id: str,
+        revision: tuple[str, int] | None = None,
+    ) -> dict[str, Any] | None:
+        if revision is None:
+            revision = queries.get_style_revision(conn, style_id)
+            if revision is None:
+                return None
+
+        with self._lock:
+            entry = self._styles.get(style_id)
+            if entry is not None and entry[0] == revision:
+                self.hits += 1
+                return entry[1]
+
+        style = queries.get_style(conn, style_id)
+        if style is None:
+            return None
+        style["compiled"] = compile_templates(style["templates"])
+        with self._lock:
+            self._styles[style_id] = ((style["version"], style["modification_counter"]), style)
+            self.loads += 1
+        return style
+
+    def invalidate(self, style_id: str | None = None) -> None:
+        with self._lock:
+            if style_id is None:
+                self._styles.clear()
+            else:
+                self._styles.pop(style_id, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"styles": len(self._styles), "hits": self.hits, "loads": self.loads}
+
+
+style_registry = StyleRegistry()
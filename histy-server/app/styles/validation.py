@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any
+
+from jinja2 import TemplateSyntaxError, meta
+
+from ..db import queries
+from ..render.renderer import _ENV, _template_key_for_style
+
+# Template variables that render empty unless the source has the given field.
+# short_title falls back to the title and locator* come from the citation, so
+# neither makes a source field required.
+_VARIABLE_FIELDS = {
+    "author": "contributors",
+    "author_sc": "contributors",
+    "author_surname": "contributors",
+    "title": "title",
+    "title_italic": "title",
+    **{
+        name: name
+        for name in queries.SOURCE_COLUMNS
+        if name not in ("id", "type", "title", "short_title")
+    },
+}
+
+
+def template_fields(markdown: str) -> list[str]:
+    try:
+        variables = meta.find_undeclared_variables(_ENV.parse(markdown))
+    except TemplateSyntaxError:
+        return []
+    return sorted({_VARIABLE_FIELDS[name] for name in variables if name in _VARIABLE_FIELDS})
+
+
+def check_document(
+    conn: sqlite3.Connection,
+    doc_id: str,
+    style: dict[str, Any] | None,
+    citation_uuids: list[str] | None = None,
+) -> list[dict[str, Any]]:
+    issues: list[dict[str, Any]] = [
+        {"error": "missing_source", **row}
+        for row in queries.citations_missing_sources(conn, doc_id)
+    ]
+    issues.extend(
+        {"error": "duplicate_doc_order", **row}
+        for row in queries.duplicate_doc_orders(conn, doc_id)
+    )
+    if citation_uuids is not None:
+        issues.extend(
+            {"citation_uuid": uuid, "error": "orphaned_citation"}
+            for uuid in queries.orphaned_citations(conn, doc_id, citation_uuids)
+        )
+        issues.extend(
+            {"citation_uuid": uuid, "error": "unknown_citation"}
+            for uuid in queries.unknown_citations(conn, doc_id, citation_uuids)
+        )
+
+    if style is None:
+        issues.append({"error": "style_not_found"})
+        return issues
+
+    # A source's first footnote and its bibliography entry are the templates it
+    # always needs; short and ibid forms fall back to the first footnote.
+    templates = style.get("templates", {})
+    for group in queries.cited_source_types(conn, doc_id):
+        keys = [
+            _template_key_for_style(style, {"type": group["type"]}, "first"),
+            "bibliography_entry",
+        ]
+        fields: set[str] = set()
+        for key in keys:
+            if not templates.get(key):
+                issues.append(
+                    {
+                        "error": "missing_template",
+                        "template_key": key,
+                        "source_type": group["type"],
+                        "citations": group["citations"],
+                    }
+                )
+                continue
+            fields.update(template_fields(templates[key]))
+        for source in queries.cited_sources_missing_fields(
+            conn, doc_id, group["type"], sorted(fields)
+        ):
+            issues.append({"error": "missing_fields", "source_type": group["type"], **source})
+    return issues
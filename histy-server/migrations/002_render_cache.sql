@@ -0,0 +1,117 @@
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS render_cache (
+  input_hash TEXT PRIMARY KEY,
+  source_id TEXT NOT NULL,
+  style_id TEXT NOT NULL,
+  template_key TEXT NOT NULL,
+  variant TEXT NOT NULL,
+  runs_json TEXT NOT NULL,
+  plain_text TEXT NOT NULL,
+  render_hash TEXT NOT NULL,
+  created_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_render_cache_source_id ON render_cache(source_id);
+CREATE INDEX IF NOT EXISTS idx_render_cache_style_id ON render_cache(style_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_sources_update
+AFTER UPDATE ON sources
+BEGIN
+  DELETE FROM render_cache WHERE source_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_sources_delete
+AFTER DELETE ON sources
+BEGIN
+  DELETE FROM render_cache WHERE source_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_source_contributors_insert
+AFTER INSERT ON source_contributors
+BEGIN
+  DELETE FROM render_cache WHERE source_id = NEW.source_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_source_contributors_update
+AFTER UPDATE ON source_contributors
+BEGIN
+  DELETE FROM render_cache WHERE source_id IN (OLD.source_id, NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_source_contributors_delete
+AFTER DELETE ON source_contributors
+BEGIN
+  DELETE FROM render_cache WHERE source_id = OLD.source_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_contributors_update
+AFTER UPDATE ON contributors
+BEGIN
+  DELETE FROM render_cache
+  WHERE source_id IN (
+    SELECT source_id FROM source_contributors WHERE contributor_id = OLD.id
+  );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_packages_update
+AFTER UPDATE ON style_packages
+BEGIN
+  DELETE FROM render_cache WHERE style_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_templates_insert
+AFTER INSERT ON style_templates
+BEGIN
+  DELETE FROM render_cache WHERE style_id = NEW.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_templates_update
+AFTER UPDATE ON style_templates
+BEGIN
+  DELETE FROM render_cache WHERE style_id IN (OLD.style_id, NEW.style_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_templates_delete
+AFTER DELETE ON style_templates
+BEGIN
+  DELETE FROM render_cache WHERE style_id = OLD.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_rules_insert
+AFTER INSERT ON style_rules
+BEGIN
+  DELETE FROM render_cache WHERE style_id = NEW.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_rules_update
+AFTER UPDATE ON style_rules
+BEGIN
+  DELETE FROM render_cache WHERE style_id IN (OLD.style_id, NEW.style_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_rules_delete
+AFTER DELETE ON style_rules
+BEGIN
+  DELETE FROM render_cache WHERE style_id = OLD.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_abbreviations_insert
+AFTER INSERT ON style_abbreviations
+BEGIN
+  DELETE FROM render_cache WHERE style_id = NEW.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_abbreviations_update
+AFTER UPDATE ON style_abbreviations
+BEGIN
+  DELETE FROM render_cache WHERE style_id IN (OLD.style_id, NEW.style_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_render_cache_style_abbreviations_delete
+AFTER DELETE ON style_abbreviations
+BEGIN
+  DELETE FROM render_cache WHERE style_id = OLD.style_id;
+END;
+
+COMMIT;
@@ -0,0 +1,119 @@
+BEGIN;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS sources_fts USING fts5(
+  title,
+  short_title,
+  container_title,
+  archive_name,
+  collection,
+  signature,
+  contributors,
+  tokenize = 'unicode61 remove_diacritics 2',
+  prefix = '2 3'
+);
+
+INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+       (SELECT group_concat(c.name, ' ')
+        FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+        WHERE sc.source_id = s.id)
+FROM sources s;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_fts_insert
+AFTER INSERT ON sources
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = NEW.rowid;
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = NEW.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_fts_update
+AFTER UPDATE ON sources
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = NEW.rowid;
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = NEW.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_fts_delete
+AFTER DELETE ON sources
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = OLD.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_fts_source_contributors_insert
+AFTER INSERT ON source_contributors
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = (SELECT rowid FROM sources WHERE id = NEW.source_id);
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = (SELECT rowid FROM sources WHERE id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_fts_source_contributors_update
+AFTER UPDATE ON source_contributors
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = (SELECT rowid FROM sources WHERE id = OLD.source_id);
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = (SELECT rowid FROM sources WHERE id = OLD.source_id);
+  DELETE FROM sources_fts WHERE rowid = (SELECT rowid FROM sources WHERE id = NEW.source_id);
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = (SELECT rowid FROM sources WHERE id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_fts_source_contributors_delete
+AFTER DELETE ON source_contributors
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = (SELECT rowid FROM sources WHERE id = OLD.source_id);
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = (SELECT rowid FROM sources WHERE id = OLD.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_fts_contributors_update
+AFTER UPDATE OF name ON contributors
+BEGIN
+  DELETE FROM sources_fts
+  WHERE rowid IN (
+    SELECT s.rowid FROM sources s
+    JOIN source_contributors sc ON sc.source_id = s.id
+    WHERE sc.contributor_id = NEW.id
+  );
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc2 JOIN contributors c ON c.id = sc2.contributor_id
+          WHERE sc2.source_id = s.id)
+  FROM sources s
+  WHERE s.id IN (SELECT source_id FROM source_contributors WHERE contributor_id = NEW.id);
+END;
+
+COMMIT;
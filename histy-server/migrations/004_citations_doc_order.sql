@@ -0,0 +1,6 @@
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_citations_doc_order ON citations(doc_id, doc_order);
+DROP INDEX IF EXISTS idx_citations_doc_id;
+
+COMMIT;
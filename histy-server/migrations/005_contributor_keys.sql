@@ -0,0 +1,26 @@
+BEGIN;
+
+ALTER TABLE contributors ADD COLUMN name_key TEXT;
+
+UPDATE contributors SET name_key = histy_contributor_key(name, is_corporate);
+
+CREATE TEMP TABLE contributor_merge AS
+SELECT c.id AS old_id,
+       (SELECT MIN(c2.id) FROM contributors c2 WHERE c2.name_key = c.name_key) AS new_id
+FROM contributors c;
+
+DELETE FROM contributor_merge WHERE old_id = new_id;
+
+UPDATE OR IGNORE source_contributors
+SET contributor_id = (
+  SELECT new_id FROM contributor_merge WHERE old_id = source_contributors.contributor_id
+)
+WHERE contributor_id IN (SELECT old_id FROM contributor_merge);
+
+DELETE FROM source_contributors WHERE contributor_id IN (SELECT old_id FROM contributor_merge);
+DELETE FROM contributors WHERE id IN (SELECT old_id FROM contributor_merge);
+DROP TABLE contributor_merge;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_contributors_name_key ON contributors(name_key);
+
+COMMIT;
@@ -0,0 +1,100 @@
+BEGIN;
+
+-- Folded title, short title and contributor names; diacritics and case are
+-- removed by histy_fold so the trigram tokenizer only sees plain text.
+CREATE VIRTUAL TABLE IF NOT EXISTS sources_trigram USING fts5(
+  text,
+  tokenize = 'trigram',
+  detail = 'none'
+);
+
+INSERT INTO sources_trigram (rowid, text)
+SELECT s.rowid, histy_fold(
+           coalesce(s.title, '') || ' ' || coalesce(s.short_title, '') || ' ' ||
+           coalesce((SELECT group_concat(c.name, ' ')
+                     FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+                     WHERE sc.source_id = s.id), ''))
+FROM sources s;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_trigram_insert
+AFTER INSERT ON sources
+BEGIN
+  DELETE FROM sources_trigram WHERE rowid = NEW.rowid;
+  INSERT INTO sources_trigram (rowid, text)
+  SELECT s.rowid, histy_fold(
+             coalesce(s.title, '') || ' ' || coalesce(s.short_title, '') || ' ' ||
+             coalesce((SELECT group_concat(c.name, ' ')
+                       FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+                       WHERE sc.source_id = s.id), ''))
+  FROM sources s
+  WHERE s.rowid = NEW.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_trigram_update
+AFTER UPDATE OF title, short_title ON sources
+BEGIN
+  DELETE FROM sources_trigram WHERE rowid = NEW.rowid;
+  INSERT INTO sources_trigram (rowid, text)
+  SELECT s.rowid, histy_fold(
+             coalesce(s.title, '') || ' ' || coalesce(s.short_title, '') || ' ' ||
+             coalesce((SELECT group_concat(c.name, ' ')
+                       FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+                       WHERE sc.source_id = s.id), ''))
+  FROM sources s
+  WHERE s.rowid = NEW.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_trigram_delete
+AFTER DELETE ON sources
+BEGIN
+  DELETE FROM sources_trigram WHERE rowid = OLD.rowid;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_trigram_source_contributors_insert
+AFTER INSERT ON source_contributors
+BEGIN
+  DELETE FROM sources_trigram WHERE rowid = (SELECT rowid FROM sources WHERE id = NEW.source_id);
+  INSERT INTO sources_trigram (rowid, text)
+  SELECT s.rowid, histy_fold(
+             coalesce(s.title, '') || ' ' || coalesce(s.short_title, '') || ' ' ||
+             coalesce((SELECT group_concat(c.name, ' ')
+                       FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+                       WHERE sc.source_id = s.id), ''))
+  FROM sources s
+  WHERE s.rowid = (SELECT rowid FROM sources WHERE id = NEW.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_trigram_source_contributors_delete
+AFTER DELETE ON source_contributors
+BEGIN
+  DELETE FROM sources_trigram WHERE rowid = (SELECT rowid FROM sources WHERE id = OLD.source_id);
+  INSERT INTO sources_trigram (rowid, text)
+  SELECT s.rowid, histy_fold(
+             coalesce(s.title, '') || ' ' || coalesce(s.short_title, '') || ' ' ||
+             coalesce((SELECT group_concat(c.name, ' ')
+                       FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+                       WHERE sc.source_id = s.id), ''))
+  FROM sources s
+  WHERE s.rowid = (SELECT rowid FROM sources WHERE id = OLD.source_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sources_trigram_contributors_update
+AFTER UPDATE OF name ON contributors
+BEGIN
+  DELETE FROM sources_trigram
+  WHERE rowid IN (
+    SELECT s.rowid FROM sources s
+    JOIN source_contributors sc ON sc.source_id = s.id
+    WHERE sc.contributor_id = NEW.id
+  );
+  INSERT INTO sources_trigram (rowid, text)
+  SELECT s.rowid, histy_fold(
+             coalesce(s.title, '') || ' ' || coalesce(s.short_title, '') || ' ' ||
+             coalesce((SELECT group_concat(c.name, ' ')
+                       FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+                       WHERE sc.source_id = s.id), ''))
+  FROM sources s
+  WHERE s.id IN (SELECT source_id FROM source_contributors WHERE contributor_id = NEW.id);
+END;
+
+COMMIT;
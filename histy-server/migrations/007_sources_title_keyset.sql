@@ -0,0 +1,6 @@
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_sources_title_id ON sources(title, id);
+DROP INDEX IF EXISTS idx_sources_title;
+
+COMMIT;
@@ -0,0 +1,70 @@
+BEGIN;
+
+-- Bumped in the same transaction as any change to a style's templates, rules or
+-- abbreviations, so in-process style caches can detect edits with one lookup.
+ALTER TABLE style_packages ADD COLUMN modification_counter INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_templates_insert_bump_style
+AFTER INSERT ON style_templates
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = NEW.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_templates_update_bump_style
+AFTER UPDATE ON style_templates
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_templates_delete_bump_style
+AFTER DELETE ON style_templates
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = OLD.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_rules_insert_bump_style
+AFTER INSERT ON style_rules
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = NEW.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_rules_update_bump_style
+AFTER UPDATE ON style_rules
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_rules_delete_bump_style
+AFTER DELETE ON style_rules
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = OLD.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_abbreviations_insert_bump_style
+AFTER INSERT ON style_abbreviations
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = NEW.style_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_abbreviations_update_bump_style
+AFTER UPDATE ON style_abbreviations
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_style_abbreviations_delete_bump_style
+AFTER DELETE ON style_abbreviations
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = OLD.style_id;
+END;
+
+COMMIT;
@@ -0,0 +1,209 @@
+BEGIN;
+
+-- Content hash over a style's templates, rules and abbreviations, kept current by
+-- the same triggers that bump modification_counter.
+ALTER TABLE style_packages ADD COLUMN revision TEXT;
+
+UPDATE style_packages SET revision = histy_sha256(coalesce((
+  SELECT group_concat(part, char(30)) FROM (
+    SELECT 'template:' || key || '=' || markdown AS part
+    FROM style_templates WHERE style_id = style_packages.id
+    UNION ALL
+    SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+    UNION ALL
+    SELECT 'abbreviation:' || key || '=' || value
+    FROM style_abbreviations WHERE style_id = style_packages.id
+    ORDER BY part
+  )
+), ''));
+
+DROP TRIGGER IF EXISTS trg_style_templates_insert_bump_style;
+CREATE TRIGGER trg_style_templates_insert_bump_style
+AFTER INSERT ON style_templates
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id = NEW.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_templates_update_bump_style;
+CREATE TRIGGER trg_style_templates_update_bump_style
+AFTER UPDATE ON style_templates
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_style_templates_delete_bump_style;
+CREATE TRIGGER trg_style_templates_delete_bump_style
+AFTER DELETE ON style_templates
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id = OLD.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_rules_insert_bump_style;
+CREATE TRIGGER trg_style_rules_insert_bump_style
+AFTER INSERT ON style_rules
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id = NEW.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_rules_update_bump_style;
+CREATE TRIGGER trg_style_rules_update_bump_style
+AFTER UPDATE ON style_rules
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_style_rules_delete_bump_style;
+CREATE TRIGGER trg_style_rules_delete_bump_style
+AFTER DELETE ON style_rules
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id = OLD.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_abbreviations_insert_bump_style;
+CREATE TRIGGER trg_style_abbreviations_insert_bump_style
+AFTER INSERT ON style_abbreviations
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id = NEW.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_abbreviations_update_bump_style;
+CREATE TRIGGER trg_style_abbreviations_update_bump_style
+AFTER UPDATE ON style_abbreviations
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_style_abbreviations_delete_bump_style;
+CREATE TRIGGER trg_style_abbreviations_delete_bump_style
+AFTER DELETE ON style_abbreviations
+BEGIN
+  UPDATE style_packages
+  SET modification_counter = modification_counter + 1,
+      revision = histy_sha256(coalesce((
+        SELECT group_concat(part, char(30)) FROM (
+          SELECT 'template:' || key || '=' || markdown AS part
+          FROM style_templates WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'rules=' || rules_json FROM style_rules WHERE style_id = style_packages.id
+          UNION ALL
+          SELECT 'abbreviation:' || key || '=' || value
+          FROM style_abbreviations WHERE style_id = style_packages.id
+          ORDER BY part
+        )
+      ), ''))
+  WHERE id = OLD.style_id;
+END;
+
+COMMIT;
@@ -0,0 +1,143 @@
+BEGIN;
+
+-- Change feed: one global revision bumped by every write that can change a
+-- rendered citation, plus the latest revision per touched entity. Entities are
+-- coalesced, so the table stays as small as the set of things ever edited.
+CREATE TABLE IF NOT EXISTS change_feed (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  revision INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO change_feed (id, revision) VALUES (1, 0);
+
+CREATE TABLE IF NOT EXISTS change_entities (
+  kind TEXT NOT NULL,
+  key TEXT NOT NULL,
+  revision INTEGER NOT NULL,
+  PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_change_entities_revision ON change_entities(revision);
+-- Reverse lookups contributor -> source and style -> document for change events.
+CREATE INDEX IF NOT EXISTS idx_source_contributors_contributor ON source_contributors(contributor_id);
+CREATE INDEX IF NOT EXISTS idx_documents_active_style ON documents(active_style_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_sources_insert
+AFTER INSERT ON sources
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', NEW.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_sources_update
+AFTER UPDATE ON sources
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', NEW.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_sources_delete
+AFTER DELETE ON sources
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', OLD.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_contributors_update
+AFTER UPDATE ON contributors
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'contributor', NEW.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_contributors_delete
+AFTER DELETE ON contributors
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'contributor', OLD.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_source_contributors_insert
+AFTER INSERT ON source_contributors
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', NEW.source_id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_source_contributors_delete
+AFTER DELETE ON source_contributors
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', OLD.source_id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_citations_insert
+AFTER INSERT ON citations
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'citation', NEW.citation_uuid, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'document', NEW.doc_id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_citations_update
+AFTER UPDATE OF source_id, locator, note_type ON citations
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'citation', NEW.citation_uuid, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'document', NEW.doc_id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_citations_delete
+AFTER DELETE ON citations
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'citation', OLD.citation_uuid, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'document', OLD.doc_id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_documents_style_update
+AFTER UPDATE OF active_style_id ON documents
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'document', NEW.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+-- style_templates, style_rules and style_abbreviations changes reach this
+-- through the modification_counter triggers.
+CREATE TRIGGER IF NOT EXISTS trg_change_feed_style_packages_update
+AFTER UPDATE ON style_packages
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'style', NEW.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+COMMIT;
@@ -0,0 +1,39 @@
+BEGIN;
+
+-- Citations whose footnote was deleted in Word are tombstoned by reconcile
+-- rather than deleted, so an undo in Word can bring them back; the GC purges
+-- tombstones once they are old enough.
+ALTER TABLE citations ADD COLUMN deleted_at TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_citations_tombstones ON citations(deleted_at)
+WHERE deleted_at IS NOT NULL;
+
+-- Tombstoning and reviving change the document; purging a tombstone does not.
+DROP TRIGGER IF EXISTS trg_change_feed_citations_update;
+CREATE TRIGGER trg_change_feed_citations_update
+AFTER UPDATE OF source_id, locator, note_type, deleted_at ON citations
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'citation', NEW.citation_uuid, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'document', NEW.doc_id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+DROP TRIGGER IF EXISTS trg_change_feed_citations_delete;
+CREATE TRIGGER trg_change_feed_citations_delete
+AFTER DELETE ON citations
+WHEN OLD.deleted_at IS NULL
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'citation', OLD.citation_uuid, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'document', OLD.doc_id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+COMMIT;
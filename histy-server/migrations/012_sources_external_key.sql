@@ -0,0 +1,12 @@
+BEGIN;
+
+-- Citation keys from imported libraries (BibTeX keys, CSL ids, RIS IDs),
+-- namespaced by library as "<library>:<key>". Sources keep generated ids, so
+-- colliding keys from different libraries never overwrite each other, while
+-- re-importing the same library updates its sources in place.
+ALTER TABLE sources ADD COLUMN external_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sources_external_key ON sources(external_key)
+WHERE external_key IS NOT NULL;
+
+COMMIT;
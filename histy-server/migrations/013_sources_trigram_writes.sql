@@ -0,0 +1,13 @@
+BEGIN;
+
+-- sources_trigram text is folded in Python by the app's write paths
+-- (queries.index_source_trigrams). Triggers calling histy_fold made every
+-- source write fail on connections that never registered the function, such
+-- as the sqlite3 shell or a backup script. Only the pure-SQL delete trigger stays.
+DROP TRIGGER IF EXISTS trg_sources_trigram_insert;
+DROP TRIGGER IF EXISTS trg_sources_trigram_update;
+DROP TRIGGER IF EXISTS trg_sources_trigram_source_contributors_insert;
+DROP TRIGGER IF EXISTS trg_sources_trigram_source_contributors_delete;
+DROP TRIGGER IF EXISTS trg_sources_trigram_contributors_update;
+
+COMMIT;
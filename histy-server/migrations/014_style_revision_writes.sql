@@ -0,0 +1,81 @@
+BEGIN;
+
+-- style_packages.revision is computed once per save by
+-- queries.update_style_templates. The 009 triggers hashed the whole style on
+-- every changed row through histy_sha256, an app-registered function, so
+-- connections without it could not write style rows. Restore the plain
+-- modification_counter triggers from 008.
+
+DROP TRIGGER IF EXISTS trg_style_templates_insert_bump_style;
+CREATE TRIGGER trg_style_templates_insert_bump_style
+AFTER INSERT ON style_templates
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = NEW.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_templates_update_bump_style;
+CREATE TRIGGER trg_style_templates_update_bump_style
+AFTER UPDATE ON style_templates
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_style_templates_delete_bump_style;
+CREATE TRIGGER trg_style_templates_delete_bump_style
+AFTER DELETE ON style_templates
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = OLD.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_rules_insert_bump_style;
+CREATE TRIGGER trg_style_rules_insert_bump_style
+AFTER INSERT ON style_rules
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = NEW.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_rules_update_bump_style;
+CREATE TRIGGER trg_style_rules_update_bump_style
+AFTER UPDATE ON style_rules
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_style_rules_delete_bump_style;
+CREATE TRIGGER trg_style_rules_delete_bump_style
+AFTER DELETE ON style_rules
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = OLD.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_abbreviations_insert_bump_style;
+CREATE TRIGGER trg_style_abbreviations_insert_bump_style
+AFTER INSERT ON style_abbreviations
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = NEW.style_id;
+END;
+
+DROP TRIGGER IF EXISTS trg_style_abbreviations_update_bump_style;
+CREATE TRIGGER trg_style_abbreviations_update_bump_style
+AFTER UPDATE ON style_abbreviations
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id IN (OLD.style_id, NEW.style_id);
+END;
+
+DROP TRIGGER IF EXISTS trg_style_abbreviations_delete_bump_style;
+CREATE TRIGGER trg_style_abbreviations_delete_bump_style
+AFTER DELETE ON style_abbreviations
+BEGIN
+  UPDATE style_packages SET modification_counter = modification_counter + 1
+  WHERE id = OLD.style_id;
+END;
+
+COMMIT;
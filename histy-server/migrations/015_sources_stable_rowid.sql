@@ -0,0 +1,126 @@
+-- Rebuilds sources with an INTEGER PRIMARY KEY so the rowids the full-text
+-- tables join on are stable. Existing rowids are copied over unchanged, so the
+-- FTS rows stay valid. Foreign keys are off while the parent table is swapped;
+-- the citations and source_contributors references to sources(id) now resolve
+-- through the UNIQUE id column.
+PRAGMA foreign_keys = OFF;
+PRAGMA legacy_alter_table = ON;
+
+BEGIN;
+
+CREATE TABLE sources_new (
+  -- Alias for rowid: sources_fts and sources_trigram are keyed by it, and an
+  -- implicit rowid may be renumbered by VACUUM.
+  rid INTEGER PRIMARY KEY,
+  id TEXT NOT NULL UNIQUE,
+  type TEXT NOT NULL,
+  title TEXT NOT NULL,
+  short_title TEXT,
+  year TEXT,
+  place TEXT,
+  publisher TEXT,
+  container_title TEXT,
+  volume TEXT,
+  issue TEXT,
+  pages TEXT,
+  url TEXT,
+  accessed TEXT,
+  archive_name TEXT,
+  collection TEXT,
+  signature TEXT,
+  folio TEXT,
+  external_key TEXT
+);
+
+INSERT INTO sources_new (rid, id, type, title, short_title, year, place, publisher, container_title, volume, issue, pages, url, accessed, archive_name, collection, signature, folio, external_key)
+SELECT rowid, id, type, title, short_title, year, place, publisher, container_title, volume, issue, pages, url, accessed, archive_name, collection, signature, folio, external_key
+FROM sources;
+
+DROP TABLE sources;
+ALTER TABLE sources_new RENAME TO sources;
+
+CREATE INDEX idx_sources_title_id ON sources(title, id);
+CREATE UNIQUE INDEX idx_sources_external_key ON sources(external_key)
+WHERE external_key IS NOT NULL;
+
+CREATE TRIGGER trg_render_cache_sources_update
+AFTER UPDATE ON sources
+BEGIN
+  DELETE FROM render_cache WHERE source_id = OLD.id;
+END;
+
+CREATE TRIGGER trg_render_cache_sources_delete
+AFTER DELETE ON sources
+BEGIN
+  DELETE FROM render_cache WHERE source_id = OLD.id;
+END;
+
+CREATE TRIGGER trg_sources_fts_insert
+AFTER INSERT ON sources
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = NEW.rowid;
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = NEW.rowid;
+END;
+
+CREATE TRIGGER trg_sources_fts_update
+AFTER UPDATE ON sources
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = NEW.rowid;
+  INSERT INTO sources_fts (rowid, title, short_title, container_title, archive_name, collection, signature, contributors)
+  SELECT s.rowid, s.title, s.short_title, s.container_title, s.archive_name, s.collection, s.signature,
+         (SELECT group_concat(c.name, ' ')
+          FROM source_contributors sc JOIN contributors c ON c.id = sc.contributor_id
+          WHERE sc.source_id = s.id)
+  FROM sources s
+  WHERE s.rowid = NEW.rowid;
+END;
+
+CREATE TRIGGER trg_sources_fts_delete
+AFTER DELETE ON sources
+BEGIN
+  DELETE FROM sources_fts WHERE rowid = OLD.rowid;
+END;
+
+CREATE TRIGGER trg_sources_trigram_delete
+AFTER DELETE ON sources
+BEGIN
+  DELETE FROM sources_trigram WHERE rowid = OLD.rowid;
+END;
+
+CREATE TRIGGER trg_change_feed_sources_insert
+AFTER INSERT ON sources
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', NEW.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER trg_change_feed_sources_update
+AFTER UPDATE ON sources
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', NEW.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+CREATE TRIGGER trg_change_feed_sources_delete
+AFTER DELETE ON sources
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'source', OLD.id, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+COMMIT;
+
+PRAGMA legacy_alter_table = OFF;
+PRAGMA foreign_keys = ON;
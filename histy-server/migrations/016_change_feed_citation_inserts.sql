@@ -0,0 +1,27 @@
+BEGIN;
+
+-- An inserted citation can only change the variant (ibid, short) of the
+-- citations after it in doc_order, so mark those instead of the whole
+-- document. Appends, the common case, mark nothing but the new citation.
+-- They get their own kind: reconcile treats 'citation' entities newer than
+-- the pane's control list as inserted meanwhile and leaves them alone.
+-- Rows without a doc_order can't be placed and still mark the document.
+DROP TRIGGER IF EXISTS trg_change_feed_citations_insert;
+CREATE TRIGGER trg_change_feed_citations_insert
+AFTER INSERT ON citations
+BEGIN
+  UPDATE change_feed SET revision = revision + 1;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'citation', NEW.citation_uuid, revision FROM change_feed WHERE true
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'citation_variant', c.citation_uuid, f.revision
+  FROM citations c, change_feed f
+  WHERE c.doc_id = NEW.doc_id AND c.doc_order > NEW.doc_order AND c.deleted_at IS NULL
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+  INSERT INTO change_entities (kind, key, revision)
+  SELECT 'document', NEW.doc_id, revision FROM change_feed WHERE NEW.doc_order IS NULL
+  ON CONFLICT (kind, key) DO UPDATE SET revision = excluded.revision;
+END;
+
+COMMIT;
@@ -0,0 +1,9 @@
+BEGIN;
+
+-- The typeahead index asks for the latest source or contributor change on
+-- every lookup to notice writes from other processes (the CLI importer); with
+-- this index that is one seek per kind instead of a scan.
+CREATE INDEX IF NOT EXISTS idx_change_entities_kind_revision
+ON change_entities(kind, revision);
+
+COMMIT;
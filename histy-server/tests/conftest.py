@@ -1,35 +1,58 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 import sqlite3
+import tempfile
+
+# The app's startup hook migrates and opens HISTY_DB_PATH; keep it out of the
+# checked-out tree. Must be set before app modules read it at import time.
+os.environ["HISTY_DB_PATH"] = str(Path(tempfile.mkdtemp(prefix="histy-tests-")) / "histy.db")
 
 import pytest
 from fastapi.testclient import TestClient
 
 from app.db.migrations import apply_migrations, seed_db
-from app.db.connection import db_dependency
+from app.db.connection import ConnectionPool, db_dependency, pool_dependency, writer_dependency
+from app.db.sessions import document_sessions
+from app.db.writer import DirectWriter
 from app.main import app
+from app.render.prerender import prerender_queue
+from app.search.typeahead import suggest_index
+from app.styles.registry import style_registry
 
 
 @pytest.fixture
 def db_conn(tmp_path: Path) -> sqlite3.Connection:
     db_path = tmp_path / "test.db"
-    conn = sqlite3.connect(db_path)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON;")
     base_dir = Path(__file__).resolve().parents[1]
     apply_migrations(conn, base_dir / "migrations")
     seed_db(conn, base_dir / "seed")
+    style_registry.invalidate()
     yield conn
     conn.close()
 
 
 @pytest.fixture
-def client(db_conn: sqlite3.Connection) -> TestClient:
+def client(db_conn: sqlite3.Connection, tmp_path: Path, monkeypatch) -> TestClient:
     def override_db():
         yield db_conn
 
+    pool = ConnectionPool(str(tmp_path / "test.db"), size=2)
+
+    document_sessions.invalidate()
+    # Background pre-rendering shares db_conn with the request thread here, so
+    # it stays off unless a test turns it on and joins the queue.
+    monkeypatch.setattr(prerender_queue, "workers", 0)
     app.dependency_overrides[db_dependency] = override_db
+    app.dependency_overrides[writer_dependency] = lambda: DirectWriter(db_conn)
+    app.dependency_overrides[pool_dependency] = lambda: pool
     with TestClient(app) as test_client:
+        suggest_index.build(db_conn)
         yield test_client
     app.dependency_overrides.clear()
+    prerender_queue.close()
+    pool.close()
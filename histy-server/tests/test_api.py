@@ -1,5 +1,15 @@
 from __future__ import annotations
 
+import json
+import re
+
+from app.db.tombstones import TombstoneCollector
+from app.db.writer import DirectWriter
+from app.db import queries
+from app.render.cache import render_cache, style_digest
+from app.render import prerender
+from app.render.prerender import prerender_queue
+
 
 def test_api_health(client) -> None:
     response = client.get("/api/health")
@@ -13,3 +23,462 @@ def test_api_search(client) -> None:
     payload = response.json()
     assert payload["items"]
     assert payload["items"][0]["title"] == "Historia Regni"
+
+
+def test_api_render_citation_uses_document_prefix(client) -> None:
+    doc = client.post("/api/documents/upsert", json={"doc_fingerprint": "fp-prefix"}).json()
+    doc_id = doc["document"]["id"]
+    uuids = []
+    for locator in ["1", "1", "7"]:
+        created = client.post(
+            "/api/citations/create",
+            json={"doc_id": doc_id, "source_id": "source-001", "locator": locator},
+        ).json()
+        uuids.append(created["citation"]["citation_uuid"])
+
+    variants = [
+        client.post(
+            "/api/render/citation", json={"citation_uuid": uuid, "doc_id": doc_id}
+        ).json()["metadata"]["variant"]
+        for uuid in uuids
+    ]
+    assert variants == ["first", "ibid", "short"]
+
+    refreshed = client.post("/api/render/refresh", json={"doc_id": doc_id}).json()
+    assert [item["metadata"]["variant"] for item in refreshed["items"]] == variants
+
+
+def test_api_refresh_delta_returns_only_changed(client) -> None:
+    doc = client.post("/api/documents/upsert", json={"doc_fingerprint": "fp-delta"}).json()
+    doc_id = doc["document"]["id"]
+    uuids = []
+    for source_id in ["source-001", "source-002"]:
+        created = client.post(
+            "/api/citations/create",
+            json={"doc_id": doc_id, "source_id": source_id, "locator": "5"},
+        ).json()
+        uuids.append(created["citation"]["citation_uuid"])
+
+    full = client.post("/api/render/refresh", json={"doc_id": doc_id}).json()
+    hashes = {item["citation_uuid"]: item["metadata"]["render_hash"] for item in full["items"]}
+
+    cached = [{"citation_uuid": uuid, "cached_render_hash": hashes[uuid]} for uuid in uuids]
+    noop = client.post("/api/render/refresh", json={"doc_id": doc_id, "cached": cached}).json()
+    assert noop["items"] == []
+    assert noop["unchanged"] == 2
+
+    cached[1]["cached_render_hash"] = "stale"
+    delta = client.post("/api/render/refresh", json={"doc_id": doc_id, "cached": cached}).json()
+    assert [item["citation_uuid"] for item in delta["items"]] == [uuids[1]]
+
+
+def test_api_citation_batch_creates_and_renders(client) -> None:
+    doc = client.post("/api/documents/upsert", json={"doc_fingerprint": "fp-batch"}).json()
+    doc_id = doc["document"]["id"]
+    response = client.post(
+        "/api/citations/batch",
+        json={
+            "doc_id": doc_id,
+            "citations": [
+                {"source_id": "source-001", "locator": "4"},
+                {"source_id": "source-001", "locator": "4"},
+                {"source_id": "source-002"},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert [item["metadata"]["variant"] for item in items] == ["first", "ibid", "first"]
+    orders = [item["citation"]["doc_order"] for item in items]
+    assert orders == sorted(orders)
+
+    missing = client.post(
+        "/api/citations/batch",
+        json={"doc_id": doc_id, "citations": [{"source_id": "nope"}]},
+    )
+    assert missing.status_code == 404
+
+
+def test_api_document_session_skips_unchanged_writes(client, db_conn) -> None:
+    before = client.get("/api/stats").json()["document_sessions"]
+    payload = {"doc_fingerprint": "fp-session", "name": "Draft"}
+    first = client.post("/api/documents/upsert", json=payload).json()
+
+    statements: list[str] = []
+    db_conn.set_trace_callback(statements.append)
+    again = client.post("/api/documents/upsert", json=payload).json()
+    db_conn.set_trace_callback(None)
+    assert again == first
+    assert [sql for sql in statements if not sql.lstrip().startswith("SELECT")] == []
+
+    renamed = client.post("/api/documents/upsert", json={**payload, "name": "Final"}).json()
+    assert renamed["document"]["id"] == first["document"]["id"]
+    assert renamed["document"]["active_style_id"] == first["document"]["active_style_id"]
+    assert db_conn.execute(
+        "SELECT name FROM documents WHERE id = ?;", (first["document"]["id"],)
+    ).fetchone()[0] == "Final"
+
+    # Another process switching the style leaves the session entry stale; the
+    # next upsert still restores the requested style.
+    db_conn.execute(
+        "UPDATE documents SET active_style_id = 'style-kmz' WHERE id = ?;",
+        (first["document"]["id"],),
+    )
+    db_conn.commit()
+    restored = client.post(
+        "/api/documents/upsert",
+        json={**payload, "name": "Final", "active_style_id": first["document"]["active_style_id"]},
+    ).json()
+    assert restored["document"]["active_style_id"] == first["document"]["active_style_id"]
+    assert db_conn.execute(
+        "SELECT active_style_id FROM documents WHERE id = ?;", (first["document"]["id"],)
+    ).fetchone()[0] == first["document"]["active_style_id"]
+
+    after = client.get("/api/stats").json()["document_sessions"]
+    assert after["writes"] - before["writes"] == 3
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_api_suggest_completes_titles_and_surnames(client) -> None:
+    def suggest(q: str) -> dict:
+        return client.get("/api/sources/suggest", params={"q": q}).json()
+
+    assert suggest("histor")["complete"]
+    assert suggest("histor")["items"][0]["id"] == "source-001"
+    assert [(item["id"], item["kind"]) for item in suggest("Mey")["items"]] == [
+        ("source-001", "contributor")
+    ]
+
+    client.post(
+        "/api/sources/upsert",
+        json={
+            "id": "source-suggest",
+            "type": "monograph",
+            "title": "Sächsische Urkunden",
+            "contributors": [{"name": "Pröbstel, Karl", "role": "author"}],
+        },
+    )
+    # Written through this process, so the index stays complete and current.
+    assert suggest("sachs")["complete"]
+    assert [item["id"] for item in suggest("sachs")["items"]] == ["source-suggest"]
+    assert suggest("probst")["items"][0]["match"] == "Pröbstel"
+    # Titles also complete from a later word; contributors stay surname-prefix only.
+    assert [item["id"] for item in suggest("regni")["items"]] == ["source-001"]
+    assert [item["id"] for item in suggest("urkund")["items"]] == ["source-suggest"]
+    assert suggest("karl")["items"] == []
+
+
+def test_preview_lists_sources_by_title(client, db_conn) -> None:
+    page = client.get("/preview")
+    assert page.status_code == 200
+    select = page.text.split('id="source"', 1)[1].split("</select>", 1)[0]
+    options = re.findall(r'<option value="([^"]+)"', select)
+    expected = [row[0] for row in db_conn.execute("SELECT id FROM sources ORDER BY title, id;")]
+    assert options == expected
+
+
+def test_api_sources_keyset_pages_and_stream(client) -> None:
+    for idx in range(5):
+        client.post(
+            "/api/sources/upsert",
+            json={"id": f"page-{idx}", "type": "monograph", "title": "Paged Title"},
+        )
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/sources", params=params).json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    titles = client.get("/api/sources", params={"limit": 500}).json()["items"]
+    assert seen == [item["id"] for item in titles]
+    assert [i for i in seen if i.startswith("page-")] == [f"page-{idx}" for idx in range(5)]
+    assert client.get("/api/sources", params={"cursor": "!!"}).status_code == 400
+    assert client.get("/sources", params={"cursor": "!!"}).status_code == 400
+
+    response = client.get("/api/sources/stream")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    streamed = [json.loads(line)["id"] for line in response.text.splitlines()]
+    assert streamed == seen
+
+    filtered = client.get("/api/sources", params={"q": "paged", "limit": 3}).json()
+    assert [item["id"] for item in filtered["items"]] == ["page-0", "page-1", "page-2"]
+
+
+def test_style_template_saves_are_checked_and_versioned(client, db_conn) -> None:
+    style = client.get("/api/styles/style-gs").json()
+    revision = style["revision"]
+    assert revision
+
+    broken = client.post(
+        "/styles/style-gs/edit-templates",
+        data={"revision": revision, "tpl_footnote_first": "{{ title ", "tpl_footnote_short": "x"},
+        follow_redirects=False,
+    )
+    assert broken.status_code == 400
+    assert "Template error" in broken.text
+    assert client.get("/api/styles/style-gs").json()["revision"] == revision
+
+    saved = client.post(
+        "/styles/style-gs/edit-templates",
+        data={"revision": revision, "tpl_footnote_first": "{{ title }}."},
+        follow_redirects=False,
+    )
+    assert saved.status_code == 303
+    edited = client.get("/api/styles/style-gs").json()
+    assert edited["templates"]["footnote_first"] == "{{ title }}."
+    assert edited["revision"] != revision
+
+    stale = client.post(
+        "/styles/style-gs/edit-templates",
+        data={"revision": revision, "tpl_footnote_first": "{{ title }}!"},
+        follow_redirects=False,
+    )
+    assert stale.status_code == 409
+
+
+def test_api_rule_edits_invalidate_rendered_citations(client, db_conn) -> None:
+    doc = client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-rules", "active_style_id": "style-gs"}
+    ).json()
+    doc_id = doc["document"]["id"]
+    client.post(
+        "/api/citations/create",
+        json={"doc_id": doc_id, "source_id": "source-001", "locator": "4"},
+    )
+    before = client.post("/api/render/refresh", json={"doc_id": doc_id}).json()["items"][0]
+    digest = style_digest(queries.get_style(db_conn, "style-gs"))
+    counter = queries.render_state(db_conn, doc_id)["style_counter"]
+
+    db_conn.execute(
+        "UPDATE style_rules SET rules_json = ? WHERE style_id = 'style-gs';",
+        (json.dumps({"surname_smallcaps": True, "title_italic": True, "pages_prefix": "pp."}),),
+    )
+    db_conn.commit()
+    # Rule edits don't touch the stored revision; the digest and the render
+    # flight key must still move.
+    assert style_digest(queries.get_style(db_conn, "style-gs")) != digest
+    assert queries.render_state(db_conn, doc_id)["style_counter"] != counter
+
+    after = client.post("/api/render/refresh", json={"doc_id": doc_id}).json()["items"][0]
+    assert after["metadata"]["render_hash"] != before["metadata"]["render_hash"]
+    assert after["plain_text"] != before["plain_text"]
+
+
+def test_api_changes_reports_affected_citations(client) -> None:
+    doc = client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-changes", "active_style_id": "style-gs"}
+    ).json()
+    doc_id = doc["document"]["id"]
+    uuids = {}
+    for source_id in ["source-001", "source-002"]:
+        created = client.post(
+            "/api/citations/create",
+            json={"doc_id": doc_id, "source_id": source_id, "locator": "3"},
+        ).json()
+        uuids[source_id] = created["citation"]["citation_uuid"]
+
+    start = client.get("/api/changes").json()
+    assert start["revision"] > 0
+    assert start["citation_uuids"] == []
+    idle = client.get("/api/changes", params={"since": start["revision"], "timeout": 0}).json()
+    assert idle["revision"] == start["revision"]
+
+    client.post(
+        "/api/sources/upsert",
+        json={"id": "source-002", "type": "primary_classical", "title": "Res Gestae Divi Augusti"},
+    )
+    edited = client.get(
+        "/api/changes", params={"since": start["revision"], "doc_id": doc_id}
+    ).json()
+    assert edited["revision"] > start["revision"]
+    assert edited["doc_ids"] == [doc_id]
+    assert edited["citation_uuids"] == [uuids["source-002"]]
+
+    client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-changes", "active_style_id": "style-kmz"}
+    )
+    restyled = client.get("/api/changes", params={"since": edited["revision"]}).json()
+    assert sorted(restyled["citation_uuids"]) == sorted(uuids.values())
+    assert client.get("/api/stats").json()["change_feed"]["wakeups"] >= 2
+
+
+def test_api_style_switch_prerenders_document(client, monkeypatch) -> None:
+    doc = client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-prerender", "active_style_id": "style-gs"}
+    ).json()
+    doc_id = doc["document"]["id"]
+    for source_id in ["source-001", "source-002", "source-001"]:
+        client.post(
+            "/api/citations/create",
+            json={"doc_id": doc_id, "source_id": source_id, "locator": "9"},
+        )
+
+    monkeypatch.setattr(prerender_queue, "workers", 1)
+    before = prerender_queue.stats()
+    client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-prerender", "active_style_id": "style-kmz"}
+    )
+    client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-prerender", "active_style_id": "style-kmz"}
+    )
+    assert prerender_queue.join(timeout=10)
+    after = prerender_queue.stats()
+    assert after["completed"] - before["completed"] == 1
+    assert after["citations_rendered"] - before["citations_rendered"] == 3
+    assert after["failed"] == before["failed"]
+
+    misses = render_cache.stats()["misses"]
+    refreshed = client.post("/api/render/refresh", json={"doc_id": doc_id}).json()
+    assert len(refreshed["items"]) == 3
+    assert render_cache.stats()["misses"] == misses
+    assert "prerender_queue" in client.get("/api/stats").json()
+
+
+def test_api_prerender_failures_are_logged(client, monkeypatch, caplog) -> None:
+    payload = {"doc_fingerprint": "fp-prerender-fail", "active_style_id": "style-gs"}
+    doc_id = client.post("/api/documents/upsert", json=payload).json()["document"]["id"]
+
+    def fail(conn, writer, doc_id):
+        raise RuntimeError("render exploded")
+
+    monkeypatch.setattr(prerender, "prerender_document", fail)
+    monkeypatch.setattr(prerender_queue, "workers", 1)
+    failed = prerender_queue.stats()["failed"]
+    client.post("/api/documents/upsert", json={**payload, "active_style_id": "style-kmz"})
+    assert prerender_queue.join(timeout=10)
+    assert prerender_queue.stats()["failed"] - failed == 1
+    messages = [record.getMessage() for record in caplog.records if record.name == prerender.__name__]
+    assert messages == [f"prerender of document {doc_id} failed"]
+
+
+def test_api_validate_document_reports_set_based_issues(client, db_conn) -> None:
+    doc = client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-validate", "active_style_id": "style-gs"}
+    ).json()
+    doc_id = doc["document"]["id"]
+    client.post(
+        "/api/sources/upsert",
+        json={"id": "source-bare", "type": "literature", "title": "Bare"},
+    )
+    created = client.post(
+        "/api/citations/batch",
+        json={
+            "doc_id": doc_id,
+            "citations": [
+                {"source_id": "source-001", "locator": "1"},
+                {"source_id": "source-bare", "locator": "2"},
+                {"source_id": "source-001", "locator": "3"},
+            ],
+        },
+    ).json()
+    uuids = [item["citation"]["citation_uuid"] for item in created["items"]]
+    db_conn.execute(
+        "UPDATE citations SET doc_order = (SELECT doc_order FROM citations WHERE citation_uuid = ?) "
+        "WHERE citation_uuid = ?;",
+        (uuids[0], uuids[2]),
+    )
+    db_conn.execute("DELETE FROM style_templates WHERE style_id = 'style-gs' AND key = 'bibliography_entry';")
+    db_conn.commit()
+
+    issues = client.post(
+        "/api/validate/document",
+        json={"doc_id": doc_id, "citation_uuids": [uuids[0], uuids[1], "not-stored"]},
+    ).json()["issues"]
+    by_error: dict[str, list[dict]] = {}
+    for issue in issues:
+        by_error.setdefault(issue["error"], []).append(issue)
+
+    assert sorted(issue["citation_uuid"] for issue in by_error["duplicate_doc_order"]) == sorted(
+        [uuids[0], uuids[2]]
+    )
+    assert [issue["citation_uuid"] for issue in by_error["orphaned_citation"]] == [uuids[2]]
+    assert [issue["citation_uuid"] for issue in by_error["unknown_citation"]] == ["not-stored"]
+    assert {issue["template_key"] for issue in by_error["missing_template"]} == {"bibliography_entry"}
+    bare = [issue for issue in by_error["missing_fields"] if issue["source_id"] == "source-bare"]
+    assert bare and bare[0]["fields"] == ["contributors", "place", "year"]
+    assert "missing_source" not in by_error
+
+
+def test_api_reconcile_tombstones_revives_and_collects(client, db_conn) -> None:
+    doc = client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-reconcile", "active_style_id": "style-gs"}
+    ).json()
+    doc_id = doc["document"]["id"]
+    created = client.post(
+        "/api/citations/batch",
+        json={
+            "doc_id": doc_id,
+            "citations": [
+                {"source_id": "source-001", "locator": "1"},
+                {"source_id": "source-002", "locator": "2"},
+                {"source_id": "source-001", "locator": "3"},
+            ],
+        },
+    ).json()
+    uuids = [item["citation"]["citation_uuid"] for item in created["items"]]
+
+    def reconcile(live, prune=False):
+        return client.post(
+            "/api/citations/reconcile",
+            json={"doc_id": doc_id, "citation_uuids": live, "prune": prune},
+        ).json()["reconcile"]
+
+    assert reconcile([uuids[0], uuids[2]]) == {"tombstoned": 1, "deleted": 0, "revived": 0}
+    refreshed = client.post("/api/render/refresh", json={"doc_id": doc_id}).json()
+    assert [item["citation_uuid"] for item in refreshed["items"]] == [uuids[0], uuids[2]]
+    assert [item["metadata"]["variant"] for item in refreshed["items"]] == ["first", "short"]
+    bibliography = client.post("/api/render/bibliography", json={"doc_id": doc_id}).json()
+    assert [item["source_id"] for item in bibliography["items"]] == ["source-001"]
+    assert client.get("/api/stats").json()["citation_gc"]["tombstones"] == 1
+
+    assert reconcile(uuids) == {"tombstoned": 0, "deleted": 0, "revived": 1}
+    assert reconcile(uuids) == {"tombstoned": 0, "deleted": 0, "revived": 0}
+
+    reconcile([uuids[0]])
+    collector = TombstoneCollector(ttl=0, interval=0)
+    assert collector.collect(DirectWriter(db_conn)) == 2
+    assert collector.stats()["reclaimed"] == 2
+    assert reconcile([]) == {"tombstoned": 1, "deleted": 0, "revived": 0}
+    assert reconcile([], prune=True) == {"tombstoned": 0, "deleted": 1, "revived": 0}
+    assert db_conn.execute(
+        "SELECT COUNT(*) FROM citations WHERE doc_id = ?;", (doc_id,)
+    ).fetchone()[0] == 0
+
+
+def test_api_reconcile_spares_citations_newer_than_the_snapshot(client) -> None:
+    doc = client.post(
+        "/api/documents/upsert", json={"doc_fingerprint": "fp-race", "active_style_id": "style-gs"}
+    ).json()
+    doc_id = doc["document"]["id"]
+
+    def create() -> str:
+        created = client.post(
+            "/api/citations/batch",
+            json={"doc_id": doc_id, "citations": [{"source_id": "source-001"}]},
+        ).json()
+        return created["items"][0]["citation"]["citation_uuid"]
+
+    first = create()
+    # The pane reads the revision, then collects controls; meanwhile an insert
+    # (its own or another pane's) creates a citation the list cannot contain.
+    snapshot = client.get("/api/changes", params={"since": 0}).json()["revision"]
+    second = create()
+
+    def reconcile(**extra):
+        return client.post(
+            "/api/citations/reconcile",
+            json={"doc_id": doc_id, "citation_uuids": [first], **extra},
+        ).json()["reconcile"]
+
+    assert reconcile(revision=snapshot) == {"tombstoned": 0, "deleted": 0, "revived": 0}
+    assert reconcile(revision=snapshot, prune=True)["deleted"] == 0
+    refreshed = client.post("/api/render/refresh", json={"doc_id": doc_id}).json()
+    assert [item["citation_uuid"] for item in refreshed["items"]] == [first, second]
+
+    current = client.get("/api/changes", params={"since": 0}).json()["revision"]
+    assert reconcile(revision=current) == {"tombstoned": 1, "deleted": 0, "revived": 0}
@@ -1,6 +1,20 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import threading
+import time
+
+import pytest
+
 from app.db import queries
+from app.db.connection import ConnectionPool, get_connection, init_db
+from app.db.writer import DirectWriter, WriteQueue
+from app.db.names import contributor_key
+from app.db.sessions import DocumentSessions
+from app.render.cache import RenderCache, render_citations_cached
+from app.render.renderer import RenderOutput, render_citation
+from app.styles.registry import StyleRegistry
 
 
 def test_search_sources(db_conn) -> None:
@@ -9,6 +23,84 @@ def test_search_sources(db_conn) -> None:
     assert results[0]["title"] == "Historia Regni"
 
 
+def test_search_sources_matches_contributors_and_prefixes(db_conn) -> None:
+    by_author = queries.search_sources(db_conn, "meyer", 10)
+    assert [item["id"] for item in by_author] == ["source-001"]
+
+    by_prefix = queries.search_sources(db_conn, "Counc Min", 10)
+    assert [item["id"] for item in by_prefix] == ["source-003"]
+
+    queries.upsert_source(
+        db_conn,
+        {
+            "type": "monograph",
+            "title": "Sächsische Urkunden",
+            "contributors": [{"name": "Pröbstel, Karl", "role": "author"}],
+        },
+    )
+    folded = queries.search_sources(db_conn, "sachsische probstel", 10)
+    assert [item["title"] for item in folded] == ["Sächsische Urkunden"]
+
+
+def test_fuzzy_search_tolerates_typos_and_umlaut_variants(db_conn) -> None:
+    queries.upsert_source(
+        db_conn,
+        {
+            "id": "source-fuzzy",
+            "type": "edition",
+            "title": "Urkundenbuch der Stadt Sächsische Schweiz",
+            "contributors": [{"name": "Pröbstel, Karl", "role": "editor"}],
+        },
+    )
+
+    for q in ["Urkundenbch", "Saechsische", "Sachsische", "Probstel", "Proebstel"]:
+        results = queries.search_sources(db_conn, q, 5)
+        assert results and results[0]["id"] == "source-fuzzy", q
+        assert results[0]["contributors"][0]["name"] == "Pröbstel, Karl"
+
+    assert queries.search_sources(db_conn, "Historia", 5, fuzzy=True)[0]["id"] == "source-001"
+    assert queries.fuzzy_search_sources(db_conn, "qqxzz", 5) == []
+
+
+def test_source_writes_do_not_need_app_functions(db_conn, tmp_path) -> None:
+    # A connection that never registered the histy_* functions, like the sqlite3
+    # shell, can still write sources; the app re-folds them on its next upsert.
+    plain = sqlite3.connect(tmp_path / "test.db")
+    plain.execute(
+        "INSERT INTO sources (id, type, title) VALUES ('source-plain', 'monograph', 'Plain');"
+    )
+    plain.execute("UPDATE sources SET title = 'Plainer' WHERE id = 'source-plain';")
+    plain.execute(
+        "INSERT INTO source_contributors (source_id, contributor_id, role, position) "
+        "SELECT 'source-plain', contributor_id, 'author', 1 FROM source_contributors LIMIT 1;"
+    )
+    plain.commit()
+    plain.close()
+
+    source = queries.get_source(db_conn, "source-plain")
+    queries.upsert_source(db_conn, {**source, "title": "Plainest"})
+    assert queries.fuzzy_search_sources(db_conn, "Plainest", 5)[0]["id"] == "source-plain"
+
+
+def test_search_indexes_survive_vacuum(db_conn) -> None:
+    # The full-text tables are keyed by sources.rowid, which VACUUM may renumber
+    # unless it aliases an INTEGER PRIMARY KEY.
+    for idx, name in enumerate(["Alpha", "Beta", "Gamma"]):
+        queries.upsert_source(
+            db_conn, {"id": f"vacuum-{idx}", "type": "monograph", "title": f"Vacuum {name}"}
+        )
+    db_conn.execute("DELETE FROM sources WHERE id IN ('source-001', 'vacuum-0');")
+    db_conn.commit()
+    db_conn.execute("VACUUM;")
+    primary_key = [row["name"] for row in db_conn.execute("PRAGMA table_info(sources);") if row["pk"]]
+    assert primary_key == ["rid"]
+
+    found = queries.search_sources(db_conn, "Vacuum Gamma", 5)
+    assert [item["id"] for item in found] == ["vacuum-2"]
+    fuzzy = queries.fuzzy_search_sources(db_conn, "Vacum Gamma", 5)
+    assert fuzzy[0]["id"] == "vacuum-2"
+
+
 def test_upsert_source(db_conn) -> None:
     payload = {
         "type": "monograph",
@@ -22,3 +114,367 @@ def test_upsert_source(db_conn) -> None:
     assert fetched
     assert fetched["title"] == "Test Title"
     assert fetched["contributors"][0]["name"] == "Doe, Jane"
+
+
+def test_render_cache_invalidated_by_source_edits(db_conn) -> None:
+    style = queries.get_style(db_conn, "style-gs")
+    source = queries.get_source(db_conn, "source-001")
+    citation = {"citation_uuid": "c1", "source_id": "source-001", "locator": "3"}
+
+    first = render_citations_cached(db_conn, style, [(citation, source, "first")])
+    cached_rows = db_conn.execute("SELECT COUNT(1) FROM render_cache;").fetchone()[0]
+    assert cached_rows == 1
+
+    again = render_citations_cached(db_conn, style, [(citation, source, "first")])
+    assert again[0].metadata == first[0].metadata
+
+    queries.upsert_source(db_conn, {**source, "title": "Historia Regni Nova"})
+    cached_rows = db_conn.execute("SELECT COUNT(1) FROM render_cache;").fetchone()[0]
+    assert cached_rows == 0
+
+
+def test_render_cache_counts_rows_only_when_it_may_overflow(db_conn) -> None:
+    cache = RenderCache(max_rows=200)
+    output = RenderOutput("x", [], {"template_key": "t", "variant": "first", "render_hash": "h"})
+
+    counted: list[str] = []
+    db_conn.set_trace_callback(lambda sql: counted.append(sql) if "COUNT(1)" in sql else None)
+    for batch in range(60):
+        cache.put_many(
+            db_conn,
+            {f"key-{batch}-{idx}": ("source-001", "style-gs", output) for idx in range(5)},
+        )
+    db_conn.set_trace_callback(None)
+
+    rows = db_conn.execute("SELECT COUNT(1) FROM render_cache;").fetchone()[0]
+    assert rows <= cache.max_rows
+    assert cache.stats()["evictions"] == 300 - rows
+    # Once on the first put and when the cache fills up, then once per `slack`
+    # (10) rows written instead of on each of the 60 puts.
+    assert len(counted) == cache.stats()["counts"] <= 10
+
+
+def test_connection_pool_reuses_configured_connections(tmp_path) -> None:
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2)
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA foreign_keys;").fetchone()[0] == 1
+    pool.release(conn)
+
+    assert pool.acquire() is conn
+    other = pool.acquire()
+    assert other is not conn
+    stats = pool.stats()
+    assert stats["opened"] == 2
+    assert stats["checkouts"] == 3
+    pool.release(conn)
+    pool.release(other)
+    pool.close()
+    assert pool.stats()["opened"] == 0
+
+
+def test_write_queue_groups_commits_and_isolates_failures(tmp_path) -> None:
+    db_path = str(tmp_path / "writer.db")
+    init_db(db_path)
+    writer = WriteQueue(lambda: get_connection(db_path), max_batch_delay=0.05)
+
+    def write(idx: int) -> dict:
+        payload = {"id": f"queued-{idx}", "type": "monograph", "title": f"Queued {idx}"}
+        return writer.run(lambda conn: queries.upsert_source(conn, payload))
+
+    def fail(conn) -> None:
+        conn.execute("INSERT INTO sources (id, type, title) VALUES ('broken', 'monograph', 'x');")
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(write, range(16)))
+        with pytest.raises(ValueError):
+            writer.run(fail)
+    writer.close()
+
+    assert [source["id"] for source in results] == [f"queued-{idx}" for idx in range(16)]
+    stats = writer.stats()
+    assert stats["ops"] == 17
+    assert stats["errors"] == 1
+    assert stats["batches"] < stats["ops"]
+
+    conn = get_connection(db_path)
+    ids = {
+        row[0]
+        for row in conn.execute("SELECT id FROM sources WHERE id LIKE 'queued-%' OR id = 'broken';")
+    }
+    conn.close()
+    assert ids == {f"queued-{idx}" for idx in range(16)}
+
+
+def test_concurrent_citation_batches_see_their_own_prefix(tmp_path) -> None:
+    db_path = str(tmp_path / "batches.db")
+    init_db(db_path)
+    conn = get_connection(db_path)
+    doc_id = queries.upsert_document(conn, {"doc_fingerprint": "fp-batches"})["id"]
+    conn.commit()
+    writer = WriteQueue(lambda: get_connection(db_path), max_batch_delay=0.05)
+
+    def append(idx: int) -> tuple:
+        items = [{"source_id": f"source-00{idx % 2 + 1}", "locator": str(idx)}]
+        return writer.run(lambda write_conn: queries.append_citations(write_conn, doc_id, items))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(append, range(12)))
+    writer.close()
+
+    for prefix, citations in results:
+        expected = queries.citation_prefix_state(conn, doc_id, citations[0]["doc_order"])
+        assert prefix == expected
+    conn.close()
+
+
+def test_write_queue_survives_ops_that_end_the_transaction(tmp_path) -> None:
+    db_path = str(tmp_path / "rogue.db")
+    init_db(db_path)
+    writer = WriteQueue(lambda: get_connection(db_path), max_batch_delay=0)
+
+    def insert(source_id: str):
+        return lambda conn: queries.upsert_source(
+            conn, {"id": source_id, "type": "monograph", "title": source_id}
+        )
+
+    def commits(conn) -> str:
+        insert("committed")(conn)
+        conn.commit()
+        return "ok"
+
+    def drops_savepoint(conn) -> None:
+        insert("dropped")(conn)
+        conn.execute("RELEASE write_op;")
+
+    def closes(conn) -> None:
+        conn.close()
+
+    assert writer.run(commits, timeout=5) == "ok"
+    with pytest.raises(sqlite3.OperationalError):
+        writer.run(drops_savepoint, timeout=5)
+    with pytest.raises(sqlite3.ProgrammingError):
+        writer.run(closes, timeout=5)
+    assert writer.run(insert("after"), timeout=5)["id"] == "after"
+    stats = writer.stats()
+    writer.close()
+
+    assert stats["reconnects"] == 1
+    conn = get_connection(db_path)
+    ids = {
+        row[0]
+        for row in conn.execute("SELECT id FROM sources WHERE id IN ('committed', 'dropped', 'after');")
+    }
+    conn.close()
+    assert ids == {"committed", "after"}
+
+
+def test_write_queue_runs_background_writes_after_interactive_ones(tmp_path) -> None:
+    db_path = str(tmp_path / "lanes.db")
+    init_db(db_path)
+    writer = WriteQueue(lambda: get_connection(db_path), max_batch_delay=0.01)
+    started = threading.Event()
+    release = threading.Event()
+    order: list[str] = []
+
+    def record(name: str):
+        def fn(conn) -> None:
+            if name == "blocker":
+                started.set()
+                release.wait(5)
+            order.append(name)
+
+        return fn
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        # Holds the writer thread so the remaining writes queue up behind it.
+        blocker = pool.submit(writer.run, record("blocker"))
+        started.wait(5)
+        background = [
+            pool.submit(writer.run, record(f"background-{idx}"), background=True) for idx in range(3)
+        ]
+        interactive = pool.submit(writer.run, record("interactive"))
+        while writer.stats()["queued"] < 4:
+            time.sleep(0.001)
+        release.set()
+        for future in [blocker, *background, interactive]:
+            future.result()
+    writer.close()
+
+    assert order == ["blocker", "interactive", "background-0", "background-1", "background-2"]
+    assert writer.stats()["background_ops"] == 3
+
+
+def test_source_loaders_use_constant_query_count(db_conn) -> None:
+    statements: list[str] = []
+    db_conn.set_trace_callback(statements.append)
+    sources = queries.get_sources(db_conn, ["source-001", "source-002", "source-003", "missing"])
+    db_conn.set_trace_callback(None)
+
+    assert sorted(sources) == ["source-001", "source-002", "source-003"]
+    assert sources["source-002"]["contributors"][0]["name"] == "Augustus"
+    assert len(statements) == 2
+
+
+def test_load_document_bundle(db_conn) -> None:
+    doc = queries.upsert_document(db_conn, {"doc_fingerprint": "fp-bundle"})
+    for source_id in ["source-002", "source-001", "source-002"]:
+        queries.create_citation(db_conn, {"doc_id": doc["id"], "source_id": source_id})
+
+    statements: list[str] = []
+    db_conn.set_trace_callback(statements.append)
+    bundle = queries.load_document_bundle(db_conn, doc["id"])
+    db_conn.set_trace_callback(None)
+
+    assert bundle.style["templates"]["footnote_first"]
+    assert len(bundle.citations) == 3
+    assert [source["id"] for source in bundle.cited_sources()] == ["source-002", "source-001"]
+    assert len(statements) == 5
+    assert queries.load_document_bundle(db_conn, "missing") is None
+
+
+def test_reorder_citations_touches_only_moved_rows(db_conn) -> None:
+    doc = queries.upsert_document(db_conn, {"doc_fingerprint": "fp-order"})
+    uuids = [
+        queries.create_citation(db_conn, {"doc_id": doc["id"], "source_id": "source-001"})[
+            "citation_uuid"
+        ]
+        for _ in range(5)
+    ]
+
+    statements: list[str] = []
+    db_conn.set_trace_callback(statements.append)
+    unchanged = queries.list_citations_for_doc(db_conn, doc["id"], uuids)
+    db_conn.set_trace_callback(None)
+    assert [c["citation_uuid"] for c in unchanged] == uuids
+    assert not [sql for sql in statements if sql.startswith("UPDATE")]
+
+    moved = [uuids[0], uuids[4], uuids[1], uuids[2], uuids[3]]
+    statements.clear()
+    db_conn.set_trace_callback(statements.append)
+    queries.list_citations_for_doc(db_conn, doc["id"], moved)
+    db_conn.set_trace_callback(None)
+    assert len([sql for sql in statements if sql.startswith("UPDATE")]) == 1
+
+    stored = queries.list_citations_for_doc(db_conn, doc["id"])
+    assert [c["citation_uuid"] for c in stored] == moved
+
+
+def test_change_feed_marks_only_citations_after_an_insert(db_conn) -> None:
+    doc_id = queries.upsert_document(db_conn, {"doc_fingerprint": "fp-feed"})["id"]
+    citations = [
+        queries.create_citation(db_conn, {"doc_id": doc_id, "source_id": "source-001"})
+        for _ in range(4)
+    ]
+    uuids = [c["citation_uuid"] for c in citations]
+
+    since = queries.current_change_revision(db_conn)
+    db_conn.execute(
+        "INSERT INTO citations (citation_uuid, doc_id, source_id, created_at, doc_order) "
+        "VALUES ('inserted', ?, 'source-002', datetime('now'), ?);",
+        (doc_id, citations[1]["doc_order"] + 1),
+    )
+    changed = queries.changes_since(db_conn, since)
+    assert sorted(changed["citation_uuids"]) == sorted(["inserted", uuids[2], uuids[3]])
+
+    since = queries.current_change_revision(db_conn)
+    queries.reconcile_citations(db_conn, doc_id, uuids)
+    assert sorted(queries.changes_since(db_conn, since)["citation_uuids"]) == sorted(uuids)
+    queries.reconcile_citations(db_conn, doc_id, [])
+    emptied = queries.changes_since(db_conn, since)
+    assert emptied["citation_uuids"] == []
+    assert emptied["doc_ids"] == [doc_id]
+
+
+def test_contributor_keys_dedupe_name_variants(db_conn) -> None:
+    assert contributor_key("Meyer, Anna", False) == contributor_key("Anna  MEYER", False)
+    assert contributor_key("Pröbstel, Karl", False) == contributor_key("Probstel, Karl", False)
+    assert contributor_key("Town Archive", True) != contributor_key("Town Archive", False)
+
+    source = queries.upsert_source(
+        db_conn,
+        {
+            "type": "monograph",
+            "title": "Variants",
+            "contributors": [
+                {"name": "Anna Meyer", "role": "author"},
+                {"name": "Neu, Nina", "role": "editor"},
+            ],
+        },
+    )
+    assert source["contributors"][0]["id"] == "contrib-001"
+
+    resolved, created = queries.resolve_contributors(db_conn, [("NEU, Nina", False)])
+    assert created == 0
+    assert list(resolved.values()) == [source["contributors"][1]["id"]]
+
+
+def test_style_registry_reloads_only_after_style_edits(db_conn) -> None:
+    registry = StyleRegistry()
+    style = registry.get(db_conn, "style-gs")
+    assert "footnote_first" in style["compiled"]
+
+    statements: list[str] = []
+    db_conn.set_trace_callback(statements.append)
+    assert registry.get(db_conn, "style-gs") is style
+    db_conn.set_trace_callback(None)
+    assert len(statements) == 1
+
+    queries.update_style_templates(db_conn, "style-gs", {"footnote_first": "{{ title }}!"})
+    edited = registry.get(db_conn, "style-gs")
+    assert edited is not style
+    assert edited["modification_counter"] > style["modification_counter"]
+    assert registry.stats() == {"styles": 1, "hits": 1, "loads": 2}
+
+    source = queries.get_source(db_conn, "source-001")
+    citation = {"citation_uuid": "c1", "source_id": "source-001", "locator": None}
+    output = render_citation(citation, source, source["contributors"], edited, variant="first")
+    assert output.plain_text == "Historia Regni!"
+    assert registry.get(db_conn, "missing-style") is None
+
+
+def test_style_revision_is_hashed_once_per_save(db_conn, tmp_path) -> None:
+    revision = queries.get_style(db_conn, "style-gs")["revision"]
+    assert revision == queries.style_revision(db_conn, "style-gs")
+
+    statements: list[str] = []
+    db_conn.set_trace_callback(statements.append)
+    saved = queries.update_style_templates(
+        db_conn, "style-gs", {"footnote_first": "{{ title }}!", "footnote_short": "{{ title }}"}
+    )
+    unchanged = queries.update_style_templates(db_conn, "style-gs", {"footnote_first": "{{ title }}!"})
+    db_conn.set_trace_callback(None)
+    db_conn.commit()
+
+    assert saved == unchanged == queries.style_revision(db_conn, "style-gs") != revision
+    assert sum("'template:'" in statement for statement in statements) == 1
+
+    # Style rows stay writable from connections without the app's SQL functions.
+    plain = sqlite3.connect(tmp_path / "test.db")
+    plain.execute("UPDATE style_templates SET markdown = 'x' WHERE style_id = 'style-gs';")
+    plain.commit()
+    plain.close()
+
+
+def test_document_sessions_are_bounded_and_dropped_on_write(db_conn) -> None:
+    sessions = DocumentSessions(max_documents=2)
+    writer = DirectWriter(db_conn)
+    for fingerprint in ["fp-a", "fp-b", "fp-a", "fp-c"]:
+        sessions.resolve(db_conn, writer, {"doc_fingerprint": fingerprint})
+    stats = sessions.stats()
+    assert (stats["documents"], stats["evictions"], stats["hits"]) == (2, 1, 1)
+
+    # fp-b was least recently used; it is read back, not recreated.
+    sessions.resolve(db_conn, writer, {"doc_fingerprint": "fp-b"})
+    assert sessions.stats()["loads"] == 1
+
+    class FailingWriter:
+        def run(self, fn):
+            fn(db_conn)
+            db_conn.rollback()
+            raise RuntimeError("write failed")
+
+    with pytest.raises(RuntimeError):
+        sessions.resolve(db_conn, FailingWriter(), {"doc_fingerprint": "fp-b", "name": "Renamed"})
+    assert sessions.stats()["documents"] == 1
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import io
+
+from app.db import queries
+from app.db.connection import get_connection
+from app.db.writer import WriteQueue
+from app.importer.__main__ import main
+from app.importer.parsers import parse_bibtex, parse_csl_json, parse_ris
+from app.importer.pipeline import import_sources
+from app.search.typeahead import suggest_index
+
+BIBTEX = r"""
+@string{leip = "Leipzig"}
+@book{probst1902,
+  author = {Pr{\"o}bstel, Karl and {Sächsisches Hauptstaatsarchiv}},
+  title = {Urkundenbuch der Stadt {Meißen}},
+  address = leip # " und Dresden",
+  year = 1902,
+  pages = {12--14},
+}
+@comment{ignored}
+@article{schmidt2010, author = "Schmidt, Eva", title = "Ein Aufsatz",
+  journal = {Zeitschrift}, volume = {3}}
+"""
+
+CSL_JSON = """[
+  {"id": "csl-1", "type": "book", "title": "Res Gestae Divi Augusti",
+   "author": [{"family": "Augustus"}], "issued": {"date-parts": [[14]]}},
+  {"id": "csl-2", "type": "manuscript", "title": "Ratsprotokolle",
+   "author": [{"literal": "Stadtarchiv Bremen"}], "archive": "Stadtarchiv"}
+]"""
+
+RIS = """TY  - JOUR
+ID  - ris-1
+TI  - Sächsische Klöster
+AU  - Meyer, Anna
+JO  - Archiv für Diplomatik
+PY  - 1999/01/01
+SP  - 5
+EP  - 9
+ER  -
+"""
+
+
+def test_parse_bibtex_entries() -> None:
+    records = list(parse_bibtex(io.StringIO(BIBTEX)))
+    assert [r["key"] for r in records] == ["probst1902", "schmidt2010"]
+    book = records[0]
+    assert book["title"] == "Urkundenbuch der Stadt Meißen"
+    assert book["place"] == "Leipzig und Dresden"
+    assert book["pages"] == "12–14"
+    assert book["contributors"] == [
+        {"name": "Pröbstel, Karl", "role": "author", "is_corporate": False},
+        {"name": "Sächsisches Hauptstaatsarchiv", "role": "author", "is_corporate": True},
+    ]
+    assert records[1]["container_title"] == "Zeitschrift"
+
+
+def test_parse_csl_json_and_ris_in_small_chunks(monkeypatch) -> None:
+    monkeypatch.setattr("app.importer.parsers.CHUNK_SIZE", 7)
+    csl = list(parse_csl_json(io.StringIO(CSL_JSON)))
+    assert [r["key"] for r in csl] == ["csl-1", "csl-2"]
+    assert csl[0]["year"] == "14"
+    assert csl[1]["type"] == "archive"
+    assert csl[1]["contributors"][0]["is_corporate"] is True
+
+    ris = list(parse_ris(io.StringIO(RIS)))
+    assert ris[0]["type"] == "article"
+    assert ris[0]["pages"] == "5–9"
+    assert ris[0]["year"] == "1999"
+
+
+def test_import_sources_batches_and_reuses_contributors(db_conn) -> None:
+    records = list(parse_bibtex(io.StringIO(BIBTEX))) + list(parse_ris(io.StringIO(RIS)))
+    progress = []
+    stats = import_sources(db_conn, records, batch_size=2, progress=progress.append)
+    assert stats.written == 3
+    assert stats.batches == 2
+    assert stats.contributors_created == 3
+    assert progress
+
+    ris_id = queries.source_ids_for_external_keys(db_conn, ["import:ris-1"])["import:ris-1"]
+    imported = queries.get_source(db_conn, ris_id)
+    assert imported["contributors"][0]["id"] == "contrib-001"
+    assert queries.search_sources(db_conn, "urkundenbuch", 5)[0]["title"] == (
+        "Urkundenbuch der Stadt Meißen"
+    )
+
+
+def test_import_keys_are_namespaced_per_library(db_conn) -> None:
+    records = list(parse_ris(io.StringIO(RIS)))
+    import_sources(db_conn, records, library="a.ris")
+    import_sources(db_conn, records, library="a.ris")
+    import_sources(db_conn, [{**records[0], "title": "Andere Klöster"}], library="b.ris")
+    ids = queries.source_ids_for_external_keys(db_conn, ["a.ris:ris-1", "b.ris:ris-1"])
+    assert len(set(ids.values())) == 2
+    assert queries.get_source(db_conn, ids["a.ris:ris-1"])["title"] == "Sächsische Klöster"
+    assert queries.get_source(db_conn, ids["b.ris:ris-1"])["title"] == "Andere Klöster"
+    assert queries.get_source(db_conn, "ris-1") is None
+
+
+def test_import_sources_writes_batches_through_writer(db_conn, tmp_path) -> None:
+    writer = WriteQueue(lambda: get_connection(str(tmp_path / "test.db")))
+    records = list(parse_bibtex(io.StringIO(BIBTEX))) + list(parse_ris(io.StringIO(RIS)))
+    try:
+        stats = import_sources(db_conn, records, batch_size=2, writer=writer)
+    finally:
+        writer.close()
+    assert stats.written == 3
+    assert writer.stats()["ops"] == 2
+    assert not db_conn.in_transaction
+    assert len(queries.source_ids_for_external_keys(db_conn, ["import:ris-1"])) == 1
+
+
+def test_api_import_upload(client) -> None:
+    response = client.post(
+        "/api/sources/import",
+        files={"file": ("library.ris", RIS.encode("utf-8"), "application/x-research-info-systems")},
+    )
+    assert response.status_code == 200
+    assert response.json()["import"]["written"] == 1
+
+    unknown = client.post("/api/sources/import", files={"file": ("x.txt", b"", "text/plain")})
+    assert unknown.status_code == 400
+
+    broken = client.post(
+        "/api/sources/import",
+        files={"file": ("broken.json", CSL_JSON[:-40].encode("utf-8"), "application/json")},
+    )
+    assert broken.status_code == 400
+    detail = broken.json()["detail"]
+    assert detail["error"] == "import_parse_error"
+    assert detail["import"]["written"] == 1
+    assert detail["import"]["error"]
+
+
+def test_cli_import_reaches_the_suggest_index(client, tmp_path) -> None:
+    def suggest(q: str) -> dict:
+        return client.get("/api/sources/suggest", params={"q": q}).json()
+
+    assert suggest("histor")["complete"]
+    stale = suggest_index.stats()["stale"]
+    library = tmp_path / "library.ris"
+    library.write_text(RIS, encoding="utf-8")
+    # A separate process in production; the server only sees the new rows.
+    assert main([str(library), "--db", str(tmp_path / "test.db")]) == 0
+
+    assert not suggest("klost")["complete"]
+    suggest_index.join(timeout=10)
+    rebuilt = suggest("klost")
+    assert rebuilt["complete"]
+    assert [item["match"] for item in rebuilt["items"]] == ["Sächsische Klöster"]
+    assert suggest_index.stats()["stale"] - stale == 1
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from app.render.renderer import render_citation
+import threading
+
+import pytest
+
+from app.render.renderer import ContextCache, TemplateCache, VariantTracker, render_citation
+from app.render.singleflight import SingleFlight
 
 
 def test_variant_selection() -> None:
@@ -49,3 +54,130 @@ def test_template_substitution_and_runs() -> None:
     assert "Historia Regni" in output.plain_text
     assert any(run.get("italic") for run in output.runs)
     assert any(run.get("small_caps") for run in output.runs)
+
+
+def test_template_cache_reuses_compiled_templates() -> None:
+    cache = TemplateCache(max_size=2)
+    style = {"id": "style-gs", "version": "1.0"}
+
+    first = cache.get(style, "footnote_first", "{{ title }}")
+    again = cache.get(style, "footnote_first", "{{ title }}")
+    assert first is again
+    assert cache.stats()["hits"] == 1
+
+    edited = cache.get(style, "footnote_first", "{{ title }}.")
+    assert edited is not first
+
+    cache.get(style, "footnote_short", "{{ short_title }}")
+    assert cache.stats()["size"] == 2
+
+    cache.invalidate("style-gs")
+    assert cache.stats()["size"] == 0
+
+
+def test_variant_tracker_single_pass() -> None:
+    stream = [
+        {"source_id": "s1", "locator": "1"},
+        {"source_id": "s1", "locator": "1"},
+        {"source_id": "s2", "locator": None},
+        {"source_id": "s1", "locator": "4"},
+        {"source_id": "s1", "locator": "5"},
+    ]
+    tracker = VariantTracker()
+    variants = [tracker.advance(citation) for citation in stream]
+    assert variants == ["first", "ibid", "first", "short", "short"]
+
+    resumed = VariantTracker(seen_sources={"s1"}, last=("s1", "5"))
+    assert resumed.select({"source_id": "s1", "locator": "5"}) == "ibid"
+    assert resumed.select({"source_id": "s3", "locator": "5"}) == "first"
+
+
+def test_context_cache_reuses_base_context_per_source_revision() -> None:
+    cache = ContextCache(max_size=2)
+    rules = {"surname_smallcaps": True, "pages_prefix": "S."}
+    source = {"id": "s1", "title": "Chronik", "year": "1890"}
+    people = [{"name": "Meyer, Anna", "role": "author"}]
+
+    base = cache.get(source, people, rules)
+    assert base["author_sc"] == "<sc>Meyer</sc>, Anna"
+    assert base["locator_prefix"] == "S. "
+    for _ in range(5):
+        assert cache.get(dict(source), [dict(people[0])], dict(rules)) is base
+
+    renamed = cache.get(source, [{"name": "Anna Schulz", "role": "author"}], rules)
+    assert renamed["author_surname"] == "Schulz"
+    assert cache.get({**source, "year": "1891"}, people, rules)["year"] == "1891"
+    plain = cache.get(source, people, {**rules, "surname_smallcaps": False})
+    assert plain["author_sc"] == "Meyer, Anna"
+    assert cache.stats() == {"size": 2, "max_size": 2, "hits": 5, "misses": 4}
+
+
+def test_single_flight_shares_one_computation() -> None:
+    flights = SingleFlight(timeout=5)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def render():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return ["rendered"]
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("k", render)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(flights.do("k", render))) for _ in range(3)
+    ]
+    for thread in followers:
+        thread.start()
+    while flights.stats()["coalesced"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [["rendered"]] * 4
+    stats = flights.stats()
+    assert stats["leaders"] == 1 and stats["coalesced"] == 3 and stats["in_flight"] == 0
+
+    assert flights.do("k", lambda: "again") == "again"
+
+
+def test_single_flight_propagates_errors_and_times_out() -> None:
+    flights = SingleFlight(timeout=0.05)
+    release = threading.Event()
+    started = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flights.do("k", failing)
+        except ValueError as exc:
+            errors.append(str(exc))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    with pytest.raises(TimeoutError):
+        flights.do("k", failing)
+    flights.timeout = 5
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flights.stats()["coalesced"] < 2:
+        threading.Event().wait(0.01)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert errors == ["boom", "boom"]
+    assert flights.stats()["errors"] == 1
+    assert flights.stats()["timeouts"] == 1
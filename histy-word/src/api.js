@@ -33,6 +33,19 @@
     });
   }
 
+  async function suggestSources(q, limit) {
+    const params = new URLSearchParams({ q: q, limit: String(limit || 10) });
+    return request("/api/sources/suggest?" + params.toString(), { method: "GET" });
+  }
+
+  async function getChanges(since, docId, timeout) {
+    const params = new URLSearchParams({ since: String(since || 0), timeout: String(timeout || 25) });
+    if (docId) {
+      params.set("doc_id", docId);
+    }
+    return request("/api/changes?" + params.toString(), { method: "GET" });
+  }
+
   async function upsertDocument(payload) {
     return request("/api/documents/upsert", {
       method: "POST",
@@ -49,6 +62,22 @@
     });
   }
 
+  async function createCitations(payload) {
+    return request("/api/citations/batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload),
+    });
+  }
+
+  async function reconcileCitations(payload) {
+    return request("/api/citations/reconcile", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload),
+    });
+  }
+
   async function renderCitation(payload) {
     return request("/api/render/citation", {
       method: "POST",
@@ -86,8 +115,12 @@
     setBaseUrl: setBaseUrl,
     health: health,
     searchSources: searchSources,
+    suggestSources: suggestSources,
+    getChanges: getChanges,
     upsertDocument: upsertDocument,
     createCitation: createCitation,
+    createCitations: createCitations,
+    reconcileCitations: reconcileCitations,
     renderCitation: renderCitation,
     renderRefresh: renderRefresh,
     renderBibliography: renderBibliography,
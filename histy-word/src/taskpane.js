@@ -48,6 +48,30 @@
     });
   }
 
+  let documentSession = null;
+
+  async function resolveDocument() {
+    const docInfo = await ensureDocument();
+    if (
+      documentSession &&
+      documentSession.fingerprint === docInfo.fingerprint &&
+      documentSession.name === docInfo.name
+    ) {
+      return documentSession.document;
+    }
+
+    const docResponse = await window.histyApi.upsertDocument({
+      doc_fingerprint: docInfo.fingerprint,
+      name: docInfo.name,
+    });
+    documentSession = {
+      fingerprint: docInfo.fingerprint,
+      name: docInfo.name,
+      document: docResponse.document,
+    };
+    return docResponse.document;
+  }
+
   async function insertRunsIntoControl(control, runs, fallbackText) {
     control.insertText("", Word.InsertLocation.replace);
 
@@ -72,26 +96,40 @@
     });
   }
 
-  async function insertCitation(sourceId, locator) {
-    const docInfo = await ensureDocument();
-    const docResponse = await window.histyApi.upsertDocument({
-      doc_fingerprint: docInfo.fingerprint,
-      name: docInfo.name,
-    });
+  // Inserts and refreshes touch the same content controls and the same stored
+  // citations, so they run one at a time: a refresh that collected controls
+  // while a footnote was still being inserted would report it as deleted.
+  let documentTask = Promise.resolve();
 
-    const doc = docResponse.document;
-    const citationResponse = await window.histyApi.createCitation({
-      doc_id: doc.id,
-      source_id: sourceId,
-      locator: locator || null,
-    });
+  function serialized(task) {
+    const run = documentTask.then(task, task);
+    documentTask = run.catch(() => {});
+    return run;
+  }
 
-    const citationUuid = citationResponse.citation.citation_uuid;
-    const renderResponse = await window.histyApi.renderCitation({
-      citation_uuid: citationUuid,
+  // Citations this pane created, so the change feed wakeups they cause do not
+  // trigger a refresh of their own.
+  const ownCitations = new Set();
+
+  function insertCitation(sourceId, locator) {
+    return serialized(() => insertCitationNow(sourceId, locator));
+  }
+
+  function refreshAll() {
+    return serialized(refreshAllNow);
+  }
+
+  async function insertCitationNow(sourceId, locator) {
+    const doc = await resolveDocument();
+    const batchResponse = await window.histyApi.createCitations({
       doc_id: doc.id,
+      citations: [{ source_id: sourceId, locator: locator || null }],
     });
 
+    const renderResponse = batchResponse.items[0];
+    const citationUuid = renderResponse.citation.citation_uuid;
+    ownCitations.add(citationUuid);
+
     const token = window.histyTokens.buildToken({
       citation_uuid: citationUuid,
       source_id: sourceId,
@@ -99,7 +137,7 @@
       doc_id: doc.id,
       style_id: doc.active_style_id,
     });
-    window.histyTokens.updateTokenWithRender(token, renderResponse, renderResponse.style_version);
+    window.histyTokens.updateTokenWithRender(token, renderResponse, batchResponse.style_version);
 
     await Word.run(async (context) => {
       const selection = context.document.getSelection();
@@ -118,13 +156,11 @@
     });
   }
 
-  async function refreshAll() {
-    const docInfo = await ensureDocument();
-    const docResponse = await window.histyApi.upsertDocument({
-      doc_fingerprint: docInfo.fingerprint,
-      name: docInfo.name,
-    });
-    const docId = docResponse.document.id;
+  async function refreshAllNow() {
+    const docId = (await resolveDocument()).id;
+    // Read before collecting controls: reconcile leaves alone citations created
+    // after this revision, e.g. by another task pane on a shared document.
+    const snapshot = (await window.histyApi.getChanges(0, docId, 0)).revision;
 
     const tokenSnapshots = [];
     await Word.run(async (context) => {
@@ -150,10 +186,24 @@
       return;
     }
 
+    // Footnotes deleted in Word stop counting for variants and the bibliography.
+    await window.histyApi.reconcileCitations({
+      doc_id: docId,
+      citation_uuids: orderedUuids,
+      revision: snapshot,
+    });
+
     const refreshResponse = await window.histyApi.renderRefresh({
       doc_id: docId,
       citation_uuids: orderedUuids,
+      cached: tokenSnapshots.map((item) => ({
+        citation_uuid: item.token.citation_uuid,
+        cached_render_hash: item.token.cached_render_hash || null,
+      })),
     });
+    if (!refreshResponse.items.length) {
+      return;
+    }
     const itemsById = {};
     refreshResponse.items.forEach((item) => {
       itemsById[item.citation_uuid] = item;
@@ -178,13 +228,36 @@
     });
   }
 
+  let watching = false;
+
+  // Long-polls the server's change feed and refreshes when an edited source,
+  // contributor or style affects this document. refreshAll only re-renders
+  // the citations whose render hash moved.
+  async function watchChanges() {
+    if (watching) {
+      return;
+    }
+    watching = true;
+    let since = 0;
+    while (watching) {
+      try {
+        const docId = (await resolveDocument()).id;
+        const changes = await window.histyApi.getChanges(since, docId, 25);
+        const changed = changes.citation_uuids;
+        const ownOnly = changed.length > 0 && changed.every((uuid) => ownCitations.has(uuid));
+        changed.forEach((uuid) => ownCitations.delete(uuid));
+        if (since && !ownOnly && changes.doc_ids.indexOf(docId) !== -1) {
+          await refreshAll();
+        }
+        since = changes.revision;
+      } catch (err) {
+        await new Promise((resolve) => window.setTimeout(resolve, 5000));
+      }
+    }
+  }
+
   async function insertList(title, renderFn) {
-    const docInfo = await ensureDocument();
-    const docResponse = await window.histyApi.upsertDocument({
-      doc_fingerprint: docInfo.fingerprint,
-      name: docInfo.name,
-    });
-    const docId = docResponse.document.id;
+    const docId = (await resolveDocument()).id;
     const response = await renderFn({ doc_id: docId });
     const text = response.items.map((item) => item.plain_text).join("\n");
 
@@ -248,6 +321,37 @@
       renderResults(results.items || []);
     });
 
+    let suggestTimer = null;
+    document.getElementById("searchBox").addEventListener("input", (event) => {
+      const searchBox = event.target;
+      const query = searchBox.value;
+      window.clearTimeout(suggestTimer);
+      if (query.trim().length < 2) {
+        return;
+      }
+      // Responses can arrive out of order; only the one for what is still in
+      // the box gets rendered.
+      const current = () => searchBox.value === query;
+      suggestTimer = window.setTimeout(async () => {
+        try {
+          const suggestions = await window.histyApi.suggestSources(query, 10);
+          if (!current()) {
+            return;
+          }
+          const results = suggestions.complete
+            ? suggestions
+            : await window.histyApi.searchSources(query, 20);
+          if (current()) {
+            renderResults(results.items || []);
+          }
+        } catch (err) {
+          if (current()) {
+            setStatus("Search failed", false);
+          }
+        }
+      }, 120);
+    });
+
     document.getElementById("refreshButton").addEventListener("click", async () => {
       await refreshAll();
     });
@@ -261,5 +365,6 @@
     });
 
     checkConnection();
+    watchChanges();
   });
 })();